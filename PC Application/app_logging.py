@@ -0,0 +1,112 @@
+# Celowa kopia modułu z "RaspberryPiApplication/src/server/app_logging.py".
+# Aplikacja na Pi i aplikacja PC są instalowane osobno, bez wspólnego pakietu, więc każda zmiana
+# musi trafić do obu plików (różnią się tylko opisem RingBufferHandler).
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from collections import deque
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+# Powtórzenia tego samego komunikatu w tym oknie są zliczane zamiast wypisywane
+RATE_LIMIT_INTERVAL = 5.0
+MAX_TRACKED_MESSAGES = 1000
+RING_BUFFER_SIZE = 500
+# Przy zapchanym zapisie (np. wolna karta SD) nowe wpisy są odrzucane, a nie blokują pętli
+LOG_QUEUE_SIZE = 1000
+
+
+class RateLimitFilter(logging.Filter):
+    """Przepuszcza komunikat o danym szablonie raz na okno; pominięte powtórzenia dopisuje do kolejnego."""
+
+    def __init__(self, interval=RATE_LIMIT_INTERVAL):
+        super().__init__()
+        self.interval = interval
+        self.last_emitted = {}
+        self.suppressed = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            last = self.last_emitted.get(key)
+            if last is not None and now - last < self.interval:
+                self.suppressed[key] = self.suppressed.get(key, 0) + 1
+                return False
+            self.last_emitted[key] = now
+            suppressed = self.suppressed.pop(key, 0)
+            if len(self.last_emitted) > MAX_TRACKED_MESSAGES:
+                self._forget_expired(now)
+        if suppressed:
+            record.msg = f"{record.msg} (suppressed {suppressed} similar messages)"
+        return True
+
+    def _forget_expired(self, now):
+        for key in [key for key, last in self.last_emitted.items() if now - last >= self.interval]:
+            del self.last_emitted[key]
+            self.suppressed.pop(key, None)
+
+
+class RingBufferHandler(logging.Handler):
+    """Ostatnie wpisy w pamięci, do podglądu po błędzie połączenia."""
+
+    def __init__(self, capacity=RING_BUFFER_SIZE):
+        super().__init__()
+        self.records = deque(maxlen=capacity)
+
+    def emit(self, record):
+        self.records.append(self.format(record))
+
+    def get_records(self):
+        return list(self.records)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener = None
+_ring_buffer = None
+
+
+def setup_logging(level=logging.INFO):
+    """Konfiguruje logowanie przez kolejkę; wypisywanie odbywa się w osobnym wątku."""
+    global _listener, _ring_buffer
+    if _listener is not None:
+        return
+    formatter = logging.Formatter(LOG_FORMAT)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+    _ring_buffer = RingBufferHandler()
+    _ring_buffer.setFormatter(formatter)
+
+    queue_handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    queue_handler.addFilter(RateLimitFilter())
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler, _ring_buffer)
+    _listener.start()
+
+
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def recent_logs():
+    return _ring_buffer.get_records() if _ring_buffer else []
@@ -1,3 +1,4 @@
+import logging
 import socket
 import time
 import threading
@@ -10,9 +11,36 @@ from models.telemetry_data_model import TelemetryDataModel
 from models.control_data_model import ControlDataModel
 from controllers.force_feedback_controller import ForceFeedbackController
 from controllers.input_handler import InputHandler
+from models.telemetry_protocol import (
+    TELEMETRY_HEADER, LEGACY_TELEMETRY_FRAME, MSG_SCHEMA, MSG_DATA, MSG_IMU_BATCH, MSG_TIME_RESPONSE,
+    TIME_RESPONSE, ROLE_DRIVER, ROLE_SPECTATOR, TelemetrySchema, pack_hello, pack_subscribe, pack_time_request, unpack_header
+)
+from models.clock_sync_model import ClockSyncModel
+from models.latency_model import LatencyModel
+
+logger = logging.getLogger(__name__)
+
+CONTROL_RATE_HZ = {"udp": 50, "tcp": 10}
+
+# Panel potrzebuje baterii i sygnału rzadko, liczników częściej
+DEFAULT_TELEMETRY_SUBSCRIPTIONS = [
+    {"channels": ["voltage", "wifi_signal_strength", "energy_remaining"], "rate_hz": 1},
+    {"channels": ["speed", "current", "power"], "rate_hz": 10},
+]
+ACCELERATION_CHANNELS = ["accX", "accY", "accZ"]
+# Orientacja liczona na Pi; starsze serwery pomijają nieznane kanały
+ATTITUDE_CHANNELS = ["roll", "pitch", "yaw_rate"]
+FORCE_FEEDBACK_RATE_HZ = 100
+CONTROL_ECHO_CHANNELS = ["control_seq", "control_applied_at"]
+
+# Kilka szybkich pomiarów na start, potem rzadziej
+CLOCK_SYNC_INITIAL_REQUESTS = 5
+CLOCK_SYNC_INITIAL_INTERVAL = 0.2
+CLOCK_SYNC_INTERVAL = 2.0
 
 class CommunicationController:
-    def __init__(self, screen, font, device: DeviceModel, settings_manager: SettingsManager, control_data, telemetry_data):
+    def __init__(self, screen, font, device: DeviceModel, settings_manager: SettingsManager, control_data, telemetry_data,
+                 role=ROLE_DRIVER):
         self.screen = screen
         self.font = font
         self.device = device
@@ -24,6 +52,25 @@ class CommunicationController:
         self.telemetry_data = telemetry_data
         self.input_handler = InputHandler(settings_manager, self.control_data)
         self.telemetry_lock = threading.Lock()
+        self.control_sequence = 0
+        self.telemetry_schema = None
+        self.telemetry_send_lock = threading.Lock()
+        self.telemetry_sequence = 0
+        self.clock_sync = ClockSyncModel()
+        self.latency = LatencyModel(self.clock_sync)
+        self.control_transport = self._select_control_transport()
+        # Widz tylko odbiera telemetrię i obraz, nie wysyła sterowania
+        self.role = role
+        self.send_thread = None
+        self.receive_thread = None
+        # Ustawiane po połączeniu telemetrii - serwer wysyła serię pomiarową łącza tylko do klientów z sesją
+        self.telemetry_connected = threading.Event()
+
+    def _select_control_transport(self):
+        preferred = self.settings_manager.get("control_transport", "udp")
+        if preferred == "udp" and self.device.supports_transport("udp"):
+            return "udp"
+        return "tcp"
 
     def run(self):
         self.start_communication()
@@ -47,61 +94,166 @@ class CommunicationController:
 
     def start_communication(self):
         self.running = True
-        self.send_thread = threading.Thread(target=self._send_loop, daemon=True)
+        if self.role == ROLE_DRIVER:
+            self.send_thread = threading.Thread(target=self._send_loop, daemon=True)
+            self.send_thread.start()
         self.receive_thread = threading.Thread(target=self._receive_loop, daemon=True)
-        self.send_thread.start()
         self.receive_thread.start()
 
     def _send_loop(self):
         try:
-            self.control_connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            if self.control_transport == "udp":
+                self.control_connection = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            else:
+                self.control_connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                self.control_connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             self.control_connection.connect((self.device.ip, self.device.control_port))
-            print(f"Connected to control server at {self.device.ip}:{self.device.control_port}")
+            logger.info("Connected to control server at %s:%s (%s)",
+                        self.device.ip, self.device.control_port, self.control_transport)
 
+            # Starszy serwer rozumie tylko ramki bez numeru sekwencyjnego
+            sequenced = self.device.control_transports is not None
+            interval = 1.0 / CONTROL_RATE_HZ[self.control_transport]
             while self.running:
+                input_time = time.monotonic()
                 self.update_control_data()
-                packed_data = self.control_data.pack_data()
+                sequence = self._next_control_sequence() if sequenced else None
+                if sequence is not None:
+                    self.latency.record_input(sequence, input_time)
+                packed_data = self.control_data.pack_data(sequence)
                 if packed_data:
                     self.control_connection.send(packed_data)
-                time.sleep(0.1)  # Small delay between sends
+                time.sleep(interval)  # Small delay between sends
         except Exception as e:
-            print(f"Error in control loop: {e}")
+            logger.error("Error in control loop: %s", e)
             self.running = False
             raise ConnectionError("Error in control loop")
         finally:
             if self.control_connection:
                 self.control_connection.close()
 
+    def _next_control_sequence(self):
+        self.control_sequence += 1
+        return self.control_sequence
+
     def _receive_loop(self):
         try:
             self.telemetry_connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.telemetry_connection.connect((self.device.ip, self.device.telemetry_port))
-            print(f"Connected to telemetry server at {self.device.ip}:{self.device.telemetry_port}")
-            self.force_feedback_controller = ForceFeedbackController(self.settings_manager)    
-            while self.running:
-                telemetry_data = self.telemetry_connection.recv(28)
-                if not telemetry_data or len(telemetry_data) != 28:
-                    print(f"Received data length: {len(telemetry_data)}")
-                    print("Incomplete telemetry data received, disconnecting.")
-                    self.running = False
-                    break
-
-                with self.telemetry_lock:
-                    self.telemetry_data.update(telemetry_data)
-                self.force_feedback_controller.update_force_feedback(
-                    self.telemetry_data.acceleration_x,
-                    self.telemetry_data.acceleration_y,
-                    self.telemetry_data.acceleration_z
-                )
+            logger.info("Connected to telemetry server at %s:%s", self.device.ip, self.device.telemetry_port)
+            self.telemetry_connected.set()
+            self.force_feedback_controller = ForceFeedbackController(self.settings_manager)
+            if self.device.protocol_version:
+                self._send_telemetry_message(lambda sequence: pack_hello(self.role))
+                self._send_telemetry_message(lambda sequence: pack_subscribe(
+                    sequence, self._telemetry_subscriptions(), imu_batch=self._wants_imu_batches()))
+                threading.Thread(target=self._clock_sync_loop, daemon=True).start()
+                self._receive_versioned_telemetry()
+            else:
+                self._receive_legacy_telemetry()
 
         except Exception as e:
-            print(f"Error in telemetry loop: {e}")
+            logger.error("Error in telemetry loop: %s", e)
             self.running = False
             raise ConnectionError("Error in telemetry loop")
         finally:
             if self.telemetry_connection:
                 self.telemetry_connection.close()
 
+    def _receive_legacy_telemetry(self):
+        while self.running:
+            telemetry_data = self._recv_exactly(LEGACY_TELEMETRY_FRAME.size)
+            if telemetry_data is None:
+                logger.warning("Incomplete telemetry data received, disconnecting.")
+                self.running = False
+                break
+
+            with self.telemetry_lock:
+                self.telemetry_data.update(telemetry_data)
+            self._update_force_feedback()
+
+    def _receive_versioned_telemetry(self):
+        while self.running:
+            header = self._recv_exactly(TELEMETRY_HEADER.size)
+            received_at = time.monotonic()
+            if header is None:
+                logger.info("Telemetry connection closed by server.")
+                self.running = False
+                break
+            _, msg_type, _, timestamp, length = unpack_header(header)
+            payload = self._recv_exactly(length)
+            if payload is None:
+                logger.warning("Incomplete telemetry message received, disconnecting.")
+                self.running = False
+                break
+
+            if msg_type == MSG_SCHEMA:
+                self.telemetry_schema = TelemetrySchema.from_payload(payload)
+                logger.info("Telemetry schema v%s: %s", self.telemetry_schema.version, list(self.telemetry_schema.channels))
+            elif msg_type == MSG_DATA and self.telemetry_schema:
+                values = self.telemetry_schema.decode(payload)
+                if values is None:
+                    continue
+                with self.telemetry_lock:
+                    self.telemetry_data.update_channels(values, timestamp)
+                if "accX" in values:
+                    self._update_force_feedback()
+                if "control_seq" in values:
+                    self.latency.on_control_echo(values["control_seq"], values["control_applied_at"])
+            elif msg_type == MSG_IMU_BATCH:
+                with self.telemetry_lock:
+                    self.telemetry_data.update_imu_batch(payload)
+            elif msg_type == MSG_TIME_RESPONSE:
+                client_time, server_received, server_sent = TIME_RESPONSE.unpack(payload)
+                rtt = self.clock_sync.add_sample(client_time, server_received, server_sent, received_at)
+                self.latency.record_rtt(rtt)
+
+    def _send_telemetry_message(self, build_message):
+        # Wiadomości do serwera wysyłają dwa wątki (odbiór telemetrii i synchronizacja zegara)
+        with self.telemetry_send_lock:
+            self.telemetry_sequence += 1
+            self.telemetry_connection.sendall(build_message(self.telemetry_sequence))
+
+    def _clock_sync_loop(self):
+        requests_sent = 0
+        try:
+            while self.running:
+                self._send_telemetry_message(lambda sequence: pack_time_request(sequence, time.monotonic()))
+                requests_sent += 1
+                if requests_sent < CLOCK_SYNC_INITIAL_REQUESTS:
+                    time.sleep(CLOCK_SYNC_INITIAL_INTERVAL)
+                else:
+                    time.sleep(CLOCK_SYNC_INTERVAL)
+        except OSError as e:
+            logger.warning("Clock sync stopped: %s", e)
+
+    def _telemetry_subscriptions(self):
+        subscriptions = list(self.settings_manager.get("telemetry_subscriptions", DEFAULT_TELEMETRY_SUBSCRIPTIONS))
+        if self.force_feedback_controller.is_logitech_controller():
+            subscriptions.append({"channels": ACCELERATION_CHANNELS + ATTITUDE_CHANNELS, "rate_hz": FORCE_FEEDBACK_RATE_HZ})
+        if self.role == ROLE_DRIVER and self.device.control_transports is not None:
+            subscriptions.append({"channels": CONTROL_ECHO_CHANNELS, "rate_hz": CONTROL_RATE_HZ[self.control_transport]})
+        return subscriptions
+
+    def _wants_imu_batches(self):
+        return self.settings_manager.get("imu_batches", self.force_feedback_controller.is_logitech_controller() is not None)
+
+    def _recv_exactly(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.telemetry_connection.recv(size - len(data))
+            if not chunk:
+                return None
+            data.extend(chunk)
+        return bytes(data)
+
+    def _update_force_feedback(self):
+        self.force_feedback_controller.update_force_feedback(
+            self.telemetry_data.acceleration_x,
+            self.telemetry_data.acceleration_y,
+            self.telemetry_data.acceleration_z
+        )
+
     def update_control_data(self):
         self.input_handler.update_control_data()
 
@@ -20,7 +20,8 @@ class ConfigureControllerController:
             "shift_up": "Zmiana biegu w górę",
             "shift_down": "Zmiana biegu w dół",
             "lights": "Przełącz światła",
-            "horn": "Klakson"
+            "horn": "Klakson",
+            "cruise_control": "Przełącz regulację prędkości"
         }
         self.functions = list(self.function_descriptions.keys())  # Use descriptions keys to avoid duplicates
         self.is_setting_function = False
@@ -1,17 +1,31 @@
+import logging
 import json
 import pygame
 import threading
 import socket
-from models.device_model import DeviceModel
+import time
+from models.device_model import DeviceModel, DEFAULT_VIDEO_PORT, DEFAULT_VIDEO_PATH
 from views.device_list_view import DeviceListView
 from controllers.communication_controller import CommunicationController
 from controllers.video.video_controller import VideoController
+from controllers.link_probe_controller import LinkProbeController
+from models.link_quality_model import LinkQualityModel
 
 from models.control_data_model import ControlDataModel
 from models.telemetry_data_model import TelemetryDataModel
+from models.telemetry_protocol import ROLE_DRIVER, ROLE_SPECTATOR
+
+logger = logging.getLogger(__name__)
 
 class DeviceController:
     DISCOVERY_PORT = 50000
+    # Zapytanie o urządzenia; serwery odpowiadają od razu zamiast czekać na okresowy beacon
+    PROBE_PORT = 50001
+    PROBE_MESSAGE = json.dumps({"type": "discover"}).encode('utf-8')
+    # Kolejne zapytania wyłapują pojazdy włączone po rozpoczęciu wyszukiwania
+    PROBE_INTERVAL = 1.0
+    # Czas oczekiwania na połączenie telemetrii przed pierwszym pomiarem łącza
+    TELEMETRY_CONNECT_TIMEOUT = 2.0
 
     def __init__(self, screen, font, settings_manager):
         self.screen = screen
@@ -22,41 +36,59 @@ class DeviceController:
         self.lock = threading.Lock()
         self.view = DeviceListView(self.screen, self.font)
         self.communication_controller = None
+        self.link_probe_controller = None
 
     def discover_devices(self):
-        print("Skanowanie sieci w poszukiwaniu urządzeń")
+        logger.info("Skanowanie sieci w poszukiwaniu urządzeń")
         with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
             sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            sock.settimeout(2)
+            sock.settimeout(self.PROBE_INTERVAL)
             sock.bind(('', self.DISCOVERY_PORT))
 
             try:
+                next_probe = 0.0
                 while self.running:
+                    if time.monotonic() >= next_probe:
+                        self._send_probe(sock)
+                        next_probe = time.monotonic() + self.PROBE_INTERVAL
                     try:
                         data, addr = sock.recvfrom(1024)
-                        print(f"Received data from: {addr}, {data}")
+                        logger.debug("Received data from: %s, %s", addr, data)
 
                         # Parse JSON safely
                         try:
                             device_info = json.loads(data.decode('utf-8'))
                         except json.JSONDecodeError as e:
-                            print(f"Invalid JSON received: {data}, Error: {e}")
+                            logger.warning("Invalid JSON received: %s, Error: %s", data, e)
                             continue
                         
                         # Extract device details
                         name = device_info.get("name")
                         control_port = device_info.get("control_port")
                         telemetry_port = device_info.get("telemetry_port")
+                        control_transports = device_info.get("control_transports")
+                        protocol_version = device_info.get("protocol_version")
+                        if not name or control_port is None or telemetry_port is None:
+                            continue
 
                         # Create a Device object
                         device = DeviceModel(
                             name=name,
                             ip=addr[0],
                             control_port=int(control_port),
-                            telemetry_port=int(telemetry_port)
+                            telemetry_port=int(telemetry_port),
+                            control_transports=control_transports,
+                            protocol_version=protocol_version,
+                            video_port=int(device_info.get("video_port", DEFAULT_VIDEO_PORT)),
+                            video_path=device_info.get("video_path", DEFAULT_VIDEO_PATH),
+                            battery_voltage=device_info.get("battery_voltage"),
+                            occupied=bool(device_info.get("occupied", False)),
+                            link_probe_port=device_info.get("link_probe_port")
                         )
                         with self.lock:
-                            if device not in self.devices:
+                            if device in self.devices:
+                                self.devices[self.devices.index(device)].update_from(device)
+                            else:
                                 self.devices.append(device)
 
                     except socket.timeout:
@@ -64,7 +96,13 @@ class DeviceController:
                             break
 
             except Exception as e:
-                print(f"Błąd podczas wyszukiwania: {e}")
+                logger.error("Błąd podczas wyszukiwania: %s", e)
+
+    def _send_probe(self, sock):
+        try:
+            sock.sendto(self.PROBE_MESSAGE, ('<broadcast>', self.PROBE_PORT))
+        except OSError as e:
+            logger.error("Discovery probe failed: %s", e)
 
     def run(self):
         """Main loop for device discovery."""
@@ -99,9 +137,19 @@ class DeviceController:
                         with self.lock:
                             if self.devices:
                                 selected_device = self.devices[selected_index]
-                                print(f"Selected device: {selected_device.name} at {selected_device.ip}")
+                                logger.info("Selected device: %s at %s", selected_device.name, selected_device.ip)
                                 self.running = False  # Stop discovery
-                                self._start_vehicle_control(selected_device)
+                                # Zajęty pojazd odrzuci drugiego kierowcę, więc od razu dołączamy jako widz
+                                role = ROLE_SPECTATOR if selected_device.occupied else ROLE_DRIVER
+                                self._start_vehicle_control(selected_device, role)
+                    elif event.key == pygame.K_s:
+                        # Podgląd bez sterowania, gdy ktoś inny już prowadzi pojazd
+                        with self.lock:
+                            if self.devices:
+                                selected_device = self.devices[selected_index]
+                                logger.info("Spectating device: %s at %s", selected_device.name, selected_device.ip)
+                                self.running = False
+                                self._start_vehicle_control(selected_device, ROLE_SPECTATOR)
                     elif event.key == pygame.K_ESCAPE:
                         self.running = False
 
@@ -111,26 +159,42 @@ class DeviceController:
         self.running = False
         discovery_thread.join()
 
-    def _start_vehicle_control(self, device):
+    def _start_vehicle_control(self, device, role=ROLE_DRIVER):
         """Start vehicle control after selecting a device."""
         try:
             self.control_data = ControlDataModel()
             self.telemetry_data = TelemetryDataModel()
-            self.communication_controller = CommunicationController(self.screen, self.font, device, self.settings_manager, self.control_data, self.telemetry_data)
-            self.video_controller = VideoController(self.screen, self.font, f"http://{device.ip}:8000/video", self.telemetry_data, self.control_data)
+            self.communication_controller = CommunicationController(self.screen, self.font, device, self.settings_manager, self.control_data, self.telemetry_data,
+                                                                    role)
+            link_quality = LinkQualityModel()
+            video_url = device.video_url
             self.communication_controller.start_communication()
+            if device.link_probe_port is not None:
+                # Pierwszy pomiar przed otwarciem wideo, żeby od razu dobrać jakość obrazu; serwer odpowiada
+                # serią tylko klientowi z otwartą sesją, więc najpierw połączenie telemetrii
+                self.communication_controller.telemetry_connected.wait(self.TELEMETRY_CONNECT_TIMEOUT)
+                self.link_probe_controller = LinkProbeController(device, link_quality)
+                self.link_probe_controller.measure()
+                video_url = device.video_url_with_quality(link_quality.recommended_video_quality())
+            self.video_controller = VideoController(self.screen, self.font, video_url, self.telemetry_data, self.control_data,
+                                                    self.communication_controller.latency, self.link_probe_controller)
+            if self.link_probe_controller:
+                self.link_probe_controller.start()
             self.video_controller.run()
         except ConnectionError as e:
-            print(f"Connection error: {e}")
-            print("Restarting device discovery...")
+            logger.error("Connection error: %s", e)
+            logger.info("Restarting device discovery...")
             self.run()  # Restart discovery after failure
         except Exception as e:
-            print(f"Unexpected error during communication: {e}")
-            print("Returning to device discovery...")
+            logger.error("Unexpected error during communication: %s", e)
+            logger.info("Returning to device discovery...")
             self.run()
         finally:
             if self.communication_controller:
                 self.communication_controller.stop_communication()
+            if self.link_probe_controller:
+                self.link_probe_controller.stop()
+                self.link_probe_controller = None
 
     def stop(self):
         self.running = False
\ No newline at end of file
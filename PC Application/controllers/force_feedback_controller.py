@@ -1,7 +1,10 @@
+import logging
 import logidrivepy
 import sys
 sys.path.append('../logidrivepy')
 
+logger = logging.getLogger(__name__)
+
 class ForceFeedbackController:
     def __init__(self, settings_manager):
         self.settings_manager = settings_manager
@@ -16,14 +19,14 @@ class ForceFeedbackController:
         if self.settings_manager.is_logitech_device(self.controller_index):
             self.logitech_controller = logidrivepy.LogitechController()
             if self.logitech_controller.steering_initialize():
-                print("Logitech controller initialized for force feedback.")
+                logger.info("Logitech controller initialized for force feedback.")
             else:
-                print("Failed to initialize Logitech controller for force feedback.")
+                logger.error("Failed to initialize Logitech controller for force feedback.")
                 self.logitech_controller = None
 
     def update_force_feedback(self, acceleration_x, acceleration_y, acceleration_z):
         if not self.logitech_controller:
-            print("Logitech controller is not initialized. Skipping force feedback update.")
+            logger.warning("Logitech controller is not initialized. Skipping force feedback update.")
             return
 
         try:
@@ -31,7 +34,7 @@ class ForceFeedbackController:
 
             # Walidacja wartości przed użyciem w metodach
             if not (-100 <= spring_force <= 100):
-                print(f"Spring force out of bounds: {spring_force}")
+                logger.warning("Spring force out of bounds: %s", spring_force)
                 spring_force = max(-100, min(100, spring_force))
 
             # print(f"Setting spring force: {spring_force}")
@@ -42,7 +45,7 @@ class ForceFeedbackController:
 
             self.logitech_controller.logi_update()
         except Exception as e:
-            print(f"Error updating force feedback: {e}")
+            logger.error("Error updating force feedback: %s", e)
 
 
 
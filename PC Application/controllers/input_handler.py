@@ -1,8 +1,11 @@
+import logging
 import pygame
 import struct
 from models.control_data_model import ControlDataModel
 from controllers.settings_manager import SettingsManager
 
+logger = logging.getLogger(__name__)
+
 class InputHandler:
     def __init__(self, settings_manager: SettingsManager, control_data_model: ControlDataModel):
         self.settings_manager = settings_manager
@@ -20,6 +23,7 @@ class InputHandler:
         self.shift_up_last_state = 0
         self.shift_down_last_state = 0
         self.lights_last_state = 0
+        self.cruise_control_last_state = 0
 
         self.gear = 0
         self.buttons = [0] * 12
@@ -33,14 +37,14 @@ class InputHandler:
             if joystick_count > 0 and self.selected_controller_index < joystick_count:
                 self.joystick = pygame.joystick.Joystick(self.selected_controller_index)
                 self.joystick.init()
-                print(f"Joystick initialized: {self.joystick.get_name()}")
+                logger.info("Joystick initialized: %s", self.joystick.get_name())
                 self.logitech_device = self.settings_manager.is_logitech_device(self.selected_controller_index)
-                print(f"logi dev: {self.logitech_device}")
+                logger.debug("logi dev: %s", self.logitech_device)
 
             else:
-                print(f"No joystick found or invalid controller index: {self.selected_controller_index}")
+                logger.warning("No joystick found or invalid controller index: %s", self.selected_controller_index)
         except:
-            print(f"No joystick found or invalid controller index: {self.selected_controller_index}")
+            logger.warning("No joystick found or invalid controller index: %s", self.selected_controller_index)
 
     def update_control_data(self):
         if self.joystick != None:
@@ -53,15 +57,15 @@ class InputHandler:
         try:
             steering = self.joystick.get_axis(self.controller_config["steering"]["id"])
         except KeyError:
-            print("Warning: 'steering' axis not configured in controller_config")
+            logger.warning("'steering' axis not configured in controller_config")
         try:
             throttle = self.joystick.get_axis(self.controller_config["throttle"]["id"])
         except KeyError:
-            print("Warning: 'throttle' axis not configured in controller_config")
+            logger.warning("'throttle' axis not configured in controller_config")
         try:
             brake = self.joystick.get_axis(self.controller_config["brake"]["id"])
         except KeyError:
-            print("Warning: 'brake' axis not configured in controller_config")
+            logger.warning("'brake' axis not configured in controller_config")
         # Apply axis inversion
         if self.settings_manager.get_axis_inversion("steering"):
             steering *= -1
@@ -89,6 +93,13 @@ class InputHandler:
                 self.functions[0] = not self.functions[0]
             self.lights_last_state = self.buttons[lights_id]
 
+        if "cruise_control" in self.controller_config:
+            # Bit 2: gaz zadaje prędkość, regulator na Pi dobiera moc silnika
+            cruise_control_id = self.controller_config["cruise_control"]["id"]
+            if self.buttons[cruise_control_id] and self.buttons[cruise_control_id] != self.cruise_control_last_state:
+                self.functions[2] = int(not self.functions[2])
+            self.cruise_control_last_state = self.buttons[cruise_control_id]
+
         if "horn" in self.controller_config:
             horn_id = self.controller_config["horn"]["id"]
             if self.buttons[horn_id]:
@@ -143,6 +154,6 @@ class InputHandler:
                 return self.joystick.get_axis(self.controller_config[axis_name]["id"])
             return 0.0
         except Exception as e:
-            print(f"Warning: exception error {e}")
+            logger.warning("Error reading axis %s: %s", axis_name, e)
             return 0.0
         
\ No newline at end of file
@@ -0,0 +1,124 @@
+import logging
+import random
+import select
+import socket
+import threading
+import time
+from models.device_model import DeviceModel
+from models.link_quality_model import LinkQualityModel
+from models.telemetry_protocol import (
+    LINK_PROBE_MAGIC, LINK_PROBE_HEADER, PROBE_ECHO, PROBE_BURST_REQUEST, PROBE_BURST_DATA, PROBE_BURST_REQUEST_BODY
+)
+
+logger = logging.getLogger(__name__)
+
+ECHO_COUNT = 20
+ECHO_INTERVAL = 0.02
+# Seria ~240 kB: wystarczy, żeby zmierzyć przepustowość, a nie zablokować wideo na długo
+BURST_PACKETS = 200
+BURST_PACKET_SIZE = 1200
+REPLY_TIMEOUT = 0.5
+# Pomiar okresowy jest rzadki - sam obciąża łącze
+LINK_PROBE_INTERVAL = 30.0
+
+
+class LinkProbeController:
+    def __init__(self, device: DeviceModel, link_quality: LinkQualityModel):
+        self.device = device
+        self.link_quality = link_quality
+        self.running = False
+        self.measure_requested = threading.Event()
+        self.probe_thread = None
+
+    def start(self):
+        self.running = True
+        self.probe_thread = threading.Thread(target=self._probe_loop, daemon=True)
+        self.probe_thread.start()
+
+    def stop(self):
+        self.running = False
+        self.measure_requested.set()
+        if self.probe_thread:
+            self.probe_thread.join()
+
+    def request_measurement(self):
+        self.measure_requested.set()
+
+    def _probe_loop(self):
+        while self.running:
+            self.measure()
+            self.measure_requested.wait(LINK_PROBE_INTERVAL)
+            self.measure_requested.clear()
+
+    def measure(self):
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.connect((self.device.ip, self.device.link_probe_port))
+                probe_id = random.getrandbits(32)
+                rtt_ms, jitter_ms, loss_percent = self._measure_echo(sock, probe_id)
+                throughput_kbps = self._measure_burst(sock, probe_id)
+        except OSError as e:
+            logger.error("Link probe failed: %s", e)
+            return
+        self.link_quality.update(rtt_ms, jitter_ms, loss_percent, throughput_kbps)
+
+    def _measure_echo(self, sock, probe_id):
+        rtts = {}
+        for sequence in range(ECHO_COUNT):
+            sock.send(LINK_PROBE_HEADER.pack(LINK_PROBE_MAGIC, PROBE_ECHO, probe_id, sequence, time.monotonic()))
+            self._receive(sock, probe_id, PROBE_ECHO, time.monotonic() + ECHO_INTERVAL, rtts)
+        deadline = time.monotonic() + REPLY_TIMEOUT
+        while len(rtts) < ECHO_COUNT and time.monotonic() < deadline:
+            self._receive(sock, probe_id, PROBE_ECHO, deadline, rtts)
+
+        loss_percent = 100.0 * (ECHO_COUNT - len(rtts)) / ECHO_COUNT
+        if not rtts:
+            return None, None, loss_percent
+        samples = [rtts[sequence] for sequence in sorted(rtts)]
+        rtt_ms = sorted(samples)[len(samples) // 2]
+        # Jitter jak w RFC 3550: średnia zmiana RTT między kolejnymi pakietami
+        differences = [abs(b - a) for a, b in zip(samples, samples[1:])]
+        jitter_ms = sum(differences) / len(differences) if differences else 0.0
+        return rtt_ms, jitter_ms, loss_percent
+
+    def _measure_burst(self, sock, probe_id):
+        sock.send(LINK_PROBE_HEADER.pack(LINK_PROBE_MAGIC, PROBE_BURST_REQUEST, probe_id, 0, time.monotonic())
+                  + PROBE_BURST_REQUEST_BODY.pack(BURST_PACKETS, BURST_PACKET_SIZE))
+        arrivals = {}
+        deadline = time.monotonic() + REPLY_TIMEOUT
+        while len(arrivals) < BURST_PACKETS and time.monotonic() < deadline:
+            received = len(arrivals)
+            self._receive(sock, probe_id, PROBE_BURST_DATA, deadline, arrivals)
+            if len(arrivals) > received:
+                # Seria trwa - czekamy na kolejne pakiety
+                deadline = time.monotonic() + REPLY_TIMEOUT
+        if len(arrivals) < 2:
+            return None
+        times = sorted(arrivals.values())
+        duration = times[-1] - times[0]
+        if duration <= 0:
+            return None
+        # Pierwszy pakiet wyznacza początek pomiaru, więc liczą się kolejne
+        return (len(times) - 1) * BURST_PACKET_SIZE * 8 / duration / 1000.0
+
+    @staticmethod
+    def _receive(sock, probe_id, probe_type, deadline, results):
+        """Odbiera pakiety do upływu terminu; dla echa zapisuje RTT w ms, dla serii czas odbioru."""
+        while True:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0 or not select.select([sock], [], [], timeout)[0]:
+                return
+            data = sock.recv(2048)
+            received_at = time.monotonic()
+            if len(data) < LINK_PROBE_HEADER.size:
+                continue
+            magic, reply_type, reply_id, sequence, sent_at = LINK_PROBE_HEADER.unpack_from(data)
+            if magic != LINK_PROBE_MAGIC or reply_type != probe_type or reply_id != probe_id:
+                continue
+            if probe_type == PROBE_ECHO:
+                results[sequence] = (received_at - sent_at) * 1000.0
+            else:
+                results[sequence] = received_at
+            if probe_type == PROBE_BURST_DATA:
+                # Pojedynczy pakiet serii - wracamy, żeby przedłużyć termin
+                return
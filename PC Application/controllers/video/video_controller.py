@@ -10,9 +10,12 @@ from consts import *
 
 from models.telemetry_data_model import TelemetryDataModel
 from models.control_data_model import ControlDataModel
+from models.latency_model import LatencyModel
+from controllers.link_probe_controller import LinkProbeController
 
 class VideoController:
-    def __init__(self, screen, font, stream_url, telemetry_data:TelemetryDataModel, control_data:ControlDataModel):
+    def __init__(self, screen, font, stream_url, telemetry_data:TelemetryDataModel, control_data:ControlDataModel, latency:LatencyModel=None,
+                 link_probe:LinkProbeController=None):
         self.screen = screen
         self.font = font
         self.stream_url = stream_url
@@ -22,16 +25,19 @@ class VideoController:
         self.speed = 0.0
         self.voltage = 0.0
         self.current = 0.0
+        self.power = 0.0
+        self.energy_remaining = None
         self.wifi_signal_strength = 0
         self.gear = 0
         self.lights = 0
         self.horn = 0
         self.telemetry_data = telemetry_data
         self.control_data = control_data
+        self.latency = latency
+        self.link_probe = link_probe
         self.telemetry_lock = threading.Lock()
         self._load_wifi_icons()
         self._load_battery_icons()
-        self.smoothed_voltage = None
         self.smoothed_wifi_signal_strength = None
 
     def _load_wifi_icons(self):
@@ -66,11 +72,12 @@ class VideoController:
             self.speed = self.telemetry_data.speed
             self.voltage = self.telemetry_data.voltage
             self.current = self.telemetry_data.current
+            self.power = self.telemetry_data.power
+            self.energy_remaining = self.telemetry_data.energy_remaining
             self.wifi_signal_strength = self.telemetry_data.wifi_signal_strength
             self.gear = self.control_data.gear
             self.lights = self.control_data.functions[0]
             self.horn = self.control_data.functions[1]
-            self.smoothed_voltage = self._smooth_value(self.smoothed_voltage, self.voltage)
             self.smoothed_wifi_signal_strength = self._smooth_value(self.smoothed_wifi_signal_strength, self.wifi_signal_strength)
     
     def _smooth_value(self, smoothed_value, new_value, alpha=0.1):
@@ -101,6 +108,9 @@ class VideoController:
                     self.running = False
                 elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
                     self.running = False
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_l and self.link_probe:
+                    # Pomiar łącza na żądanie
+                    self.link_probe.request_measurement()
     
             clock.tick(30)
     
@@ -112,6 +122,13 @@ class VideoController:
             telemetry_text = [
                 f"Bieg: {gear_txt}",
             ]
+            if self.energy_remaining is not None:
+                # Starsze serwery nie wysyłają bilansu energii
+                telemetry_text.append(f"Moc: {self.power:.1f} W, pozostało: {self.energy_remaining:.1f} Wh")
+            if self.latency:
+                telemetry_text.append(self._format_latency(self.latency.summary()))
+            if self.link_probe:
+                telemetry_text.append(self._format_link_quality(self.link_probe.link_quality.summary()))
         y_offset = 10
         for line in telemetry_text:
             telemetry_surface = self.font.render(line, True, (255, 255, 255))
@@ -130,7 +147,8 @@ class VideoController:
             self.screen.blit(wifi_icon, (10, y_offset))
             y_offset += wifi_icon.get_height() + 5
 
-        battery_icon = self._get_battery_icon(self.smoothed_voltage)
+        # Napięcie przychodzi już przefiltrowane na Pi (mediana + średnia)
+        battery_icon = self._get_battery_icon(self.voltage)
         if battery_icon:
             self.screen.blit(icon_bg_surface, (10, y_offset))
             self.screen.blit(battery_icon, (10, y_offset))
@@ -138,6 +156,19 @@ class VideoController:
         self._draw_meter(center=(self.screen.get_width() - 100, 100), radius=75, max_value=2000, current_value=self.current, unit="mA", color_start=(0, 255, 0), color_end=(255, 0, 0))
         self._draw_meter(center=(self.screen.get_width() - 100, 200), radius=75, max_value=10, current_value=self.speed, unit="km/h", color_start=(255, 255, 255), color_end=(255, 255, 255))
 
+    def _format_latency(self, summary):
+        def ms(value):
+            return "-" if value is None else f"{value:.0f}"
+        return f"Opóźnienie: {ms(summary['latency_p50'])}/{ms(summary['latency_p95'])} ms, RTT: {ms(summary['rtt_p50'])} ms"
+
+    def _format_link_quality(self, summary):
+        def value(number, fmt):
+            return "-" if number is None else fmt.format(number)
+        return (f"Łącze: RTT {value(summary['rtt_ms'], '{:.0f}')} ms "
+                f"± {value(summary['jitter_ms'], '{:.0f}')} ms, "
+                f"straty {value(summary['loss_percent'], '{:.0f}')}%, "
+                f"{value(summary['throughput_kbps'] and summary['throughput_kbps'] / 1000.0, '{:.1f}')} Mbit/s")
+
     def _draw_meter(self, center, radius, max_value, current_value, unit, color_start, color_end):
         current_value = min(max(current_value, 0), max_value)
         angle = (current_value / max_value) * 360
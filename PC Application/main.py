@@ -1,20 +1,28 @@
+import logging
 from controllers.main_controller import MainController
 from controllers.settings_manager import SettingsManager
 from utils import initialize_pygame
+from app_logging import setup_logging, stop_logging
+
+logger = logging.getLogger(__name__)
 
 
 def main():
+    setup_logging()
     settings_manager = SettingsManager("settings.json")
     screen, font = initialize_pygame(settings_manager)
 
     selected_controller = settings_manager.get_selected_controller()
     if selected_controller:
-        print(f"Joystick initialized: {settings_manager.get_controller_name()}")
+        logger.info("Joystick initialized: %s", settings_manager.get_controller_name())
     else:
-        print("No joystick found or invalid controller index")
+        logger.warning("No joystick found or invalid controller index")
 
     main_controller = MainController(screen, font, settings_manager)
-    main_controller.run()
+    try:
+        main_controller.run()
+    finally:
+        stop_logging()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,34 @@
+import threading
+from collections import deque
+
+CLOCK_SYNC_WINDOW = 16
+
+
+class ClockSyncModel:
+    """Szacuje przesunięcie zegara serwera względem klienta (czas serwera = czas klienta + offset)."""
+
+    def __init__(self, window=CLOCK_SYNC_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.offset = None
+        self.delay = None
+        self.lock = threading.Lock()
+
+    def add_sample(self, t0, t1, t2, t3):
+        """t0/t3 - wysłanie i odbiór u klienta, t1/t2 - odbiór i wysłanie u serwera. Zwraca RTT bez czasu obsługi."""
+        delay = (t3 - t0) - (t2 - t1)
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+        with self.lock:
+            self.samples.append((delay, offset))
+            # Próbka z najmniejszym opóźnieniem jest najmniej zaburzona kolejkowaniem
+            self.delay, self.offset = min(self.samples)
+        return delay
+
+    def to_client_time(self, server_time):
+        with self.lock:
+            if self.offset is None:
+                return None
+            return server_time - self.offset
+
+    def is_synchronized(self):
+        with self.lock:
+            return self.offset is not None
@@ -1,14 +1,23 @@
+import logging
 import struct
 import threading
 from functools import reduce
 
+logger = logging.getLogger(__name__)
+
+CONTROL_FORMAT = "bbBBB"
+# magic, numer sekwencyjny, pola jak w CONTROL_FORMAT
+CONTROL_MAGIC = b"RC"
+SEQUENCED_CONTROL_FORMAT = "<2sIbbBBB"
+SEQUENCE_MODULUS = 1 << 32
+
 class ControlDataModel:
     def __init__(self):
         self.gear = 0
         self.steering = 0.0
         self.throttle = 0.0
         self.brake = 0.0
-        self.functions = [0] * 8 # 0: ligts, 1-7: not used
+        self.functions = [0] * 8 # 0: ligts, 1: horn, 2: cruise control, 3-7: not used
         self.lock = threading.Lock()
 
     def update(self, gear, steering, throttle, brake, functions):
@@ -19,9 +28,9 @@ class ControlDataModel:
             self.brake = brake
             self.functions = functions
 
-    def pack_data(self):
+    def pack_data(self, sequence=None):
         gear = self.gear
-        print(self.steering)
+        logger.debug("Steering: %s", self.steering)
         steering = max(-128, min(127, int(self.steering * 127)))
         gas = int(self.throttle * 100) if self.throttle > 0 else 0
         brake = int(self.brake * 100) if self.brake > 0 else 0
@@ -29,9 +38,11 @@ class ControlDataModel:
 
         try:
             with self.lock:
-                packed_data = struct.pack("bbBBB", gear, steering, gas, brake, functions)
-                return packed_data
+                if sequence is None:
+                    return struct.pack(CONTROL_FORMAT, gear, steering, gas, brake, functions)
+                return struct.pack(SEQUENCED_CONTROL_FORMAT, CONTROL_MAGIC, sequence % SEQUENCE_MODULUS,
+                                   gear, steering, gas, brake, functions)
         except struct.error as e:
             with self.lock:
-                print(f"Error packing control data: {e}")
+                logger.error("Error packing control data: %s", e)
                 return None
\ No newline at end of file
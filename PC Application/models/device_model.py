@@ -1,9 +1,53 @@
+DEFAULT_VIDEO_PORT = 8000
+DEFAULT_VIDEO_PATH = "/video"
+
 class DeviceModel:
-    def __init__(self, name, ip, control_port, telemetry_port):
+    def __init__(self, name, ip, control_port, telemetry_port, control_transports=None, protocol_version=None,
+                 video_port=DEFAULT_VIDEO_PORT, video_path=DEFAULT_VIDEO_PATH, battery_voltage=None, occupied=False,
+                 link_probe_port=None):
         self.name = name
         self.ip = ip
         self.control_port = control_port
         self.telemetry_port = telemetry_port
+        # None oznacza starszy serwer, który zna tylko ramki TCP bez numeru sekwencyjnego
+        self.control_transports = control_transports
+        self.protocol_version = protocol_version
+        self.video_port = video_port
+        self.video_path = video_path
+        # Stan z ostatniego beaconu; starsze serwery go nie wysyłają
+        self.battery_voltage = battery_voltage
+        self.occupied = occupied
+        # None - serwer bez sondy łącza
+        self.link_probe_port = link_probe_port
+
+    def __eq__(self, other):
+        if not isinstance(other, DeviceModel):
+            return NotImplemented
+        return self.ip == other.ip and self.control_port == other.control_port
+
+    def __hash__(self):
+        return hash((self.ip, self.control_port))
+
+    def update_from(self, other):
+        """Odświeża stan urządzenia danymi z nowszego beaconu."""
+        self.name = other.name
+        self.telemetry_port = other.telemetry_port
+        self.control_transports = other.control_transports
+        self.protocol_version = other.protocol_version
+        self.video_port = other.video_port
+        self.video_path = other.video_path
+        self.battery_voltage = other.battery_voltage
+        self.occupied = other.occupied
+        self.link_probe_port = other.link_probe_port
+
+    @property
+    def video_url(self):
+        return f"http://{self.ip}:{self.video_port}{self.video_path}"
+
+    def video_url_with_quality(self, quality):
+        if quality is None:
+            return self.video_url
+        return f"{self.video_url}?quality={quality}"
 
     def set_name(self, name):
         self.name = name
@@ -27,4 +71,7 @@ class DeviceModel:
         return self.control_port
 
     def get_telemetry_port(self):
-        return self.telemetry_port
\ No newline at end of file
+        return self.telemetry_port
+
+    def supports_transport(self, transport):
+        return self.control_transports is not None and transport in self.control_transports
\ No newline at end of file
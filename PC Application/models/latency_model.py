@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict, deque
+import numpy as np
+
+HISTOGRAM_WINDOW = 500
+# Przedziały histogramu w ms
+HISTOGRAM_BINS = [0, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500, 1000]
+MAX_PENDING_INPUTS = 512
+
+
+class RollingHistogram:
+    def __init__(self, window=HISTOGRAM_WINDOW, bins=HISTOGRAM_BINS):
+        self.values = deque(maxlen=window)
+        self.bins = np.asarray(bins, dtype=float)
+
+    def add(self, value):
+        self.values.append(value)
+
+    def counts(self):
+        counts, _ = np.histogram(np.fromiter(self.values, dtype=float), bins=self.bins)
+        return counts
+
+    def percentile(self, q):
+        if not self.values:
+            return None
+        return float(np.percentile(np.fromiter(self.values, dtype=float), q))
+
+    def __len__(self):
+        return len(self.values)
+
+
+class LatencyModel:
+    """Opóźnienie od odczytu wejścia do zastosowania komendy na pojeździe oraz RTT łącza (w ms)."""
+
+    def __init__(self, clock_sync):
+        self.clock_sync = clock_sync
+        self.pending_inputs = OrderedDict()
+        self.last_echoed_sequence = None
+        self.input_to_actuation = RollingHistogram()
+        self.rtt = RollingHistogram()
+        self.lock = threading.Lock()
+
+    def record_input(self, sequence, input_time):
+        with self.lock:
+            self.pending_inputs[sequence] = input_time
+            while len(self.pending_inputs) > MAX_PENDING_INPUTS:
+                self.pending_inputs.popitem(last=False)
+
+    def record_rtt(self, rtt_s):
+        with self.lock:
+            self.rtt.add(rtt_s * 1000.0)
+
+    def on_control_echo(self, sequence, applied_at):
+        """Echo z telemetrii: numer ostatniej zastosowanej ramki i czas zastosowania według zegara serwera."""
+        if sequence == self.last_echoed_sequence:
+            return
+        applied_at_client = self.clock_sync.to_client_time(applied_at)
+        with self.lock:
+            self.last_echoed_sequence = sequence
+            input_time = self.pending_inputs.pop(sequence, None)
+            if input_time is None or applied_at_client is None:
+                return
+            # Starsze ramki nie doczekają się echa (nadpisane przez nowsze)
+            for old_sequence in [s for s in self.pending_inputs if s < sequence]:
+                del self.pending_inputs[old_sequence]
+            self.input_to_actuation.add((applied_at_client - input_time) * 1000.0)
+
+    def summary(self):
+        with self.lock:
+            return {
+                "latency_p50": self.input_to_actuation.percentile(50),
+                "latency_p95": self.input_to_actuation.percentile(95),
+                "rtt_p50": self.rtt.percentile(50),
+            }
@@ -0,0 +1,52 @@
+import threading
+import time
+
+# Jakość JPEG strumienia wideo dobierana do zmierzonej przepustowości (kbit/s)
+VIDEO_QUALITY_LADDER = [
+    (8000, 90),
+    (4000, 75),
+    (2000, 60),
+    (1000, 45),
+    (0, 30),
+]
+# Przy większych stratach schodzimy o jeden stopień niżej
+HIGH_LOSS_PERCENT = 5.0
+
+
+class LinkQualityModel:
+    """Wyniki ostatniego pomiaru łącza: RTT i jitter w ms, straty w %, przepustowość w kbit/s."""
+
+    def __init__(self):
+        self.rtt_ms = None
+        self.jitter_ms = None
+        self.loss_percent = None
+        self.throughput_kbps = None
+        self.measured_at = None
+        self.lock = threading.Lock()
+
+    def update(self, rtt_ms, jitter_ms, loss_percent, throughput_kbps):
+        with self.lock:
+            self.rtt_ms = rtt_ms
+            self.jitter_ms = jitter_ms
+            self.loss_percent = loss_percent
+            self.throughput_kbps = throughput_kbps
+            self.measured_at = time.monotonic()
+
+    def summary(self):
+        with self.lock:
+            return {
+                "rtt_ms": self.rtt_ms,
+                "jitter_ms": self.jitter_ms,
+                "loss_percent": self.loss_percent,
+                "throughput_kbps": self.throughput_kbps,
+            }
+
+    def recommended_video_quality(self):
+        """Jakość JPEG dla /video?quality=, albo None, jeśli nie było jeszcze pomiaru."""
+        with self.lock:
+            if self.throughput_kbps is None:
+                return None
+            step = next(i for i, (min_kbps, _) in enumerate(VIDEO_QUALITY_LADDER) if self.throughput_kbps >= min_kbps)
+            if self.loss_percent is not None and self.loss_percent > HIGH_LOSS_PERCENT:
+                step = min(step + 1, len(VIDEO_QUALITY_LADDER) - 1)
+            return VIDEO_QUALITY_LADDER[step][1]
@@ -1,5 +1,24 @@
-import struct
 import threading
+import numpy as np
+from models.telemetry_protocol import LEGACY_TELEMETRY_FRAME, IMU_BATCH_HEADER, IMU_SAMPLE_DTYPE
+
+IMU_HISTORY_SIZE = 2500  # ok. 10 s przy 250 Hz
+
+# Kanał telemetrii -> atrybut modelu
+CHANNEL_ATTRIBUTES = {
+    "speed": "speed",
+    "accX": "acceleration_x",
+    "accY": "acceleration_y",
+    "accZ": "acceleration_z",
+    "voltage": "voltage",
+    "current": "current",
+    "wifi_signal_strength": "wifi_signal_strength",
+    "roll": "roll",
+    "pitch": "pitch",
+    "yaw_rate": "yaw_rate",
+    "power": "power",
+    "energy_remaining": "energy_remaining",
+}
 
 class TelemetryDataModel:
     def __init__(self):
@@ -10,11 +29,22 @@ class TelemetryDataModel:
         self.voltage = 0.0
         self.current = 0.0
         self.wifi_signal_strength = 0
+        self.roll = 0.0
+        self.pitch = 0.0
+        self.yaw_rate = 0.0
+        self.power = 0.0
+        self.energy_remaining = None
+        self.channels = {}  # ostatnie wartości wszystkich kanałów, także tych bez atrybutu
+        self.timestamp = 0.0
+        self.imu_timestamps = np.zeros(IMU_HISTORY_SIZE)
+        self.imu_acceleration = np.zeros((IMU_HISTORY_SIZE, 3), dtype=np.float32)
+        self.imu_index = 0
+        self.imu_count = 0
         self.lock = threading.Lock()
 
     def update(self, data):
         with self.lock:
-            speed, acceleration_x, acceleration_y, acceleration_z, voltage, current, wifi_signal_strength = struct.unpack("ffffffi", data)
+            speed, acceleration_x, acceleration_y, acceleration_z, voltage, current, wifi_signal_strength = LEGACY_TELEMETRY_FRAME.unpack(data)
             self.speed = speed
             self.acceleration_x = acceleration_x
             self.acceleration_y = acceleration_y
@@ -23,6 +53,39 @@ class TelemetryDataModel:
             self.current = current
             self.wifi_signal_strength = wifi_signal_strength
 
+    def update_channels(self, values, timestamp=None):
+        with self.lock:
+            self.channels.update(values)
+            for channel, value in values.items():
+                attribute = CHANNEL_ATTRIBUTES.get(channel)
+                if attribute:
+                    setattr(self, attribute, value)
+            if timestamp is not None:
+                self.timestamp = timestamp
+
+    def update_imu_batch(self, payload):
+        batch_start, scale, count = IMU_BATCH_HEADER.unpack_from(payload)
+        if count == 0:
+            # Pusta paczka (np. po resecie lub przepełnieniu FIFO na Pi)
+            return
+        samples = np.frombuffer(payload, dtype=IMU_SAMPLE_DTYPE, count=count, offset=IMU_BATCH_HEADER.size)
+        timestamps = batch_start + samples["offset_us"] * 1e-6
+        acceleration = np.column_stack((samples["x"], samples["y"], samples["z"])).astype(np.float32) * scale
+
+        with self.lock:
+            indices = (self.imu_index + np.arange(count)) % IMU_HISTORY_SIZE
+            self.imu_timestamps[indices] = timestamps
+            self.imu_acceleration[indices] = acceleration
+            self.imu_index = (self.imu_index + count) % IMU_HISTORY_SIZE
+            self.imu_count = min(self.imu_count + count, IMU_HISTORY_SIZE)
+            self.acceleration_x, self.acceleration_y, self.acceleration_z = (float(v) for v in acceleration[-1])
+
+    def get_imu_samples(self):
+        """Zwraca (znaczniki czasu, przyspieszenia Nx3) w kolejności chronologicznej."""
+        with self.lock:
+            indices = (self.imu_index - self.imu_count + np.arange(self.imu_count)) % IMU_HISTORY_SIZE
+            return self.imu_timestamps[indices], self.imu_acceleration[indices]
+
     def get_acceleration_x(self):
         with self.lock:
             return self.acceleration_x
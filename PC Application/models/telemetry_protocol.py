@@ -0,0 +1,101 @@
+import json
+import struct
+import time
+import numpy as np
+
+# Nagłówek wiadomości telemetrii (musi odpowiadać src/server/protocol.py na Raspberry Pi):
+# magic, wersja, typ wiadomości, numer sekwencyjny, znacznik czasu serwera, długość danych
+TELEMETRY_MAGIC = b"RT"
+TELEMETRY_VERSION = 1
+TELEMETRY_HEADER = struct.Struct("<2sBBIdH")
+
+MSG_HELLO = 1
+MSG_SCHEMA = 2
+MSG_DATA = 3
+MSG_SUBSCRIBE = 4
+MSG_IMU_BATCH = 5
+MSG_TIME_REQUEST = 6
+MSG_TIME_RESPONSE = 7
+
+TIME_REQUEST = struct.Struct("<d")
+TIME_RESPONSE = struct.Struct("<ddd")
+
+LEGACY_TELEMETRY_FRAME = struct.Struct("ffffffi")
+
+# Paczka próbek IMU: znacznik czasu pierwszej próbki, skala (m/s^2 na LSB), liczba próbek + próbki
+IMU_BATCH_HEADER = struct.Struct("<dfH")
+IMU_SAMPLE_DTYPE = np.dtype([("offset_us", "<u4"), ("x", "<i2"), ("y", "<i2"), ("z", "<i2")])
+
+# Sonda łącza: magic, typ, id pomiaru, numer pakietu, czas nadania u klienta
+LINK_PROBE_MAGIC = b"RP"
+LINK_PROBE_HEADER = struct.Struct("<2sBIId")
+PROBE_ECHO = 1
+PROBE_BURST_REQUEST = 2
+PROBE_BURST_DATA = 3
+PROBE_BURST_REQUEST_BODY = struct.Struct("<HH")
+
+
+class FrameCodec:
+    def __init__(self, frame_id, channels, types):
+        self.frame_id = frame_id
+        self.channels = list(channels)
+        self.struct = struct.Struct("<B" + "".join(types))
+
+    def unpack(self, payload):
+        return dict(zip(self.channels, self.struct.unpack(payload)[1:]))
+
+
+class TelemetrySchema:
+    """Schemat przesłany przez serwer po połączeniu; dekodery są budowane raz, przy odbiorze schematu."""
+
+    def __init__(self, version, channels, frames):
+        self.version = version
+        self.channels = channels
+        self.codecs = {
+            frame["id"]: FrameCodec(frame["id"], frame["channels"],
+                                    [channels[name]["type"] for name in frame["channels"]])
+            for frame in frames
+        }
+
+    @classmethod
+    def from_payload(cls, payload):
+        schema = json.loads(payload.decode("utf-8"))
+        return cls(schema["version"], schema["channels"], schema["frames"])
+
+    def decode(self, payload):
+        codec = self.codecs.get(payload[0])
+        if codec is None:
+            # Ramka spoza schematu (np. nowszy serwer) - pomijamy
+            return None
+        return codec.unpack(payload)
+
+
+def pack_message(msg_type, sequence, payload=b""):
+    header = TELEMETRY_HEADER.pack(TELEMETRY_MAGIC, TELEMETRY_VERSION, msg_type,
+                                   sequence & 0xFFFFFFFF, time.monotonic(), len(payload))
+    return header + payload
+
+
+ROLE_DRIVER = "driver"
+ROLE_SPECTATOR = "spectator"
+
+
+def pack_hello(role=ROLE_DRIVER):
+    return pack_message(MSG_HELLO, 0, json.dumps({"version": TELEMETRY_VERSION, "role": role}).encode("utf-8"))
+
+
+def pack_subscribe(sequence, subscriptions, imu_batch=False):
+    """subscriptions: lista {"channels": [...], "rate_hz": f} albo {"channels": [...], "decimation": n}."""
+    request = {"subscriptions": subscriptions, "imu_batch": imu_batch}
+    return pack_message(MSG_SUBSCRIBE, sequence, json.dumps(request).encode("utf-8"))
+
+
+def pack_time_request(sequence, client_time):
+    return pack_message(MSG_TIME_REQUEST, sequence, TIME_REQUEST.pack(client_time))
+
+
+def unpack_header(data):
+    magic, version, msg_type, sequence, timestamp, length = TELEMETRY_HEADER.unpack(data)
+    if magic != TELEMETRY_MAGIC:
+        raise ValueError("bad telemetry magic")
+    return version, msg_type, sequence, timestamp, length
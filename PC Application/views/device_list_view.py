@@ -26,7 +26,15 @@ class DeviceListView:
             for i, device in enumerate(devices):
                 color = self.highlight_color if i == selected_index else self.text_color
                 device_text = f"{device.name} ({device.ip})"
+                if device.battery_voltage is not None:
+                    device_text += f" {device.battery_voltage:.1f} V"
+                if device.occupied:
+                    device_text += " - busy"
                 text_surface = self.font.render(device_text, True, color)
                 text_rect = text_surface.get_rect(center=(width // 2, height // 2 - (len(devices) // 2 - i) * spacing))
                 self.screen.blit(text_surface, text_rect)
+
+            hint_surface = self.font.render("Enter - drive, S - spectate", True, self.text_color)
+            hint_rect = hint_surface.get_rect(center=(width // 2, height - spacing))
+            self.screen.blit(hint_surface, hint_rect)
         pygame.display.flip()
\ No newline at end of file
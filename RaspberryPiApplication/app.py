@@ -1,14 +1,29 @@
+import argparse
 import threading
-from src.server.server import RCServer
+from src import hal
+from src.server.app_logging import setup_logging, stop_logging
+from src.server.server import RCServer, HTTP_PORT
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="RC car server")
+    parser.add_argument("--backend", choices=hal.BACKENDS,
+                        help=f"hardware backend (default: ${hal.BACKEND_ENV} or {hal.DEFAULT_BACKEND})")
+    parser.add_argument("--replay", help=f"sensor log for the replay backend (default: ${hal.REPLAY_LOG_ENV})")
+    parser.add_argument("--record", help=f"record sensor reads from real hardware (default: ${hal.RECORD_ENV})")
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
+    args = parse_args()
+    setup_logging()
+    hal.configure(args.backend, replay_log=args.replay, record_path=args.record)
     server = RCServer()
-    threading.Thread(target=server.start_broadcasting, daemon=True).start()
-    threading.Thread(target=server.handle_control_connection, daemon=True).start()
-    threading.Thread(target=server.handle_telemetry_connection, daemon=True).start()
-    threading.Thread(target=server.monitor_network, daemon=True).start()
+    threading.Thread(target=server.serve_network, daemon=True).start()
 
     try:
-        server.app.run(host='0.0.0.0', port=8000)
+        server.app.run(host='0.0.0.0', port=HTTP_PORT)
     except KeyboardInterrupt:
-        server.stop()
\ No newline at end of file
+        server.stop()
+    finally:
+        stop_logging()
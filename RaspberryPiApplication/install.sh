@@ -29,9 +29,15 @@ sudo apt install -y \
       pkg-config libjpeg-dev zlib1g-dev \
 
 sudo pip install flask
+# Required: sensor processing, filters, steering calibration and the fake hardware backend
+sudo pip install numpy
 sudo pip install smbus2
 sudo pip install pigpio
 sudo pip install picamera2
+# Optional: Wi-Fi statistics over nl80211 (bitrate, tx retries); without it /proc/net/wireless is used
+sudo pip install pyroute2
+# Optional: faster IIR filtering of sensor channels (scipy.signal.lfilter); without it a NumPy loop is used
+sudo pip install scipy
 
 
 
@@ -56,7 +62,7 @@ if [[ ! "$device_name" =~ ^[a-zA-Z0-9-]+$ || "$device_name" =~ ^- || "$device_na
   exit 1
 fi
 
-sed -i 's/"name": "RaspberryPiControlServer"/"name": "'"$device_name"'"/' "$SERVER_FILE"
+sed -i 's/^SERVER_NAME = ".*"/SERVER_NAME = "'"$device_name"'"/' "$SERVER_FILE"
 sed -i 's/^ssid=RaspberryPiAP/ssid='"$device_name"'/' "$HOSTAPD_FILE"
 
 chmod +x "$SCRIPT_DIR/app.py"
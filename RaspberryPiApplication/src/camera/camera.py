@@ -1,10 +1,22 @@
-from picamera2 import Picamera2
+import logging
 from PIL import Image
 import io
+import os
+import threading
+import time
+from src.hal import get_backend
+
+logger = logging.getLogger(__name__)
+
+# Po tym czasie bez nowej klatki klient sprawdza ponownie, czy kamera nadal działa
+FRAME_WAIT_TIMEOUT = 1.0
+DEFAULT_JPEG_QUALITY = 100
+# Koder ma niższy priorytet niż wątki sterowania i telemetrii
+ENCODER_NICE = 10
 
 class Camera:
     def __init__(self):
-        self.picam2 = Picamera2()
+        self.picam2 = get_backend().camera()
         camera_config = self.picam2.create_video_configuration(
             # main={"size": (720, 480)},
             main={"size": (640, 360)},
@@ -12,15 +24,108 @@ class Camera:
         )
         self.picam2.configure(camera_config)
         self.picam2.start()
+        self.suspended = False
+
+        # Jeden koder JPEG współdzielony przez wszystkich odbiorców strumienia;
+        # każda klatka jest kodowana raz dla każdej jakości, o którą proszą klienci
+        self.frame_condition = threading.Condition()
+        self.jpeg_data = {}
+        self.frame_id = 0
+        self.clients = {}
+        self.encoder_thread = None
 
-    def generate_frames(self):
+        # Ograniczenia nakładane przez QosScheduler
+        self.max_fps = None
+        self.scale = 1.0
+        self.max_quality = DEFAULT_JPEG_QUALITY
+
+    def set_limits(self, max_fps, scale, max_quality):
+        with self.frame_condition:
+            self.max_fps = max_fps
+            self.scale = scale
+            self.max_quality = max_quality
+
+    def _encode_loop(self):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), ENCODER_NICE)
+        except (AttributeError, OSError) as e:
+            logger.warning("Could not lower encoder priority: %s", e)
+        next_frame_time = time.monotonic()
         while True:
+            with self.frame_condition:
+                if not self.clients:
+                    self.encoder_thread = None
+                    return
+                qualities = list(self.clients)
+                max_fps, scale, max_quality = self.max_fps, self.scale, self.max_quality
+            if max_fps:
+                delay = next_frame_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_frame_time = max(next_frame_time + 1.0 / max_fps, time.monotonic())
             frame = self.picam2.capture_array("main")
             image = Image.fromarray(frame)
             if image.mode == "RGBA":
                 image = image.convert("RGB")
-            buffer = io.BytesIO()
-            image.save(buffer, format="JPEG", quality=100)
-            jpeg_data = buffer.getvalue()
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg_data + b'\r\n')
\ No newline at end of file
+            if scale < 1.0:
+                image = image.reduce(round(1.0 / scale))
+            jpeg_data = {}
+            for quality in qualities:
+                buffer = io.BytesIO()
+                image.save(buffer, format="JPEG", quality=min(quality, max_quality))
+                jpeg_data[quality] = buffer.getvalue()
+            with self.frame_condition:
+                self.jpeg_data = jpeg_data
+                self.frame_id += 1
+                self.frame_condition.notify_all()
+
+    def suspend(self):
+        """Zatrzymuje kamerę, jeśli nikt nie ogląda obrazu."""
+        with self.frame_condition:
+            # Koder kończy pracę dopiero przy kolejnym obiegu, po odejściu ostatniego klienta
+            if self.clients or self.encoder_thread is not None or self.suspended:
+                return
+            self.picam2.stop()
+            self.suspended = True
+
+    def resume(self):
+        with self.frame_condition:
+            self._resume_locked()
+
+    def _resume_locked(self):
+        if self.suspended:
+            self.picam2.start()
+            self.suspended = False
+
+    def _add_client(self, quality):
+        with self.frame_condition:
+            self._resume_locked()
+            self.clients[quality] = self.clients.get(quality, 0) + 1
+            if self.encoder_thread is None:
+                self.encoder_thread = threading.Thread(target=self._encode_loop, daemon=True)
+                self.encoder_thread.start()
+
+    def _remove_client(self, quality):
+        with self.frame_condition:
+            self.clients[quality] -= 1
+            if self.clients[quality] == 0:
+                del self.clients[quality]
+
+    def generate_frames(self, quality=None):
+        """Wysyła najnowszą klatkę; wolny klient pomija klatki zamiast spowalniać pozostałych."""
+        quality = DEFAULT_JPEG_QUALITY if quality is None else quality
+        self._add_client(quality)
+        try:
+            last_frame_id = 0
+            while True:
+                with self.frame_condition:
+                    if not self.frame_condition.wait_for(
+                            lambda: self.frame_id != last_frame_id and quality in self.jpeg_data,
+                            FRAME_WAIT_TIMEOUT):
+                        continue
+                    last_frame_id = self.frame_id
+                    jpeg_data = self.jpeg_data[quality]
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + jpeg_data + b'\r\n')
+        finally:
+            self._remove_client(quality)
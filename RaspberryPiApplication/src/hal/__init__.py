@@ -0,0 +1,64 @@
+"""Warstwa sprzętowa: moduły czujników i wyjść biorą GPIO, pigpio, I2C i kamerę stąd, a nie importują bibliotek Pi.
+
+Backend jest wybierany raz, przed utworzeniem pierwszego urządzenia:
+- "real" - prawdziwy sprzęt (RPi.GPIO, pigpio, smbus2, picamera2),
+- "fake" - deterministyczny model pojazdu: rejestry I2C, ciąg impulsów z koła, generowany obraz,
+- "replay" - odczyty I2C i zbocza GPIO odtwarzane z zapisu (RC_HARDWARE_RECORD na prawdziwym sprzęcie).
+"""
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("real", "fake", "replay")
+DEFAULT_BACKEND = "real"
+BACKEND_ENV = "RC_HARDWARE_BACKEND"
+# Plik zapisu do odtworzenia (backend "replay") i plik, do którego prawdziwy sprzęt zapisuje odczyty
+REPLAY_LOG_ENV = "RC_REPLAY_LOG"
+RECORD_ENV = "RC_HARDWARE_RECORD"
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name, replay_log=None, record_path=None):
+    if name == "real":
+        from src.hal.real import RealBackend
+        return RealBackend(record_path)
+    if name == "fake":
+        from src.hal.fake import FakeBackend
+        return FakeBackend()
+    if name == "replay":
+        if not replay_log:
+            raise ValueError(f"replay backend needs a sensor log ({REPLAY_LOG_ENV} or --replay)")
+        from src.hal.replay import ReplayBackend
+        return ReplayBackend(replay_log)
+    raise ValueError(f"unknown hardware backend {name!r}, expected one of {', '.join(BACKENDS)}")
+
+
+def configure(name=None, replay_log=None, record_path=None):
+    """Wybiera backend; bez argumentów - według zmiennych środowiskowych. Wywoływane przed startem serwera."""
+    global _backend
+    with _backend_lock:
+        if _backend is not None:
+            raise RuntimeError(f"hardware backend already in use: {_backend.name}")
+        _backend = create_backend(name or os.environ.get(BACKEND_ENV, DEFAULT_BACKEND),
+                                  replay_log or os.environ.get(REPLAY_LOG_ENV),
+                                  record_path or os.environ.get(RECORD_ENV))
+        logger.info("Hardware backend: %s", _backend.name)
+        return _backend
+
+
+def get_backend():
+    with _backend_lock:
+        backend = _backend
+    return backend if backend is not None else _configure_default()
+
+
+def _configure_default():
+    try:
+        return configure()
+    except RuntimeError:
+        # Inny wątek zdążył wybrać backend
+        return _backend
@@ -0,0 +1,614 @@
+import errno
+import itertools
+import math
+import threading
+import time
+import numpy as np
+from src.motor.l9110s import L9110S_PIN_A, L9110S_PIN_B
+from src.servo.servo_controller import SERVO_PIN
+from src.sensors.speed_sensor import SENSOR_PIN, WHEEL_DIAMETER_MM, PULSES_PER_REVOLUTION, TICK_MODULUS
+from src.sensors.ina3221 import (
+    INA3221_ADDRESS, INA3221_REG_CONFIG, INA3221_REG_MASK_ENABLE, INA3221_MASK_CVRF, INA3221_REG_SHUNTVOLTAGE_1,
+    INA3221_REG_BUSVOLTAGE_1, INA3221_CONFIG_MODE_MASK, INA3221_CHANNELS, BATTERY_VOLTAGE_CHANNEL,
+    BATTERY_CURRENT_CHANNEL, SHUNT_RESISTOR_VALUE, conversion_cycle_time
+)
+from src.sensors.mpu6500 import (
+    MPU6500_ADDR, SMPLRT_DIV, FIFO_EN, INT_STATUS, ACCEL_XOUT_H, USER_CTRL, FIFO_COUNT_H, FIFO_R_W, FIFO_SIZE,
+    USER_CTRL_FIFO_EN, USER_CTRL_FIFO_RST, INT_STATUS_FIFO_OFLOW, INTERNAL_SAMPLE_RATE_HZ, ACCEL_SCALE, GYRO_SCALE
+)
+from src.sensors.as5600 import AS5600_ADDR, AS5600_STATUS, STATUS_MAGNET_DETECTED, ANGLE_COUNTS
+from src.sensors.pcf8574 import PCF8574_ADDR
+
+# Ziarno generatora szumu - każde uruchomienie daje ten sam ciąg zakłóceń
+FAKE_SEED = 1234
+# Model napędu: wypełnienie poniżej progu nie rusza silnika, potem prędkość rośnie liniowo do maksymalnej
+MOTOR_DEADZONE = 0.35
+TOP_SPEED = 3.0  # m/s
+SPEED_TIME_CONSTANT = 0.3  # s
+# Model skrętu: kąt kół w funkcji impulsu serwa i opóźnienie serwa
+STEERING_DEG_PER_US = 0.08
+STEERING_TIME_CONSTANT = 0.06  # s
+WHEELBASE = 0.25  # m
+# Pobór prądu i napięcie pakietu 2S
+IDLE_CURRENT = 150.0  # mA
+MOTOR_CURRENT = 1800.0  # mA przy pełnym wypełnieniu
+BATTERY_VOLTAGE = 7.9
+BATTERY_RESISTANCE = 0.15  # Ohm
+AUX_RAIL = (5.0, 350.0)  # kanał 3: V, mA
+ACCEL_NOISE = 0.05  # m/s^2
+GYRO_NOISE = 0.2  # deg/s
+# Sprawdzanie prędkości między impulsami, żeby koło ruszało szybko po postoju
+PULSE_POLL_INTERVAL = 0.01
+FAKE_FRAME_SIZE = (640, 360)
+FAKE_FRAME_RATE = 24
+WHO_AM_I = 0x75
+MPU6500_WHO_AM_I = 0x70
+
+
+def current_tick():
+    """Zegar w mikrosekundach zawijany jak tick pigpio."""
+    return int(time.monotonic() * 1e6) % TICK_MODULUS
+
+
+def swap16(value):
+    return ((value & 0xFF) << 8) | ((value >> 8) & 0xFF)
+
+
+class FakeVehicle:
+    """Prosty model samochodu: wyjścia (PWM silnika, impuls serwa) zmieniają stan, fałszywe czujniki go odczytują."""
+
+    def __init__(self, seed=FAKE_SEED):
+        self.lock = threading.Lock()
+        self.rng = np.random.default_rng(seed)
+        self.duties = {}
+        self.servo_pulse = 0
+        self.speed = 0.0
+        self.acceleration = 0.0
+        self.steering = 0.0
+        self.updated_at = time.monotonic()
+
+    def set_duty(self, pin, fraction):
+        with self.lock:
+            self._advance(time.monotonic())
+            self.duties[pin] = min(max(fraction, 0.0), 1.0)
+
+    def set_servo_pulse(self, pulse):
+        with self.lock:
+            self._advance(time.monotonic())
+            self.servo_pulse = pulse
+
+    def _drive(self):
+        drive = self.duties.get(L9110S_PIN_A, 0.0) - self.duties.get(L9110S_PIN_B, 0.0)
+        return math.copysign(max(abs(drive) - MOTOR_DEADZONE, 0.0) / (1.0 - MOTOR_DEADZONE), drive)
+
+    def _advance(self, now):
+        dt = now - self.updated_at
+        if dt <= 0:
+            return
+        self.updated_at = now
+        speed = self.speed + (self._drive() * TOP_SPEED - self.speed) * (1.0 - math.exp(-dt / SPEED_TIME_CONSTANT))
+        self.acceleration = (speed - self.speed) / dt
+        self.speed = speed
+        # Impuls 0 - serwo bez zasilania, koła zostają, gdzie były
+        if self.servo_pulse:
+            target = (self.servo_pulse - 1500) * STEERING_DEG_PER_US
+            self.steering += (target - self.steering) * (1.0 - math.exp(-dt / STEERING_TIME_CONSTANT))
+
+    def state(self):
+        with self.lock:
+            self._advance(time.monotonic())
+            yaw_rate = self.speed / WHEELBASE * math.tan(math.radians(self.steering))
+            return {
+                "speed": self.speed,
+                "acceleration": self.acceleration,
+                "steering": self.steering,
+                "yaw_rate": math.degrees(yaw_rate),
+                "lateral_acceleration": self.speed * yaw_rate,
+                "current": IDLE_CURRENT + MOTOR_CURRENT * abs(self._drive()),
+            }
+
+    def imu_samples(self, count):
+        """count próbek surowych (int16) ax, ay, az, gx, gy, gz z szumem."""
+        state = self.state()
+        mean = np.array([state["acceleration"] / ACCEL_SCALE, state["lateral_acceleration"] / ACCEL_SCALE,
+                         9.81 / ACCEL_SCALE, 0.0, 0.0, state["yaw_rate"] / GYRO_SCALE])
+        noise = np.array([ACCEL_NOISE / ACCEL_SCALE] * 3 + [GYRO_NOISE / GYRO_SCALE] * 3)
+        with self.lock:
+            samples = mean + self.rng.normal(size=(count, 6)) * noise
+        return np.clip(np.round(samples), -32768, 32767).astype(">i2")
+
+
+class FakeI2cMsg:
+    """Odpowiednik smbus2.i2c_msg."""
+
+    I2C_M_RD = 0x0001
+
+    def __init__(self, address, data, flags):
+        self.addr = address
+        self.buf = bytearray(data)
+        self.flags = flags
+        self.len = len(self.buf)
+
+    @classmethod
+    def write(cls, address, data):
+        return cls(address, data, 0)
+
+    @classmethod
+    def read(cls, address, length):
+        return cls(address, bytes(length), cls.I2C_M_RD)
+
+    def __iter__(self):
+        return iter(self.buf)
+
+    def __bytes__(self):
+        return bytes(self.buf)
+
+
+class FakeI2CDevice:
+    """Układ z mapą rejestrów bajtowych i autoinkrementacją adresu."""
+
+    def __init__(self):
+        self.registers = bytearray(256)
+
+    def read(self, register, length):
+        return list(self.registers[register:register + length])
+
+    def write(self, register, data):
+        self.registers[register:register + len(data)] = bytes(data)
+
+    def read_word(self, register):
+        low, high = self.read(register, 2)
+        return low | high << 8
+
+    def write_word(self, register, value):
+        self.write(register, [value & 0xFF, (value >> 8) & 0xFF])
+
+    def read_byte(self):
+        return self.registers[0]
+
+    def write_byte(self, value):
+        self.registers[0] = value
+
+
+class FakeINA3221(FakeI2CDevice):
+    """Rejestry 16-bitowe (starszy bajt pierwszy); flaga CVRF ustawiana w rytmie cyklu konwersji z konfiguracji."""
+
+    def __init__(self, vehicle):
+        super().__init__()
+        self.vehicle = vehicle
+        self.words = {INA3221_REG_CONFIG: 0x7127}
+        self.conversion_started = time.monotonic()
+        self.reported_conversions = 0
+
+    def _conversion_ready(self):
+        config = self.words[INA3221_REG_CONFIG]
+        mode = config & INA3221_CONFIG_MODE_MASK
+        elapsed = time.monotonic() - self.conversion_started
+        cycle = conversion_cycle_time(config)
+        if mode == 0 or elapsed < cycle:
+            return False
+        # Tryb ciągły (bit 2) - kolejne konwersje co cykl; wyzwalany - jedna
+        conversions = int(elapsed // cycle) if mode & 0x04 else 1
+        ready = conversions > self.reported_conversions
+        self.reported_conversions = conversions
+        return ready
+
+    def _measurement(self, register):
+        state = self.vehicle.state()
+        battery_current = state["current"]
+        battery_voltage = BATTERY_VOLTAGE - BATTERY_RESISTANCE * battery_current / 1000.0
+        channels = {channel: AUX_RAIL for channel in INA3221_CHANNELS}
+        channels[BATTERY_CURRENT_CHANNEL] = (battery_voltage, battery_current)
+        channels[BATTERY_VOLTAGE_CHANNEL] = (battery_voltage, channels[BATTERY_VOLTAGE_CHANNEL][1])
+        channel, is_bus = divmod(register - INA3221_REG_SHUNTVOLTAGE_1, 2)
+        voltage, current = channels[channel + 1]
+        # Bus: LSB 8 mV, bocznik: LSB 40 uV; trzy najmłodsze bity zawsze zerowe
+        raw = voltage * 1000.0 if is_bus else current * SHUNT_RESISTOR_VALUE / 0.005
+        return int(round(raw)) & 0xFFF8
+
+    def read_word(self, register):
+        if register == INA3221_REG_MASK_ENABLE:
+            value = INA3221_MASK_CVRF if self._conversion_ready() else 0
+        elif INA3221_REG_SHUNTVOLTAGE_1 <= register < INA3221_REG_BUSVOLTAGE_1 + 2 * len(INA3221_CHANNELS) - 1:
+            value = self._measurement(register)
+        else:
+            value = self.words.get(register, 0)
+        # SMBus składa słowo od młodszego bajtu, a układ wysyła starszy pierwszy
+        return swap16(value)
+
+    def write_word(self, register, value):
+        self.words[register] = swap16(value)
+        if register == INA3221_REG_CONFIG:
+            self.conversion_started = time.monotonic()
+            self.reported_conversions = 0
+
+
+class FakeAS5600(FakeI2CDevice):
+    def __init__(self, vehicle):
+        super().__init__()
+        self.vehicle = vehicle
+
+    def read(self, register, length):
+        counts = int(round(self.vehicle.state()["steering"] % 360.0 / 360.0 * ANGLE_COUNTS)) % ANGLE_COUNTS
+        self.registers[AS5600_STATUS] = STATUS_MAGNET_DETECTED
+        # RAW ANGLE (0x0C) i ANGLE (0x0E) - bez ustawionego zakresu są równe
+        self.registers[0x0C:0x10] = bytes([counts >> 8, counts & 0xFF, counts >> 8, counts & 0xFF])
+        return super().read(register, length)
+
+
+class FakeMPU6500(FakeI2CDevice):
+    """Akcelerometr i żyroskop z FIFO napełnianym próbkami modelu w rytmie SMPLRT_DIV."""
+
+    def __init__(self, vehicle):
+        super().__init__()
+        self.vehicle = vehicle
+        self.registers[WHO_AM_I] = MPU6500_WHO_AM_I
+        self.fifo = bytearray()
+        self.fifo_time = time.monotonic()
+        self.overflow = False
+
+    def write(self, register, data):
+        super().write(register, data)
+        if register == USER_CTRL and data[0] & USER_CTRL_FIFO_RST:
+            self.fifo.clear()
+            self.overflow = False
+            self.fifo_time = time.monotonic()
+            self.registers[USER_CTRL] &= ~USER_CTRL_FIFO_RST
+
+    def _fill(self):
+        now = time.monotonic()
+        if not (self.registers[USER_CTRL] & USER_CTRL_FIFO_EN and self.registers[FIFO_EN]):
+            self.fifo_time = now
+            return
+        rate = INTERNAL_SAMPLE_RATE_HZ / (self.registers[SMPLRT_DIV] + 1)
+        count = int((now - self.fifo_time) * rate)
+        if count <= 0:
+            return
+        self.fifo_time += count / rate
+        # Więcej próbek niż zmieści FIFO i tak oznacza przepełnienie
+        self.fifo += self.vehicle.imu_samples(min(count, FIFO_SIZE // 12 + 1)).tobytes()
+        if len(self.fifo) > FIFO_SIZE:
+            del self.fifo[FIFO_SIZE:]
+            self.overflow = True
+
+    def read(self, register, length):
+        self._fill()
+        if register == FIFO_R_W:
+            data = bytes(self.fifo[:length])
+            del self.fifo[:length]
+            return list(data.ljust(length, b"\0"))
+        self.registers[INT_STATUS] = INT_STATUS_FIFO_OFLOW if self.overflow else 0
+        self.overflow = False
+        self.registers[FIFO_COUNT_H:FIFO_COUNT_H + 2] = len(self.fifo).to_bytes(2, "big")
+        # Akcelerometr, temperatura (tu zero) i żyroskop - kolejne rejestry od ACCEL_XOUT_H
+        sample = self.vehicle.imu_samples(1)[0]
+        self.registers[ACCEL_XOUT_H:ACCEL_XOUT_H + 14] = np.concatenate([sample[:3], [0], sample[3:]]).astype(">i2").tobytes()
+        return super().read(register, length)
+
+
+class FakeSMBus:
+    """Odpowiednik smbus2.SMBus z układami z modelu; brak układu pod adresem to błąd jak na prawdziwej magistrali."""
+
+    def __init__(self, devices):
+        self.devices = devices
+
+    def _device(self, address):
+        try:
+            return self.devices[address]
+        except KeyError:
+            raise OSError(errno.EREMOTEIO, "Remote I/O error") from None
+
+    def read_byte_data(self, address, register):
+        return self._device(address).read(register, 1)[0]
+
+    def write_byte_data(self, address, register, value):
+        self._device(address).write(register, [value])
+
+    def read_word_data(self, address, register):
+        return self._device(address).read_word(register)
+
+    def write_word_data(self, address, register, value):
+        self._device(address).write_word(register, value)
+
+    def read_byte(self, address):
+        return self._device(address).read_byte()
+
+    def write_byte(self, address, value):
+        self._device(address).write_byte(value)
+
+    def read_i2c_block_data(self, address, register, length):
+        return self._device(address).read(register, length)
+
+    def i2c_rdwr(self, *messages):
+        register = 0
+        for message in messages:
+            device = self._device(message.addr)
+            if message.flags & FakeI2cMsg.I2C_M_RD:
+                message.buf[:] = bytes(device.read(register, message.len))
+            else:
+                register = message.buf[0]
+                if message.len > 1:
+                    device.write(register, list(message.buf[1:]))
+
+    def close(self):
+        pass
+
+
+def fake_devices(vehicle):
+    return {
+        INA3221_ADDRESS: FakeINA3221(vehicle),
+        MPU6500_ADDR: FakeMPU6500(vehicle),
+        AS5600_ADDR: FakeAS5600(vehicle),
+        PCF8574_ADDR: FakeI2CDevice(),
+    }
+
+
+class PulseListeners:
+    """Wywołania zwrotne zboczy (w stylu pigpio: gpio, poziom, tick) zarejestrowane dla pinów."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.listeners = {}
+        self.handles = itertools.count()
+
+    def add_listener(self, pin, func):
+        with self.lock:
+            handle = next(self.handles)
+            self.listeners[handle] = (pin, func)
+            self._listener_added()
+            return handle
+
+    def remove_listener(self, handle):
+        with self.lock:
+            self.listeners.pop(handle, None)
+
+    def remove_pin(self, pin):
+        with self.lock:
+            self.listeners = {handle: entry for handle, entry in self.listeners.items() if entry[0] != pin}
+
+    def fire(self, pin, tick):
+        with self.lock:
+            funcs = [func for listener_pin, func in self.listeners.values() if listener_pin == pin]
+        for func in funcs:
+            func(pin, 1, tick)
+
+    def _listener_added(self):
+        pass
+
+
+class SimulatedPulseTrain(PulseListeners):
+    """Impulsy czujnika prędkości z modelu; wątek startuje przy pierwszym odbiorcy."""
+
+    def __init__(self, vehicle, pin=SENSOR_PIN):
+        super().__init__()
+        self.vehicle = vehicle
+        self.pin = pin
+        self.distance_per_pulse = WHEEL_DIAMETER_MM * math.pi / 1000.0 / PULSES_PER_REVOLUTION
+        self.thread = None
+
+    def _listener_added(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True, name="fake-pulses")
+            self.thread.start()
+
+    def _run(self):
+        phase = 0.0
+        last = time.monotonic()
+        while True:
+            rate = abs(self.vehicle.state()["speed"]) / self.distance_per_pulse
+            now = time.monotonic()
+            phase += rate * (now - last)
+            last = now
+            if phase >= 1.0:
+                # Przy zbyt rzadkim budzeniu zbocza nie są nadrabiane seriami
+                phase = min(phase - 1.0, 1.0)
+                self.fire(self.pin, current_tick())
+            delay = (1.0 - phase) / rate if rate > 0 else PULSE_POLL_INTERVAL
+            time.sleep(min(max(delay, 0.0), PULSE_POLL_INTERVAL))
+
+
+class FakeGpioPwm:
+    def __init__(self, vehicle, pin):
+        self.vehicle = vehicle
+        self.pin = pin
+
+    def start(self, duty):
+        self.vehicle.set_duty(self.pin, duty / 100.0)
+
+    def ChangeDutyCycle(self, duty):
+        self.vehicle.set_duty(self.pin, duty / 100.0)
+
+    def ChangeFrequency(self, frequency):
+        pass
+
+    def stop(self):
+        self.vehicle.set_duty(self.pin, 0.0)
+
+
+class FakeGpio:
+    """Odpowiednik modułu RPi.GPIO."""
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self, vehicle, pulses):
+        self.vehicle = vehicle
+        self.pulses = pulses
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        pass
+
+    def output(self, pin, value):
+        self.vehicle.set_duty(pin, 1.0 if value else 0.0)
+
+    def input(self, pin):
+        return self.LOW
+
+    def PWM(self, pin, frequency):
+        return FakeGpioPwm(self.vehicle, pin)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        if callback:
+            self.pulses.add_listener(pin, lambda gpio, level, tick: callback(gpio))
+
+    def remove_event_detect(self, pin):
+        self.pulses.remove_pin(pin)
+
+    def cleanup(self, *pins):
+        pass
+
+
+class FakeCallback:
+    def __init__(self, pulses, handle):
+        self.pulses = pulses
+        self.handle = handle
+
+    def cancel(self):
+        self.pulses.remove_listener(self.handle)
+
+
+class FakePi:
+    """Odpowiednik pigpio.pi() połączonego z demonem; PWM i impulsy serwa trafiają do modelu."""
+
+    connected = True
+
+    def __init__(self, vehicle, pulses):
+        self.vehicle = vehicle
+        self.pulses = pulses
+        self.ranges = {}
+
+    def set_mode(self, gpio, mode):
+        return 0
+
+    def set_pull_up_down(self, gpio, pud):
+        return 0
+
+    def set_glitch_filter(self, user_gpio, steady):
+        return 0
+
+    def callback(self, user_gpio, edge=0, func=None):
+        return FakeCallback(self.pulses, self.pulses.add_listener(user_gpio, func))
+
+    def get_current_tick(self):
+        return current_tick()
+
+    def set_PWM_frequency(self, user_gpio, frequency):
+        return frequency
+
+    def set_PWM_range(self, user_gpio, range_):
+        self.ranges[user_gpio] = range_
+        return 0
+
+    def set_PWM_dutycycle(self, user_gpio, dutycycle):
+        self.vehicle.set_duty(user_gpio, dutycycle / self.ranges.get(user_gpio, 255))
+        return 0
+
+    def hardware_PWM(self, gpio, frequency, dutycycle):
+        self.vehicle.set_duty(gpio, dutycycle / 1000000.0)
+        return 0
+
+    def set_servo_pulsewidth(self, user_gpio, pulsewidth):
+        if user_gpio == SERVO_PIN:
+            self.vehicle.set_servo_pulse(pulsewidth)
+        return 0
+
+    def stop(self):
+        pass
+
+
+class FakePigpio:
+    """Odpowiednik modułu pigpio: stałe i pi()."""
+
+    INPUT = 0
+    OUTPUT = 1
+    PUD_OFF = 0
+    PUD_DOWN = 1
+    PUD_UP = 2
+    RISING_EDGE = 0
+    FALLING_EDGE = 1
+    EITHER_EDGE = 2
+
+    def __init__(self, vehicle, pulses):
+        self.vehicle = vehicle
+        self.pulses = pulses
+
+    def pi(self, *args, **kwargs):
+        return FakePi(self.vehicle, self.pulses)
+
+
+class FakeCamera:
+    """Odpowiednik Picamera2: generowany obraz (przesuwający się gradient) w tempie FrameRate z konfiguracji."""
+
+    def __init__(self):
+        self.size = FAKE_FRAME_SIZE
+        self.frame_rate = FAKE_FRAME_RATE
+        self.frame_index = 0
+        self.next_frame_time = 0.0
+        self.started = False
+        self.pattern = None
+
+    def create_video_configuration(self, main=None, controls=None):
+        return {"main": dict(main or {}), "controls": dict(controls or {})}
+
+    def configure(self, config):
+        self.size = tuple(config["main"].get("size", FAKE_FRAME_SIZE))
+        self.frame_rate = config["controls"].get("FrameRate", FAKE_FRAME_RATE)
+        width, height = self.size
+        x = np.arange(width, dtype=np.uint16)[None, :]
+        y = np.arange(height, dtype=np.uint16)[:, None]
+        self.pattern = np.stack(np.broadcast_arrays(x * 255 // width, y * 255 // height,
+                                                    (x + y) * 255 // (width + height)), axis=-1).astype(np.uint8)
+
+    def start(self):
+        if self.pattern is None:
+            self.configure(self.create_video_configuration())
+        self.started = True
+        self.next_frame_time = time.monotonic()
+
+    def stop(self):
+        self.started = False
+
+    def capture_array(self, name="main"):
+        # Jak w prawdziwej kamerze: wywołanie czeka na kolejną klatkę
+        delay = self.next_frame_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_frame_time = max(self.next_frame_time + 1.0 / self.frame_rate, time.monotonic())
+        self.frame_index += 1
+        return np.roll(self.pattern, self.frame_index * 4, axis=1)
+
+
+class FakeBackend:
+    name = "fake"
+
+    def __init__(self):
+        self.vehicle = FakeVehicle()
+        pulses = SimulatedPulseTrain(self.vehicle)
+        self.gpio = FakeGpio(self.vehicle, pulses)
+        self.pigpio = FakePigpio(self.vehicle, pulses)
+        self.i2c_msg = FakeI2cMsg
+
+    def smbus(self, bus_number):
+        return FakeSMBus(fake_devices(self.vehicle))
+
+    def camera(self):
+        return FakeCamera()
+
+    def close(self):
+        pass
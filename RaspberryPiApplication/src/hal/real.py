@@ -0,0 +1,35 @@
+class RealBackend:
+    """Prawdziwy sprzęt; biblioteki Pi są importowane dopiero przy wyborze tego backendu."""
+
+    name = "real"
+
+    def __init__(self, record_path=None):
+        import RPi.GPIO
+        import pigpio
+        import smbus2
+        self.gpio = RPi.GPIO
+        self.pigpio = pigpio
+        self.i2c_msg = smbus2.i2c_msg
+        self._smbus2 = smbus2
+        # Zapis odczytów I2C i zboczy GPIO do późniejszego odtworzenia backendem "replay"
+        self.recorder = None
+        if record_path:
+            from src.hal.replay import SensorRecorder, RecordingGpio, RecordingPigpio
+            self.recorder = SensorRecorder(record_path)
+            self.gpio = RecordingGpio(self.gpio, self.recorder)
+            self.pigpio = RecordingPigpio(self.pigpio, self.recorder)
+
+    def smbus(self, bus_number):
+        bus = self._smbus2.SMBus(bus_number)
+        if self.recorder:
+            from src.hal.replay import RecordingSMBus
+            return RecordingSMBus(bus, self.recorder)
+        return bus
+
+    def camera(self):
+        from picamera2 import Picamera2
+        return Picamera2()
+
+    def close(self):
+        if self.recorder:
+            self.recorder.close()
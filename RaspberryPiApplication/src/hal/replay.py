@@ -0,0 +1,268 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from src.hal.fake import (
+    FakeVehicle, FakeGpio, FakePigpio, FakeI2cMsg, FakeCamera, PulseListeners, current_tick, TICK_MODULUS
+)
+
+logger = logging.getLogger(__name__)
+
+# Zapis to JSON lines, jeden obiekt na linię, czas "t" w sekundach od początku zapisu:
+#   {"t": 0.0123, "i2c": "read_word_data", "addr": 64, "reg": 15, "len": 2, "result": 256}
+#   {"t": 0.0150, "edge": 22, "tick": 123456789}
+# Zapisywane są tylko odczyty - zapisy do układów nie wpływają na odtwarzanie.
+READ_OPERATIONS = ("read_byte_data", "read_word_data", "read_i2c_block_data", "read_byte", "read_block")
+
+
+class SensorRecorder:
+    """Zapisuje odczyty I2C i zbocza GPIO z prawdziwego sprzętu do pliku dla backendu "replay"."""
+
+    def __init__(self, path):
+        self.file = open(path, "w")
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+
+    def _write(self, entry):
+        entry["t"] = round(time.monotonic() - self.started, 6)
+        line = json.dumps(entry) + "\n"
+        with self.lock:
+            if not self.file.closed:
+                self.file.write(line)
+
+    def i2c(self, operation, address, register, length, result):
+        self._write({"i2c": operation, "addr": address, "reg": register, "len": length, "result": result})
+
+    def edge(self, gpio, tick):
+        self._write({"edge": gpio, "tick": tick})
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class RecordingSMBus:
+    """Przepuszcza operacje do prawdziwej magistrali i zapisuje wyniki odczytów."""
+
+    def __init__(self, bus, recorder):
+        self.bus = bus
+        self.recorder = recorder
+
+    def read_byte_data(self, address, register):
+        value = self.bus.read_byte_data(address, register)
+        self.recorder.i2c("read_byte_data", address, register, 1, value)
+        return value
+
+    def read_word_data(self, address, register):
+        value = self.bus.read_word_data(address, register)
+        self.recorder.i2c("read_word_data", address, register, 2, value)
+        return value
+
+    def read_i2c_block_data(self, address, register, length):
+        values = self.bus.read_i2c_block_data(address, register, length)
+        self.recorder.i2c("read_i2c_block_data", address, register, length, list(values))
+        return values
+
+    def read_byte(self, address):
+        value = self.bus.read_byte(address)
+        self.recorder.i2c("read_byte", address, None, 1, value)
+        return value
+
+    def i2c_rdwr(self, *messages):
+        self.bus.i2c_rdwr(*messages)
+        register = None
+        for message in messages:
+            if message.flags & FakeI2cMsg.I2C_M_RD:
+                self.recorder.i2c("read_block", message.addr, register, message.len, list(message))
+            else:
+                register = list(message)[0]
+
+    def __getattr__(self, name):
+        # Zapisy i close bez zmian
+        return getattr(self.bus, name)
+
+
+class RecordingGpio:
+    """Moduł RPi.GPIO z zapisem zboczy zgłaszanych przez add_event_detect."""
+
+    def __init__(self, gpio, recorder):
+        self.gpio = gpio
+        self.recorder = recorder
+
+    def add_event_detect(self, pin, edge, callback=None, **kwargs):
+        def recording_callback(channel):
+            self.recorder.edge(channel, current_tick())
+            callback(channel)
+
+        self.gpio.add_event_detect(pin, edge, callback=recording_callback if callback else None, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.gpio, name)
+
+
+class RecordingPi:
+    def __init__(self, pi, recorder):
+        self.pi = pi
+        self.recorder = recorder
+
+    def callback(self, user_gpio, edge=0, func=None):
+        def recording_func(gpio, level, tick):
+            self.recorder.edge(gpio, tick)
+            func(gpio, level, tick)
+
+        return self.pi.callback(user_gpio, edge, recording_func if func else None)
+
+    def __getattr__(self, name):
+        return getattr(self.pi, name)
+
+
+class RecordingPigpio:
+    """Moduł pigpio, którego pi() zapisuje zbocza z wywołań zwrotnych."""
+
+    def __init__(self, pigpio, recorder):
+        self.pigpio = pigpio
+        self.recorder = recorder
+
+    def pi(self, *args, **kwargs):
+        return RecordingPi(self.pigpio.pi(*args, **kwargs), self.recorder)
+
+    def __getattr__(self, name):
+        return getattr(self.pigpio, name)
+
+
+class SensorLog:
+    """Wczytany zapis; odtwarzanie idzie według czasu od wczytania i zapętla się po końcu zapisu."""
+
+    def __init__(self, reads, edges, duration):
+        # (operacja, adres, rejestr, długość) -> (czasy, wyniki)
+        self.reads = reads
+        self.edges = edges
+        self.duration = duration
+        self.started = time.monotonic()
+
+    @classmethod
+    def load(cls, path):
+        reads = {}
+        edges = []
+        duration = 0.0
+        with open(path) as log:
+            for line in log:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                duration = max(duration, entry["t"])
+                if "edge" in entry:
+                    edges.append((entry["t"], entry["edge"], entry["tick"]))
+                elif entry.get("i2c") in READ_OPERATIONS:
+                    times, results = reads.setdefault((entry["i2c"], entry["addr"], entry["reg"], entry["len"]),
+                                                      ([], []))
+                    times.append(entry["t"])
+                    results.append(entry["result"])
+        logger.info("Replaying %s: %.1f s, %d read types, %d edges", path, duration, len(reads), len(edges))
+        return cls(reads, edges, duration)
+
+    def elapsed(self):
+        elapsed = time.monotonic() - self.started
+        return elapsed % self.duration if self.duration > 0 else elapsed
+
+    def lookup(self, operation, address, register, length, default):
+        """Ostatni zapisany wynik takiego odczytu do bieżącej chwili; odczyt spoza zapisu zwraca default."""
+        recorded = self.reads.get((operation, address, register, length))
+        if recorded is None:
+            return default
+        times, results = recorded
+        return results[max(bisect.bisect_right(times, self.elapsed()) - 1, 0)]
+
+
+class ReplaySMBus:
+    """Magistrala odtwarzająca odczyty z zapisu; zapisy do układów są pomijane."""
+
+    def __init__(self, log):
+        self.log = log
+
+    def read_byte_data(self, address, register):
+        return self.log.lookup("read_byte_data", address, register, 1, 0)
+
+    def read_word_data(self, address, register):
+        return self.log.lookup("read_word_data", address, register, 2, 0)
+
+    def read_i2c_block_data(self, address, register, length):
+        return list(self.log.lookup("read_i2c_block_data", address, register, length, [0] * length))
+
+    def read_byte(self, address):
+        return self.log.lookup("read_byte", address, None, 1, 0)
+
+    def write_byte_data(self, address, register, value):
+        pass
+
+    def write_word_data(self, address, register, value):
+        pass
+
+    def write_byte(self, address, value):
+        pass
+
+    def i2c_rdwr(self, *messages):
+        register = None
+        for message in messages:
+            if message.flags & FakeI2cMsg.I2C_M_RD:
+                message.buf[:] = bytes(self.log.lookup("read_block", message.addr, register, message.len,
+                                                       [0] * message.len))
+            else:
+                register = message.buf[0]
+
+    def close(self):
+        pass
+
+
+class ReplayedPulseTrain(PulseListeners):
+    """Zbocza z zapisu podawane odbiorcom w zapisanych odstępach (ticki przesunięte do bieżącego zegara)."""
+
+    def __init__(self, log):
+        super().__init__()
+        self.log = log
+        self.thread = None
+
+    def _listener_added(self):
+        if self.thread is None and self.log.edges:
+            self.thread = threading.Thread(target=self._run, daemon=True, name="replay-pulses")
+            self.thread.start()
+
+    def _run(self):
+        first_at, _, first_tick = self.log.edges[0]
+        loop_started = self.log.started
+        # Tick pierwszego zbocza w bieżącym zegarze; dalej zapisane odstępy między tickami
+        start_tick = (current_tick() + int((loop_started + first_at - time.monotonic()) * 1e6)) % TICK_MODULUS
+        while True:
+            for at, gpio, tick in self.log.edges:
+                delay = loop_started + at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self.fire(gpio, (start_tick + (tick - first_tick) % TICK_MODULUS) % TICK_MODULUS)
+            if self.log.duration <= 0:
+                return
+            loop_started += self.log.duration
+            start_tick = (start_tick + int(self.log.duration * 1e6)) % TICK_MODULUS
+
+
+class ReplayBackend:
+    """Czujniki z zapisu; wyjścia (silnik, serwo) trafiają do modelu z backendu "fake", obraz jest generowany."""
+
+    name = "replay"
+
+    def __init__(self, path):
+        self.log = SensorLog.load(path)
+        self.vehicle = FakeVehicle()
+        pulses = ReplayedPulseTrain(self.log)
+        self.gpio = FakeGpio(self.vehicle, pulses)
+        self.pigpio = FakePigpio(self.vehicle, pulses)
+        self.i2c_msg = FakeI2cMsg
+
+    def smbus(self, bus_number):
+        return ReplaySMBus(self.log)
+
+    def camera(self):
+        return FakeCamera()
+
+    def close(self):
+        pass
@@ -1,19 +1,96 @@
-import RPi.GPIO as GPIO
+import logging
+from src.hal import get_backend
+
+logger = logging.getLogger(__name__)
 
 L9110S_PIN_A = 18
 L9110S_PIN_B = 17
 
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(L9110S_PIN_A, GPIO.OUT)
-GPIO.setup(L9110S_PIN_B, GPIO.OUT)
-pwmA = GPIO.PWM(L9110S_PIN_A, 1000)
-pwmB = GPIO.PWM(L9110S_PIN_B, 1000)
-pwmA.start(0)
-pwmB.start(0)
+# "pigpio" - PWM taktowany przez DMA demona pigpio (odporny na obciążenie CPU),
+# "rpi_gpio" - programowy PWM RPi.GPIO (wątek po stronie Pythona)
+MOTOR_PWM_BACKEND = "pigpio"
+MOTOR_PWM_FREQUENCY = 1000
+# Rozdzielczość wypełnienia dla pigpio (liczba kroków na pełny okres)
+MOTOR_PWM_RANGE = 1000
+# Piny ze sprzętowym kanałem PWM (PWM0: 12, 18; PWM1: 13, 19). Sprzętowy PWM jest używany tylko wtedy,
+# gdy oba wejścia mostka są na różnych kanałach - inaczej oba idą przez DMA z tą samą nośną i rozdzielczością
+HARDWARE_PWM_CHANNELS = {12: 0, 18: 0, 13: 1, 19: 1}
+MOTOR_HARDWARE_PWM = True
+
+
+def hardware_pwm_available(pins):
+    channels = [HARDWARE_PWM_CHANNELS.get(pin) for pin in pins]
+    return None not in channels and len(set(channels)) == len(channels)
+
+
+class RpiGpioPwm:
+    """Programowy PWM RPi.GPIO; wypełnienie w procentach."""
+
+    def __init__(self, pin, frequency):
+        GPIO = get_backend().gpio
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(pin, GPIO.OUT)
+        self.pwm = GPIO.PWM(pin, frequency)
+        self.pwm.start(0)
+
+    def set_duty(self, percent):
+        self.pwm.ChangeDutyCycle(percent)
+
+    def stop(self):
+        self.pwm.stop()
+
+
+class PigpioPwm:
+    """PWM z demona pigpio: sprzętowy kanał PWM albo przebieg taktowany DMA; wypełnienie w procentach."""
+
+    def __init__(self, pi, pin, frequency, duty_range, hardware=False):
+        self.pi = pi
+        self.pin = pin
+        self.hardware = hardware
+        self.frequency = frequency
+        pi.set_mode(pin, get_backend().pigpio.OUTPUT)
+        if self.hardware:
+            # Wypełnienie sprzętowego PWM jest zawsze w milionowych częściach okresu
+            self.duty_range = 1000000
+            pi.hardware_PWM(pin, frequency, 0)
+        else:
+            self.duty_range = duty_range
+            # DMA obsługuje tylko wybrane częstotliwości - demon wybiera najbliższą
+            self.frequency = pi.set_PWM_frequency(pin, frequency)
+            if self.frequency != frequency:
+                logger.warning("Motor PWM on GPIO%d: requested %s Hz, daemon set %s Hz", pin, frequency,
+                               self.frequency)
+            pi.set_PWM_range(pin, duty_range)
+            pi.set_PWM_dutycycle(pin, 0)
+        logger.info("Motor PWM on GPIO%d: %s, %s Hz, %d steps", pin, "hardware" if self.hardware else "DMA",
+                    self.frequency, self.duty_range)
+
+    def set_duty(self, percent):
+        duty = int(round(min(max(percent, 0), 100) / 100.0 * self.duty_range))
+        if self.hardware:
+            self.pi.hardware_PWM(self.pin, self.frequency, duty)
+        else:
+            self.pi.set_PWM_dutycycle(self.pin, duty)
+
+    def stop(self):
+        self.set_duty(0)
+
+
+def create_pwm_channels(backend=MOTOR_PWM_BACKEND, frequency=MOTOR_PWM_FREQUENCY, duty_range=MOTOR_PWM_RANGE):
+    """Kanały (A, B) wybranego backendu; bez demona pigpio - programowy PWM RPi.GPIO."""
+    if backend == "pigpio":
+        pi = get_backend().pigpio.pi()
+        if pi.connected:
+            hardware = MOTOR_HARDWARE_PWM and hardware_pwm_available((L9110S_PIN_A, L9110S_PIN_B))
+            return pi, (PigpioPwm(pi, L9110S_PIN_A, frequency, duty_range, hardware),
+                        PigpioPwm(pi, L9110S_PIN_B, frequency, duty_range, hardware))
+        logger.warning("pigpio daemon not available, motor falls back to RPi.GPIO software PWM")
+    return None, (RpiGpioPwm(L9110S_PIN_A, frequency), RpiGpioPwm(L9110S_PIN_B, frequency))
+
 
 class L9110SMotorDriver:
-    def __init__(self):
-        pass
+    def __init__(self, backend=MOTOR_PWM_BACKEND, frequency=MOTOR_PWM_FREQUENCY, duty_range=MOTOR_PWM_RANGE):
+        self.pi, (self.pwm_a, self.pwm_b) = create_pwm_channels(backend, frequency, duty_range)
 
     def _set_speed_percent(self, speed_percent, brake_percent, gear):
         if brake_percent > speed_percent:
@@ -22,27 +99,36 @@ class L9110SMotorDriver:
                 return 50 + (gear*10*(speed_percent/100.0))
         else:
             return 0
-    
-    def set_power(self, speed_percent, brake_percent, gear):
+
+    def duty_cycles(self, speed_percent, brake_percent, gear):
+        """Wypełnienia (A, B) dla danego gazu, hamulca i biegu - bez zapisu do sprzętu."""
         if gear == -1:
             speed_percent = brake_percent if brake_percent > speed_percent else speed_percent
-            pwmA.ChangeDutyCycle(brake_percent)
-            pwmB.ChangeDutyCycle(speed_percent)
-        elif gear == 0:
-            pwmA.ChangeDutyCycle(0)
-            pwmB.ChangeDutyCycle(0)
+            return brake_percent, speed_percent
         elif gear > 0:
-            speed_percent = self._set_speed_percent(speed_percent, brake_percent, gear)
-            pwmA.ChangeDutyCycle(speed_percent)
-            pwmB.ChangeDutyCycle(brake_percent)
-        else:
-            pwmA.ChangeDutyCycle(0)
-            pwmB.ChangeDutyCycle(0)
-    
+            return self._set_speed_percent(speed_percent, brake_percent, gear), brake_percent
+        return 0, 0
+
+    def drive_duty_cycles(self, duty, gear):
+        """Wypełnienia (A, B) dla wypełnienia napędu zadanego wprost (regulator prędkości)."""
+        if gear == -1:
+            return 0, duty
+        elif gear > 0:
+            return duty, 0
+        return 0, 0
+
+    def set_duty_cycles(self, duty_a, duty_b):
+        self.pwm_a.set_duty(duty_a)
+        self.pwm_b.set_duty(duty_b)
+
+    def set_power(self, speed_percent, brake_percent, gear):
+        self.set_duty_cycles(*self.duty_cycles(speed_percent, brake_percent, gear))
+
     def stop(self):
-        pwmA.ChangeDutyCycle(0)
-        pwmB.ChangeDutyCycle(0)
+        self.set_duty_cycles(0, 0)
 
     def cleanup(self):
-        pwmA.stop()
-        pwmB.stop()
\ No newline at end of file
+        self.pwm_a.stop()
+        self.pwm_b.stop()
+        if self.pi:
+            self.pi.stop()
@@ -0,0 +1,83 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Prędkość docelowa przy wciśniętym do końca gazie na danym biegu (km/h)
+GEAR_TOP_SPEEDS = {-1: 2.0, 1: 2.0, 2: 4.0, 3: 6.0, 4: 8.0, 5: 10.0}
+# Wypełnienie z wyprzedzeniem: próg ruszenia silnika + przyrost na km/h (jak w sterowaniu bez sprzężenia)
+FEEDFORWARD_OFFSET = 40.0
+FEEDFORWARD_PER_KMH = 5.0
+SPEED_KP = 4.0  # % na km/h
+SPEED_KI = 8.0  # % na km/h * s
+# Kontrola trakcji: koło przyspiesza szybciej, niż pozwala przyczepność - poślizg
+MAX_WHEEL_ACCELERATION = 5.0  # m/s^2
+TRACTION_CUT = 0.8  # mnożnik ograniczenia w każdym kroku z poślizgiem
+TRACTION_MIN_SCALE = 0.3
+TRACTION_RECOVERY_RATE = 1.5  # powrót ograniczenia na sekundę
+
+
+class SpeedController:
+    """Regulator prędkości PI z wyprzedzeniem i kontrolą trakcji, wywoływany z pętli wykonawczej.
+
+    Bieg i gaz wyznaczają prędkość docelową; wynikiem jest wypełnienie napędu w procentach.
+    """
+
+    def __init__(self, read_speed, kp=SPEED_KP, ki=SPEED_KI):
+        # Zwraca {"speed": km/h, "wheel_acceleration": m/s^2}, np. SpeedSensor.read
+        self.read_speed = read_speed
+        self.kp = kp
+        self.ki = ki
+        self.integral = 0.0
+        self.traction_scale = 1.0
+        self.target = 0.0
+        self.speed = 0.0
+        self.duty = 0.0
+        self.slip_events = 0
+        self.slipping = False
+
+    def reset(self):
+        self.integral = 0.0
+        self.traction_scale = 1.0
+        self.target = 0.0
+        self.duty = 0.0
+        self.slipping = False
+
+    def target_speed(self, gas_percent, gear):
+        return GEAR_TOP_SPEEDS.get(gear, 0.0) * min(max(gas_percent, 0.0), 100.0) / 100.0
+
+    def update(self, gas_percent, gear, dt):
+        measurement = self.read_speed()
+        self.speed = measurement["speed"]
+        self.target = self.target_speed(gas_percent, gear)
+        if self.target <= 0.0:
+            self.reset()
+            return 0.0
+
+        error = self.target - self.speed
+        feedforward = FEEDFORWARD_OFFSET + FEEDFORWARD_PER_KMH * self.target
+        output = feedforward + self.kp * error + self.ki * self.integral
+
+        slipping = measurement["wheel_acceleration"] > MAX_WHEEL_ACCELERATION
+        if slipping:
+            self.traction_scale = max(self.traction_scale * TRACTION_CUT, TRACTION_MIN_SCALE)
+            if not self.slipping:
+                self.slip_events += 1
+        else:
+            self.traction_scale = min(self.traction_scale + TRACTION_RECOVERY_RATE * dt, 1.0)
+        self.slipping = slipping
+
+        duty = min(max(output, 0.0), 100.0) * self.traction_scale
+        # Anti-windup: całkujemy tylko, gdy wyjście nie jest nasycone ani ograniczone przez trakcję
+        if 0.0 < output < 100.0 and self.traction_scale >= 1.0:
+            self.integral += error * dt
+        self.duty = duty
+        return duty
+
+    def stats(self):
+        return {
+            "target_speed": self.target,
+            "speed": self.speed,
+            "duty": self.duty,
+            "traction_scale": self.traction_scale,
+            "slip_events": self.slip_events,
+        }
@@ -1,24 +1,34 @@
-import smbus2
+import logging
+from src.sensors.i2c_bus import get_i2c_bus, PRIORITY_CONTROL
+
+logger = logging.getLogger(__name__)
 
-I2C_BUS = 1
-bus = smbus2.SMBus(I2C_BUS)
 AS5600_ADDR = 0x36
+AS5600_STATUS = 0x0B
+# Filtrowany kąt ANGLE (RAW ANGLE to 0x0C-0x0D)
+AS5600_ANGLE_HI = 0x0E
+AS5600_ANGLE_LO = 0x0F
+STATUS_MAGNET_DETECTED = 0x20
+ANGLE_MASK = 0x0FFF
+ANGLE_COUNTS = 4096
 
 class AS5600Sensor:
-    def __init__(self, address=AS5600_ADDR):
+    def __init__(self, address=AS5600_ADDR, bus=None):
         self.address = address
+        self.bus = bus or get_i2c_bus()
+        self.bus.register_device(self.address, "AS5600")
         try:
-            bus.read_byte_data(self.address, 0x0E)
+            self.bus.read_byte_data(self.address, AS5600_ANGLE_HI)
         except Exception as e:
-            print(f"AS5600 initialization error: {e}")
+            logger.error("AS5600 initialization error: %s", e)
 
-    def read_angle(self):
-        try:
-            angle_hi = bus.read_byte_data(self.address, 0x0E)
-            angle_lo = bus.read_byte_data(self.address, 0x0F)
-            raw_angle = (angle_hi << 8) | angle_lo
-            angle_deg = (raw_angle / 4095.0) * 360.0
-            return angle_deg
-        except Exception as e:
-            print(f"AS5600 read error: {e}")
-            return 0.0
\ No newline at end of file
+    def read_measurement(self):
+        """Kąt enkodera w stopniach (0-360); brak magnesu lub błąd magistrali zgłasza wyjątek.
+
+        Status i oba bajty kąta (0x0B-0x0F) idą jednym odczytem blokowym.
+        """
+        status, _, _, angle_hi, angle_lo = self.bus.read_registers(
+            self.address, list(range(AS5600_STATUS, AS5600_ANGLE_LO + 1)), PRIORITY_CONTROL)
+        if not status & STATUS_MAGNET_DETECTED:
+            raise IOError("AS5600 magnet not detected")
+        return (((angle_hi << 8) | angle_lo) & ANGLE_MASK) * 360.0 / ANGLE_COUNTS
\ No newline at end of file
@@ -0,0 +1,47 @@
+import numpy as np
+
+# Udział żyroskopu w estymacie; reszta to korekta dryfu z kierunku grawitacji
+COMPLEMENTARY_ALPHA = 0.98
+
+
+class ComplementaryFilter:
+    """Filtr komplementarny przechyłu (roll) i pochylenia (pitch), liczony na całych paczkach próbek.
+
+    Rekurencja y[k] = a * (y[k-1] + w[k] * dt) + (1 - a) * acc[k] jest filtrem IIR pierwszego rzędu,
+    więc dla paczki da się ją policzyć bez pętli: y[k] = a^(k+1) * (y[-1] + sum_j u[j] / a^(j+1)).
+    Paczki z FIFO mają co najwyżej kilkadziesiąt próbek, więc a^-k nie traci precyzji.
+    """
+
+    def __init__(self, alpha=COMPLEMENTARY_ALPHA):
+        self.alpha = alpha
+        self.roll = None
+        self.pitch = None
+
+    def reset(self):
+        self.roll = None
+        self.pitch = None
+
+    def update(self, acceleration, gyro, dt):
+        """acceleration (Nx3, dowolne jednostki), gyro (Nx3, deg/s), dt - okres próbkowania [s].
+
+        Zwraca (roll, pitch, yaw_rate) w deg i deg/s dla każdej próbki.
+        """
+        acceleration = np.asarray(acceleration, dtype=np.float64)
+        gyro = np.asarray(gyro, dtype=np.float64)
+        ax, ay, az = acceleration[:, 0], acceleration[:, 1], acceleration[:, 2]
+        acc_roll = np.degrees(np.arctan2(ay, az))
+        acc_pitch = np.degrees(np.arctan2(-ax, np.hypot(ay, az)))
+        if self.roll is None:
+            # Pierwsza paczka: start z kierunku grawitacji zamiast od zera
+            self.roll, self.pitch = float(acc_roll[0]), float(acc_pitch[0])
+
+        powers = self.alpha ** np.arange(1, len(acceleration) + 1)
+        roll = self._integrate(self.roll, gyro[:, 0], acc_roll, dt, powers)
+        pitch = self._integrate(self.pitch, gyro[:, 1], acc_pitch, dt, powers)
+        if len(roll):
+            self.roll, self.pitch = float(roll[-1]), float(pitch[-1])
+        return roll, pitch, gyro[:, 2]
+
+    def _integrate(self, initial, rate, acc_angle, dt, powers):
+        inputs = self.alpha * rate * dt + (1.0 - self.alpha) * acc_angle
+        return powers * (initial + np.cumsum(inputs / powers))
@@ -0,0 +1,47 @@
+import threading
+
+# Pakiet 2S Li-ion: 8.4 V naładowany, 6.4 V rozładowany (progi jak w ikonach baterii aplikacji PC)
+BATTERY_CAPACITY_MAH = 2000.0
+BATTERY_NOMINAL_VOLTAGE = 7.4
+BATTERY_FULL_VOLTAGE = 8.4
+BATTERY_EMPTY_VOLTAGE = 6.4
+# Dłuższa przerwa między próbkami (np. uśpienie) nie jest całkowana - brak wiarygodnego przebiegu prądu
+MAX_INTEGRATION_GAP = 60.0
+
+
+class EnergyMeter:
+    """Całkuje prąd i moc (metodą trapezów) przy każdej próbce INA3221.
+
+    Stan początkowy baterii jest szacowany z pierwszego pomiaru napięcia, dalej liczony jest tylko ładunek.
+    """
+
+    def __init__(self, capacity_mah=BATTERY_CAPACITY_MAH, nominal_voltage=BATTERY_NOMINAL_VOLTAGE):
+        self.capacity_mah = capacity_mah
+        self.capacity_wh = capacity_mah * nominal_voltage / 1000.0
+        self.charge_used = 0.0  # mAh
+        self.energy_used = 0.0  # Wh
+        self.initial_energy = None
+        self.last = None
+        self.lock = threading.Lock()
+
+    def update(self, timestamp, voltage, current_ma):
+        """Zwraca kanały: moc [W], zużyty ładunek [mAh], zużyta i pozostała energia [Wh]."""
+        power = voltage * current_ma / 1000.0
+        with self.lock:
+            if self.initial_energy is None:
+                state_of_charge = (voltage - BATTERY_EMPTY_VOLTAGE) / (BATTERY_FULL_VOLTAGE - BATTERY_EMPTY_VOLTAGE)
+                self.initial_energy = self.capacity_wh * min(max(state_of_charge, 0.0), 1.0)
+            if self.last is not None:
+                last_timestamp, last_current, last_power = self.last
+                dt = timestamp - last_timestamp
+                if 0.0 < dt <= MAX_INTEGRATION_GAP:
+                    hours = dt / 3600.0
+                    self.charge_used += (current_ma + last_current) / 2.0 * hours
+                    self.energy_used += (power + last_power) / 2.0 * hours
+            self.last = (timestamp, current_ma, power)
+            return {
+                "power": power,
+                "charge_used": self.charge_used,
+                "energy_used": self.energy_used,
+                "energy_remaining": max(self.initial_energy - self.energy_used, 0.0),
+            }
@@ -0,0 +1,146 @@
+import math
+import numpy as np
+
+try:
+    from scipy.signal import lfilter
+except ImportError:  # scipy jest opcjonalne - bez niego filtr IIR liczy pętla po próbkach
+    lfilter = None
+
+BUTTERWORTH_Q = 1 / math.sqrt(2)
+
+
+class LowPassBiquad:
+    """Dolnoprzepustowy filtr drugiego rzędu (RBJ), stan dla każdej kolumny osobno.
+
+    Stan w postaci transponowanej II - ta sama, której używa scipy.signal.lfilter,
+    więc oba sposoby liczenia są wymienne.
+    """
+
+    def __init__(self, cutoff_hz, sample_rate_hz, q=BUTTERWORTH_Q):
+        if not 0 < cutoff_hz < sample_rate_hz / 2:
+            raise ValueError(f"cutoff {cutoff_hz} Hz outside (0, {sample_rate_hz / 2}) Hz")
+        w0 = 2 * math.pi * cutoff_hz / sample_rate_hz
+        alpha = math.sin(w0) / (2 * q)
+        cos_w0 = math.cos(w0)
+        a0 = 1 + alpha
+        self.b = np.array([(1 - cos_w0) / 2, 1 - cos_w0, (1 - cos_w0) / 2]) / a0
+        self.a = np.array([1.0, -2 * cos_w0 / a0, (1 - alpha) / a0])
+        self.state = None
+
+    def reset(self):
+        self.state = None
+
+    def _steady_state(self, first):
+        # Stan, w którym stała wartość pierwszej próbki przechodzi bez zmian - bez skoku od zera na starcie
+        b0, b1, b2 = self.b
+        _, a1, a2 = self.a
+        return np.array([(b1 + b2 - a1 - a2) * first, (b2 - a2) * first])
+
+    def process(self, block):
+        if self.state is None or self.state.shape[1] != block.shape[1]:
+            self.state = self._steady_state(block[0])
+        if lfilter is not None:
+            out, self.state = lfilter(self.b, self.a, block, axis=0, zi=self.state)
+            return out
+        b0, b1, b2 = self.b
+        _, a1, a2 = self.a
+        z0, z1 = self.state
+        out = np.empty_like(block)
+        # Rekurencja po czasie, wektorowo po kolumnach
+        for index, x in enumerate(block):
+            y = b0 * x + z0
+            z0 = b1 * x - a1 * y + z1
+            z1 = b2 * x - a2 * y
+            out[index] = y
+        self.state = np.array([z0, z1])
+        return out
+
+
+class WindowFilter:
+    """Filtr na przesuwanym oknie; ostatnie window - 1 próbek poprzedniego bloku jest dołączane z przodu."""
+
+    def __init__(self, window):
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        self.window = int(window)
+        self.history = None
+
+    def reset(self):
+        self.history = None
+
+    def _extend(self, block):
+        if self.history is None or self.history.shape[1] != block.shape[1]:
+            self.history = np.repeat(block[:1], self.window - 1, axis=0)
+        extended = np.concatenate([self.history, block])
+        self.history = extended[len(extended) - (self.window - 1):]
+        return extended
+
+
+class MedianFilter(WindowFilter):
+    """Mediana z okna - usuwa pojedyncze szpilki (np. prąd przy rozruchu silnika) bez rozmywania zboczy."""
+
+    def process(self, block):
+        extended = self._extend(block)
+        indices = np.arange(len(block))[:, None] + np.arange(self.window)
+        return np.median(extended[indices], axis=1)
+
+
+class MovingAverage(WindowFilter):
+    def process(self, block):
+        extended = self._extend(block)
+        sums = np.concatenate([np.zeros((1, block.shape[1])), np.cumsum(extended, axis=0)])
+        return (sums[self.window:] - sums[:-self.window]) / self.window
+
+
+class FilterChain:
+    """Filtry po kolei na wybranych kolumnach bloku próbek, na końcu decymacja wszystkich kolumn.
+
+    Decymacja bez wcześniejszego filtra dolnoprzepustowego przepuszcza aliasy.
+    """
+
+    def __init__(self, stages, columns=None, decimation=1):
+        self.stages = list(stages)
+        self.columns = columns
+        self.decimation = max(1, int(decimation))
+        self.phase = 0
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+        self.phase = 0
+
+    def process(self, timestamps, values):
+        """(znaczniki czasu, wartości NxK) -> przefiltrowane i zdecymowane (M <= N wierszy)."""
+        values = np.array(values, dtype=np.float64)
+        if self.stages:
+            columns = slice(None) if self.columns is None else self.columns
+            block = values[:, columns]
+            for stage in self.stages:
+                block = stage.process(block)
+            values[:, columns] = block
+        if self.decimation == 1:
+            return timestamps, values
+        # Z każdej grupy decimation próbek zostaje ostatnia; faza przechodzi między blokami
+        keep = (self.phase + np.arange(len(values))) % self.decimation == self.decimation - 1
+        self.phase = (self.phase + len(values)) % self.decimation
+        return timestamps[keep], values[keep]
+
+
+def build_chain(spec, fields, sample_rate_hz=None):
+    """Łańcuch z ustawień źródła, np. {"median": 3, "lowpass_hz": 20, "moving_average": 4, "decimation": 5}.
+
+    Kolejność: mediana, dolnoprzepustowy, średnia, decymacja. "fields" ogranicza filtry do części pól
+    (pozostałe są tylko decymowane).
+    """
+    stages = []
+    if spec.get("median"):
+        stages.append(MedianFilter(spec["median"]))
+    if spec.get("lowpass_hz"):
+        if not sample_rate_hz:
+            raise ValueError("low-pass filter needs the source sample rate")
+        stages.append(LowPassBiquad(spec["lowpass_hz"], sample_rate_hz))
+    if spec.get("moving_average"):
+        stages.append(MovingAverage(spec["moving_average"]))
+    fields = list(fields)
+    columns = [fields.index(field) for field in spec["fields"]] if "fields" in spec else None
+    return FilterChain(stages, columns, spec.get("decimation", 1))
@@ -0,0 +1,228 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+from src.hal import get_backend
+
+logger = logging.getLogger(__name__)
+
+I2C_BUS = 1
+
+# Niższa liczba = wyższy priorytet; zapis do elementów wykonawczych wyprzedza odczyty telemetrii
+PRIORITY_ACTUATOR = 0
+PRIORITY_CONTROL = 1
+PRIORITY_TELEMETRY = 2
+PRIORITY_BACKGROUND = 3
+
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF = 0.001
+TRANSACTION_TIMEOUT = 1.0
+# Najdłuższy blok obsługiwany przez SMBus
+MAX_BLOCK_LENGTH = 32
+
+
+class DeviceStats:
+    def __init__(self, name):
+        self.name = name
+        self.transactions = 0
+        self.errors = 0
+        self.retries = 0
+        self.cancelled = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.total_bus_time = 0.0
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "transactions": self.transactions,
+            "errors": self.errors,
+            "retries": self.retries,
+            "cancelled": self.cancelled,
+            "avg_latency_ms": self.total_latency / self.transactions * 1000.0 if self.transactions else None,
+            "max_latency_ms": self.max_latency * 1000.0,
+            "bus_time_ms": self.total_bus_time * 1000.0,
+        }
+
+
+class Transaction:
+    def __init__(self, address, operation):
+        self.address = address
+        self.operation = operation
+        self.queued_at = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # Ustawiane po przekroczeniu czasu oczekiwania - taka transakcja nie trafia już na magistralę
+        self.cancelled = False
+
+
+class I2CBusManager:
+    """Jedyny właściciel magistrali I2C: transakcje z kolejki priorytetowej wykonuje jeden wątek."""
+
+    def __init__(self, bus_number=I2C_BUS):
+        backend = get_backend()
+        self.bus = backend.smbus(bus_number)
+        self.i2c_msg = backend.i2c_msg
+        self.queue = queue.PriorityQueue()
+        # Kolejność zgłoszeń rozstrzyga remisy priorytetów
+        self.counter = itertools.count()
+        self.devices = {}
+        self.stats_lock = threading.Lock()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True, name="i2c-bus")
+        self.thread.start()
+
+    def register_device(self, address, name):
+        with self.stats_lock:
+            self.devices[address] = DeviceStats(name)
+
+    def submit(self, address, operation, priority=PRIORITY_TELEMETRY):
+        """Wykonuje operation(bus) na wątku magistrali i zwraca jej wynik (lub zgłasza błąd)."""
+        transaction = Transaction(address, operation)
+        self.queue.put((priority, next(self.counter), transaction))
+        if not transaction.done.wait(TRANSACTION_TIMEOUT):
+            transaction.cancelled = True
+            raise TimeoutError(f"I2C transaction to 0x{address:02X} timed out")
+        if transaction.error is not None:
+            raise transaction.error
+        return transaction.result
+
+    def _run(self):
+        while self.running:
+            _, _, transaction = self.queue.get()
+            if transaction is None:
+                break
+            if transaction.cancelled:
+                # Wywołujący już zrezygnował - spóźniony zapis do wyjść nie może trafić na magistralę
+                with self.stats_lock:
+                    self._device_stats(transaction.address).cancelled += 1
+                continue
+            self._execute(transaction)
+
+    def _execute(self, transaction):
+        started = time.monotonic()
+        retries = 0
+        try:
+            while True:
+                try:
+                    transaction.result = transaction.operation(self.bus)
+                    transaction.error = None
+                    break
+                except OSError as e:
+                    transaction.error = e
+                    if retries >= RETRY_ATTEMPTS:
+                        break
+                    # Zakłócenia na magistrali zwykle są chwilowe - ponawiamy z rosnącym odstępem
+                    time.sleep(RETRY_BACKOFF * (2 ** retries))
+                    retries += 1
+                except Exception as e:
+                    # Błąd w kodzie sterownika - bez ponawiania, wątek magistrali musi działać dalej
+                    transaction.error = e
+                    break
+        finally:
+            finished = time.monotonic()
+            self._record(transaction, finished - transaction.queued_at, finished - started, retries)
+            transaction.done.set()
+
+    def _device_stats(self, address):
+        stats = self.devices.get(address)
+        if stats is None:
+            stats = self.devices[address] = DeviceStats(f"0x{address:02X}")
+        return stats
+
+    def _record(self, transaction, latency, bus_time, retries):
+        with self.stats_lock:
+            stats = self._device_stats(transaction.address)
+            stats.transactions += 1
+            stats.retries += retries
+            stats.errors += transaction.error is not None
+            stats.total_latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+            stats.total_bus_time += bus_time
+
+    def stats(self):
+        with self.stats_lock:
+            stats = {f"0x{address:02X}": device.to_dict() for address, device in self.devices.items()}
+        stats["queue_length"] = self.queue.qsize()
+        return stats
+
+    def close(self):
+        self.running = False
+        # Pusta transakcja z najniższym priorytetem kończy wątek po obsłużeniu zaległych
+        self.queue.put((PRIORITY_BACKGROUND + 1, next(self.counter), None))
+        self.thread.join(TRANSACTION_TIMEOUT)
+        self.bus.close()
+
+    # Odpowiedniki metod smbus2 wykonywane przez kolejkę
+
+    def read_byte_data(self, address, register, priority=PRIORITY_TELEMETRY):
+        return self.submit(address, lambda bus: bus.read_byte_data(address, register), priority)
+
+    def write_byte_data(self, address, register, value, priority=PRIORITY_TELEMETRY):
+        return self.submit(address, lambda bus: bus.write_byte_data(address, register, value), priority)
+
+    def read_word_data(self, address, register, priority=PRIORITY_TELEMETRY):
+        return self.submit(address, lambda bus: bus.read_word_data(address, register), priority)
+
+    def write_word_data(self, address, register, value, priority=PRIORITY_TELEMETRY):
+        return self.submit(address, lambda bus: bus.write_word_data(address, register, value), priority)
+
+    def write_byte(self, address, value, priority=PRIORITY_TELEMETRY):
+        return self.submit(address, lambda bus: bus.write_byte(address, value), priority)
+
+    def read_i2c_block_data(self, address, register, length, priority=PRIORITY_TELEMETRY):
+        return self.submit(address, lambda bus: bus.read_i2c_block_data(address, register, length), priority)
+
+    def read_words(self, address, registers, priority=PRIORITY_TELEMETRY):
+        """Kilka odczytów słów w jednej transakcji kolejki - dla układów bez autoinkrementacji adresu."""
+        return self.submit(address, lambda bus: [bus.read_word_data(address, register) for register in registers],
+                           priority)
+
+    def read_block(self, address, register, length, priority=PRIORITY_TELEMETRY):
+        """Odczyt dowolnej długości jedną transakcją I2C (bez limitu 32 bajtów SMBus), np. opróżnianie FIFO."""
+        def operation(bus):
+            write = self.i2c_msg.write(address, [register])
+            read = self.i2c_msg.read(address, length)
+            bus.i2c_rdwr(write, read)
+            return bytes(read)
+
+        return self.submit(address, operation, priority)
+
+    def read_registers(self, address, registers, priority=PRIORITY_TELEMETRY):
+        """Czyta wskazane rejestry bajtowe; sąsiednie są łączone w odczyty blokowe w jednej transakcji."""
+        runs = contiguous_runs(registers)
+
+        def operation(bus):
+            values = {}
+            for start, length in runs:
+                for offset, value in enumerate(bus.read_i2c_block_data(address, start, length)):
+                    values[start + offset] = value
+            return [values[register] for register in registers]
+
+        return self.submit(address, operation, priority)
+
+
+def contiguous_runs(registers):
+    """Dzieli rejestry na ciągłe zakresy: [(początek, długość), ...]."""
+    runs = []
+    for register in sorted(set(registers)):
+        if runs and register == runs[-1][0] + runs[-1][1] and runs[-1][1] < MAX_BLOCK_LENGTH:
+            runs[-1] = (runs[-1][0], runs[-1][1] + 1)
+        else:
+            runs.append((register, 1))
+    return runs
+
+
+_shared_bus = None
+_shared_bus_lock = threading.Lock()
+
+
+def get_i2c_bus():
+    """Wspólny menedżer magistrali, tworzony przy pierwszym użyciu."""
+    global _shared_bus
+    with _shared_bus_lock:
+        if _shared_bus is None:
+            _shared_bus = I2CBusManager()
+        return _shared_bus
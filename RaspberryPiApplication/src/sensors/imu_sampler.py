@@ -0,0 +1,196 @@
+import logging
+import threading
+import time
+import numpy as np
+from src.sensors.mpu6500 import ACCEL_SCALE, GYRO_SCALE
+from src.sensors.attitude import ComplementaryFilter
+from src.server.protocol import IMU_BATCH_HEADER, IMU_SAMPLE_DTYPE
+from src.hal import get_backend
+
+logger = logging.getLogger(__name__)
+
+IMU_SAMPLE_RATE_HZ = 250
+IMU_BATCH_SIZE = 20
+# Tryb FIFO: czujnik próbkuje sam, a wątek co IMU_FIFO_DRAIN_INTERVAL zabiera wszystko jednym odczytem.
+# 512-bajtowe FIFO mieści 42 próbki, czyli ok. 84 ms przy 500 Hz
+IMU_FIFO_RATE_HZ = 500
+IMU_FIFO_DRAIN_INTERVAL = 0.02
+# Pin INT czujnika (BCM); None - opróżnianie według zegara zamiast przerwania "data ready"
+IMU_INT_PIN = None
+
+
+class ImuSampler:
+    """Próbkuje akcelerometr w osobnym wątku i oddaje gotowe paczki próbek do wysłania.
+
+    Domyślnie korzysta z FIFO czujnika (akcelerometr + żyroskop) i liczy orientację filtrem
+    komplementarnym; gdy FIFO nie da się skonfigurować, wraca do odpytywania rejestrów.
+    """
+
+    def __init__(self, sensor, on_batch, on_sample=None, rate_hz=IMU_SAMPLE_RATE_HZ, batch_size=IMU_BATCH_SIZE,
+                 on_attitude=None, fifo=True, fifo_rate_hz=IMU_FIFO_RATE_HZ, int_pin=IMU_INT_PIN):
+        self.sensor = sensor
+        self.on_batch = on_batch
+        # Wywoływane z porcją próbek (znaczniki czasu, surowe x, y, z jako tablica Nx3), np. do bufora
+        # SamplingScheduler; w trybie FIFO - z całym opróżnieniem, przy odpytywaniu - z pojedynczą próbką
+        self.on_sample = on_sample
+        # Wywoływane z {"roll", "pitch", "yaw_rate"} po każdym opróżnieniu FIFO
+        self.on_attitude = on_attitude
+        self.period = 1.0 / rate_hz
+        self.samples = np.zeros(batch_size, dtype=IMU_SAMPLE_DTYPE)
+        self.count = 0
+        self.batch_start = 0.0
+        self.fifo = fifo
+        self.fifo_rate_hz = fifo_rate_hz
+        self.int_pin = int_pin
+        self.data_ready = threading.Event()
+        self.pending_interrupts = 0
+        self.drain_samples = max(1, int(fifo_rate_hz * IMU_FIFO_DRAIN_INTERVAL))
+        self.attitude_filter = ComplementaryFilter()
+        self.last_sample_time = None
+        self.read_errors = 0
+        self.fifo_overflows = 0
+        self.failing = False
+        self.running = False
+        self.active = threading.Event()
+        self.active.set()
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        if self.fifo:
+            try:
+                self.fifo_rate_hz = self.sensor.configure_fifo(self.fifo_rate_hz, data_ready_interrupt=self.int_pin is not None)
+            except Exception as e:
+                logger.error("MPU6500 FIFO setup failed, falling back to register polling: %s", e)
+                self.fifo = False
+        if self.fifo and self.int_pin is not None:
+            GPIO = get_backend().gpio
+            GPIO.setmode(GPIO.BCM)
+            GPIO.setup(self.int_pin, GPIO.IN)
+            GPIO.add_event_detect(self.int_pin, GPIO.RISING, callback=self._data_ready_callback)
+        self.thread = threading.Thread(target=self._run_fifo if self.fifo else self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.active.set()
+        self.data_ready.set()
+        if self.fifo:
+            if self.int_pin is not None:
+                get_backend().gpio.remove_event_detect(self.int_pin)
+            self.sensor.disable_fifo()
+
+    @property
+    def sample_rate_hz(self):
+        return self.fifo_rate_hz if self.fifo else 1.0 / self.period
+
+    def pause(self):
+        self.active.clear()
+
+    def resume(self):
+        self.active.set()
+
+    def _data_ready_callback(self, channel):
+        # Jedno przerwanie na próbkę; wątek budzimy dopiero, gdy zbierze się porcja do opróżnienia
+        self.pending_interrupts += 1
+        if self.pending_interrupts >= self.drain_samples:
+            self.pending_interrupts = 0
+            self.data_ready.set()
+
+    def _run(self):
+        next_time = time.monotonic()
+        while self.running:
+            if not self.active.is_set():
+                # Uśpienie: niepełna paczka jest porzucana, harmonogram startuje od nowa
+                self.active.wait()
+                self.count = 0
+                next_time = time.monotonic()
+                continue
+            now = time.monotonic()
+            try:
+                sample = self.sensor.read_raw_acceleration()
+            except Exception as e:
+                self._report_error(e)
+            else:
+                self.failing = False
+                self._append(now, sample)
+                if self.on_sample:
+                    self.on_sample(np.array([now]), np.array([sample]))
+
+            next_time += self.period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic()
+
+    def _run_fifo(self):
+        period = 1.0 / self.fifo_rate_hz
+        while self.running:
+            if not self.active.is_set():
+                self.active.wait()
+                # Po uśpieniu FIFO zawiera stare dane, a orientacja mogła się zmienić
+                self.count = 0
+                self.last_sample_time = None
+                self.attitude_filter.reset()
+                try:
+                    self.sensor.reset_fifo()
+                except Exception as e:
+                    self._report_error(e)
+                continue
+            if self.int_pin is not None:
+                # Zegar jako zabezpieczenie na wypadek zgubionych zboczy
+                self.data_ready.wait(IMU_FIFO_DRAIN_INTERVAL * 2)
+                self.data_ready.clear()
+            else:
+                time.sleep(IMU_FIFO_DRAIN_INTERVAL)
+            read_at = time.monotonic()
+            try:
+                raw = self.sensor.read_fifo()
+            except Exception as e:
+                self._report_error(e)
+                continue
+            self.failing = False
+            if raw is None:
+                self.fifo_overflows += 1
+                self.count = 0
+                self.last_sample_time = None
+                logger.warning("MPU6500 FIFO overflow, samples dropped")
+                continue
+            if not len(raw):
+                continue
+            self._process_fifo(raw, read_at, period)
+
+    def _process_fifo(self, raw, read_at, period):
+        # FIFO nie przechowuje czasu; ostatnia próbka jest z chwili odczytu, wcześniejsze co okres.
+        # Czas nie może się cofnąć względem poprzedniego opróżnienia (opóźniony odczyt, niepewny zegar czujnika)
+        first = read_at - period * (len(raw) - 1)
+        if self.last_sample_time is not None:
+            first = max(first, self.last_sample_time + period)
+        timestamps = first + period * np.arange(len(raw))
+        self.last_sample_time = float(timestamps[-1])
+        for timestamp, sample in zip(timestamps, raw[:, :3]):
+            self._append(float(timestamp), tuple(int(value) for value in sample))
+        if self.on_sample:
+            self.on_sample(timestamps, raw[:, :3])
+        roll, pitch, yaw_rate = self.attitude_filter.update(raw[:, :3] * ACCEL_SCALE, raw[:, 3:] * GYRO_SCALE, period)
+        if self.on_attitude:
+            self.on_attitude(read_at, {"roll": float(roll[-1]), "pitch": float(pitch[-1]),
+                                       "yaw_rate": float(yaw_rate[-1])})
+
+    def _append(self, timestamp, sample):
+        if self.count == 0:
+            self.batch_start = timestamp
+        self.samples[self.count] = (int((timestamp - self.batch_start) * 1e6),) + sample
+        self.count += 1
+        if self.count == len(self.samples):
+            payload = IMU_BATCH_HEADER.pack(self.batch_start, ACCEL_SCALE, self.count) + self.samples.tobytes()
+            self.on_batch(payload, self.batch_start)
+            self.count = 0
+
+    def _report_error(self, e):
+        # Przy setkach odczytów na sekundę zgłaszamy tylko początek serii błędów
+        if not self.failing:
+            logger.error("MPU6500 read error: %s", e)
+        self.failing = True
+        self.read_errors += 1
@@ -1,5 +1,10 @@
+import logging
 from datetime import datetime
-import smbus2
+import time
+import numpy as np
+from src.sensors.i2c_bus import get_i2c_bus
+
+logger = logging.getLogger(__name__)
 
 # constants
 
@@ -31,16 +36,50 @@ INA3221_CONFIG_MODE_0 = (0x0001)  # Operating Mode bit 0 - See table 6 spec
 
 INA3221_REG_SHUNTVOLTAGE_1 = (0x01)
 INA3221_REG_BUSVOLTAGE_1 = (0x02)
+INA3221_REG_MASK_ENABLE = (0x0F)
+INA3221_MASK_CVRF = (0x0001)  # Conversion ready flag, cleared by reading Mask/Enable
 
 SHUNT_RESISTOR_VALUE = (0.1)   # default shunt resistor value of 0.1 Ohm
 
+INA3221_CONFIG_MODE_MASK = (0x0007)
+INA3221_CONFIG_MODE_POWER_DOWN = (0x0000)
+INA3221_CONFIG_MODE_SINGLE_SHOT = INA3221_CONFIG_MODE_1 | INA3221_CONFIG_MODE_0  # Shunt and bus, triggered
+
+# Averaging (bits 11-9) and conversion time (bits 8-6 bus, 5-3 shunt) codes - table 3/4/5 spec
+INA3221_AVERAGES = (1, 4, 16, 64, 128, 256, 512, 1024)
+INA3221_CONVERSION_TIMES = (0.000140, 0.000204, 0.000332, 0.000588, 0.001100, 0.002116, 0.004156, 0.008244)
+
+# Continuous acquisition: 4 averages x 1.1 ms -> full 3-channel cycle of 26.4 ms (~38 Hz)
+CONTINUOUS_AVERAGES_CODE = 1
+CONTINUOUS_CONVERSION_CODE = 4
+CVRF_POLL_INTERVAL = (0.001)
+
+INA3221_CHANNELS = (1, 2, 3)
+# Battery bus voltage is measured on channel 2, battery current on channel 1
+BATTERY_VOLTAGE_CHANNEL = 2
+BATTERY_CURRENT_CHANNEL = 1
+# Shunt 1..3 and bus 1..3 registers, read in one bus transaction
+INA3221_MEASUREMENT_REGISTERS = [INA3221_REG_SHUNTVOLTAGE_1 + (channel - 1) * 2 for channel in INA3221_CHANNELS] + \
+                                [INA3221_REG_BUSVOLTAGE_1 + (channel - 1) * 2 for channel in INA3221_CHANNELS]
+INA3221_FIELDS = ["voltage", "current"] + [f"bus_voltage_{channel}" for channel in INA3221_CHANNELS] + \
+                 [f"current_{channel}" for channel in INA3221_CHANNELS]
+
+
+def conversion_cycle_time(config):
+    """Time of one full 3-channel shunt + bus conversion for the given config register value."""
+    averages = INA3221_AVERAGES[(config >> 9) & 0x07]
+    bus_time = INA3221_CONVERSION_TIMES[(config >> 6) & 0x07]
+    shunt_time = INA3221_CONVERSION_TIMES[(config >> 3) & 0x07]
+    return len(INA3221_CHANNELS) * averages * (bus_time + shunt_time)
+
 
 
 class INA3221Sensor():
 
-    def __init__(self):
-        self._bus = smbus2.SMBus(1)
+    def __init__(self, bus=None):
+        self._bus = bus or get_i2c_bus()
         self._addr = INA3221_ADDRESS
+        self._bus.register_device(self._addr, "INA3221")
         config = INA3221_CONFIG_ENABLE_CHAN1 |		\
                     INA3221_CONFIG_ENABLE_CHAN2 |	\
                     INA3221_CONFIG_ENABLE_CHAN3 |	\
@@ -51,9 +90,8 @@ class INA3221Sensor():
                     INA3221_CONFIG_MODE_1 |		\
                     INA3221_CONFIG_MODE_0
 
-
-
-
+        self._config = config
+        self.cycle_time = conversion_cycle_time(config)
         self._write_register_little_endian(INA3221_REG_CONFIG, config)
 
 
@@ -118,11 +156,85 @@ class INA3221Sensor():
         valueDec = self.getShuntVoltage_mV(channel)/ SHUNT_RESISTOR_VALUE               
         return valueDec
 
+    def power_down(self):
+        try:
+            self._write_register_little_endian(INA3221_REG_CONFIG,
+                                               (self._config & ~INA3221_CONFIG_MODE_MASK) | INA3221_CONFIG_MODE_POWER_DOWN)
+        except Exception as e:
+            logger.error("INA3221 power down error: %s", e)
+
+    def power_up(self):
+        try:
+            self._write_register_little_endian(INA3221_REG_CONFIG, self._config)
+        except Exception as e:
+            logger.error("INA3221 power up error: %s", e)
+
+    def configure_continuous(self, averages_code=CONTINUOUS_AVERAGES_CODE, conversion_code=CONTINUOUS_CONVERSION_CODE):
+        """Continuous shunt + bus mode with averaging matched to the sampling rate; returns the cycle time [s]."""
+        config = INA3221_CONFIG_ENABLE_CHAN1 | INA3221_CONFIG_ENABLE_CHAN2 | INA3221_CONFIG_ENABLE_CHAN3 | \
+            (averages_code & 0x07) << 9 | (conversion_code & 0x07) << 6 | (conversion_code & 0x07) << 3 | \
+            INA3221_CONFIG_MODE_2 | INA3221_CONFIG_MODE_1 | INA3221_CONFIG_MODE_0
+        self._config = config
+        self._write_register_little_endian(INA3221_REG_CONFIG, config)
+        self.cycle_time = conversion_cycle_time(config)
+        return self.cycle_time
+
+    def conversion_ready(self):
+        return bool(self._read_register_little_endian(INA3221_REG_MASK_ENABLE) & INA3221_MASK_CVRF)
+
+    def wait_conversion_ready(self, timeout):
+        """Polls the CVRF flag instead of sleeping for the worst-case conversion time."""
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.conversion_ready():
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(CVRF_POLL_INTERVAL)
+
+    def read_all(self):
+        """All three channels in one bus transaction; byte swap and scaling done on the whole vector."""
+        words = np.array(self._bus.read_words(self._addr, INA3221_MEASUREMENT_REGISTERS), dtype=np.uint16)
+        raw = words.byteswap().view(np.int16).astype(np.float64)
+        # Shunt LSB 40 uV, bus LSB 8 mV; the low three bits are unused
+        currents = raw[:3] * 0.005 / SHUNT_RESISTOR_VALUE
+        voltages = raw[3:] * 0.001
+        values = {
+            "voltage": float(voltages[BATTERY_VOLTAGE_CHANNEL - 1]),
+            "current": float(currents[BATTERY_CURRENT_CHANNEL - 1]),
+        }
+        for index, channel in enumerate(INA3221_CHANNELS):
+            values[f"bus_voltage_{channel}"] = float(voltages[index])
+            values[f"current_{channel}"] = float(currents[index])
+        return values
+
+    def read_continuous(self):
+        """Result of a conversion completed since the last call, or None - never blocks.
+
+        Polled at half the cycle time, so every conversion is read at most half a cycle late.
+        """
+        if not self.conversion_ready():
+            return None
+        return self.read_all()
+
+    def read_single_shot(self):
+        """One triggered shunt + bus conversion; the device stays idle afterwards."""
+        single_shot = (self._config & ~INA3221_CONFIG_MODE_MASK) | INA3221_CONFIG_MODE_SINGLE_SHOT
+        try:
+            self._write_register_little_endian(INA3221_REG_CONFIG, single_shot)
+            if not self.wait_conversion_ready(conversion_cycle_time(single_shot) * 1.5):
+                # Registers still hold the previous (or power-on zero) result
+                logger.warning("INA3221 single shot conversion did not complete")
+                return None
+            return self.read_all()
+        except Exception as e:
+            logger.error("INA3221 single shot error: %s", e)
+            return None
+
     def read(self):
         try:
-            voltage = self.getBusVoltage_V(2)
-            current = self.getCurrent_mA(1)
-            return {"voltage": voltage, "current": current}
+            values = self.read_all()
+            return {"voltage": values["voltage"], "current": values["current"]}
         except Exception as e:
-            print(f"INA3221 read error: {e}")
+            logger.error("INA3221 read error: %s", e)
             return {"voltage": 0.0, "current": 0.0}
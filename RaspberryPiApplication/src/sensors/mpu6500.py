@@ -1,33 +1,129 @@
-import smbus2
+import logging
 import time
+import numpy as np
+from src.sensors.i2c_bus import get_i2c_bus
+
+logger = logging.getLogger(__name__)
 
-I2C_BUS = 1
-bus = smbus2.SMBus(I2C_BUS)
 MPU6500_ADDR = 0x68
+SMPLRT_DIV = 0x19
+CONFIG = 0x1A
+GYRO_CONFIG = 0x1B
+ACCEL_CONFIG = 0x1C
+ACCEL_CONFIG_2 = 0x1D
+FIFO_EN = 0x23
+INT_PIN_CFG = 0x37
+INT_ENABLE = 0x38
+INT_STATUS = 0x3A
+ACCEL_XOUT_H = 0x3B
+USER_CTRL = 0x6A
+PWR_MGMT_1 = 0x6B
+FIFO_COUNT_H = 0x72
+FIFO_R_W = 0x74
+PWR_MGMT_1_SLEEP = 0x40
+
+# FIFO: akcelerometr i trzy osie żyroskopu, 12 bajtów na próbkę
+FIFO_EN_ACCEL_GYRO = 0x08 | 0x40 | 0x20 | 0x10
+USER_CTRL_FIFO_EN = 0x40
+USER_CTRL_FIFO_RST = 0x04
+INT_STATUS_FIFO_OFLOW = 0x10
+INT_ENABLE_RAW_RDY = 0x01
+INT_ENABLE_FIFO_OFLOW = 0x10
+FIFO_SIZE = 512
+FIFO_SAMPLE_SIZE = 12
+FIFO_SAMPLE_DTYPE = np.dtype(">i2")
+
+# Przy włączonym DLPF wewnętrzne próbkowanie to 1 kHz; częstotliwość wyjściowa = 1000 / (1 + SMPLRT_DIV)
+INTERNAL_SAMPLE_RATE_HZ = 1000
+# DLPF_CFG = 2: pasmo żyroskopu 92 Hz, A_DLPF_CFG = 2: pasmo akcelerometru 99 Hz
+DEFAULT_DLPF = 2
+
+# Czas stabilizacji akcelerometru po wybudzeniu
+WAKE_DELAY = 0.05
+ACCEL_SCALE = 9.81 / 16384.0  # m/s^2 na LSB przy zakresie +-2g
+GYRO_SCALE = 1.0 / 131.0  # deg/s na LSB przy zakresie +-250 deg/s
 
 class MPU6500Sensor:
-    def __init__(self, address=MPU6500_ADDR):
+    def __init__(self, address=MPU6500_ADDR, bus=None):
         self.address = address
+        self.bus = bus or get_i2c_bus()
+        self.bus.register_device(self.address, "MPU6500")
         try:
-            bus.write_byte_data(self.address, 0x6B, 0x00)
+            self.bus.write_byte_data(self.address, PWR_MGMT_1, 0x00)
             time.sleep(0.1)
         except Exception as e:
-            print(f"MPU6500 initialization error: {e}")
+            logger.error("MPU6500 initialization error: %s", e)
+
+    def sleep(self):
+        """Tryb uśpienia - czujnik przestaje mierzyć, pobór prądu spada do kilku uA."""
+        try:
+            self.bus.write_byte_data(self.address, PWR_MGMT_1, PWR_MGMT_1_SLEEP)
+        except Exception as e:
+            logger.error("MPU6500 sleep error: %s", e)
+
+    def wake(self):
+        try:
+            self.bus.write_byte_data(self.address, PWR_MGMT_1, 0x00)
+            time.sleep(WAKE_DELAY)
+        except Exception as e:
+            logger.error("MPU6500 wake error: %s", e)
+
+    def read_raw_acceleration(self):
+        """Surowe odczyty akcelerometru (int16, zakres +-2g)."""
+        data = self.bus.read_i2c_block_data(self.address, ACCEL_XOUT_H, 6)
+        raw = [(data[i] << 8) | data[i + 1] for i in (0, 2, 4)]
+        return tuple(val - 65536 if val > 32767 else val for val in raw)
 
     def read_acceleration(self):
         try:
-            data = bus.read_i2c_block_data(self.address, 0x3B, 6)
-            raw_ax = (data[0]<<8 | data[1])
-            raw_ay = (data[2]<<8 | data[3])
-            raw_az = (data[4]<<8 | data[5])
-            def convert(val):
-                if val > 32767: 
-                    val -= 65536
-                return val / 16384.0
-            ax = convert(raw_ax)
-            ay = convert(raw_ay)
-            az = convert(raw_az)
-            return {"accX": ax*9.81, "accY": ay*9.81, "accZ": az*9.81}
+            raw_ax, raw_ay, raw_az = self.read_raw_acceleration()
+            return {"accX": raw_ax * ACCEL_SCALE, "accY": raw_ay * ACCEL_SCALE, "accZ": raw_az * ACCEL_SCALE}
         except Exception as e:
-            print(f"MPU6500 read error: {e}")
-            return {"accX": 0.0, "accY": 0.0, "accZ": 0.0}
\ No newline at end of file
+            logger.error("MPU6500 read error: %s", e)
+            return {"accX": 0.0, "accY": 0.0, "accZ": 0.0}
+
+    def configure_fifo(self, rate_hz, dlpf=DEFAULT_DLPF, data_ready_interrupt=False):
+        """Ustawia próbkowanie i DLPF, włącza FIFO z akcelerometrem i żyroskopem. Zwraca faktyczną częstotliwość."""
+        divider = min(max(int(round(INTERNAL_SAMPLE_RATE_HZ / rate_hz)) - 1, 0), 255)
+        self.bus.write_byte_data(self.address, USER_CTRL, 0x00)
+        self.bus.write_byte_data(self.address, FIFO_EN, 0x00)
+        self.bus.write_byte_data(self.address, SMPLRT_DIV, divider)
+        self.bus.write_byte_data(self.address, CONFIG, dlpf & 0x07)
+        self.bus.write_byte_data(self.address, GYRO_CONFIG, 0x00)
+        self.bus.write_byte_data(self.address, ACCEL_CONFIG, 0x00)
+        self.bus.write_byte_data(self.address, ACCEL_CONFIG_2, dlpf & 0x07)
+        # Impuls na INT przy każdej nowej próbce (aktywny stan wysoki, push-pull)
+        self.bus.write_byte_data(self.address, INT_PIN_CFG, 0x00)
+        self.bus.write_byte_data(self.address, INT_ENABLE,
+                                 INT_ENABLE_FIFO_OFLOW | (INT_ENABLE_RAW_RDY if data_ready_interrupt else 0x00))
+        self.reset_fifo()
+        self.bus.write_byte_data(self.address, FIFO_EN, FIFO_EN_ACCEL_GYRO)
+        return INTERNAL_SAMPLE_RATE_HZ / (divider + 1)
+
+    def reset_fifo(self):
+        self.bus.write_byte_data(self.address, USER_CTRL, USER_CTRL_FIFO_RST)
+        self.bus.write_byte_data(self.address, USER_CTRL, USER_CTRL_FIFO_EN)
+
+    def disable_fifo(self):
+        try:
+            self.bus.write_byte_data(self.address, FIFO_EN, 0x00)
+            self.bus.write_byte_data(self.address, USER_CTRL, 0x00)
+            self.bus.write_byte_data(self.address, INT_ENABLE, 0x00)
+        except Exception as e:
+            logger.error("MPU6500 FIFO disable error: %s", e)
+
+    def read_fifo(self):
+        """Opróżnia FIFO: tablica int16 Nx6 (ax, ay, az, gx, gy, gz) albo None po przepełnieniu.
+
+        Po przepełnieniu kolejka jest zerowana, bo granice próbek w FIFO nie są już znane.
+        """
+        status, count_hi, count_lo = self.bus.read_registers(self.address, [INT_STATUS, FIFO_COUNT_H, FIFO_COUNT_H + 1])
+        fifo_bytes = (count_hi << 8) | count_lo
+        if status & INT_STATUS_FIFO_OFLOW or fifo_bytes >= FIFO_SIZE:
+            self.reset_fifo()
+            return None
+        count = fifo_bytes // FIFO_SAMPLE_SIZE
+        if count == 0:
+            return np.empty((0, 6), dtype=np.int16)
+        data = self.bus.read_block(self.address, FIFO_R_W, count * FIFO_SAMPLE_SIZE)
+        return np.frombuffer(data, dtype=FIFO_SAMPLE_DTYPE).reshape(count, 6).astype(np.int16)
@@ -1,24 +1,32 @@
-import smbus2
+import logging
+from src.sensors.i2c_bus import get_i2c_bus, PRIORITY_ACTUATOR
+
+logger = logging.getLogger(__name__)
 
-I2C_BUS = 1
-bus = smbus2.SMBus(I2C_BUS)
 PCF8574_ADDR = 0x20
 
 class PCF8574IOExpander:
-    def __init__(self, address=PCF8574_ADDR):
+    def __init__(self, address=PCF8574_ADDR, bus=None):
         self.address = address
+        self.bus = bus or get_i2c_bus()
+        self.bus.register_device(self.address, "PCF8574")
         try:
             self.state = 0x00
-            bus.write_byte(self.address, self.state)
+            self.bus.write_byte(self.address, self.state, PRIORITY_ACTUATOR)
         except Exception as e:
-            print(f"PCF8574 initialization error: {e}")
+            logger.error("PCF8574 initialization error: %s", e)
+
+    def write_state(self, state):
+        """Wszystkie osiem wyjść jednym zapisem bajtu; błąd I2C jest przekazywany wywołującemu."""
+        self.bus.write_byte(self.address, state, PRIORITY_ACTUATOR)
+        self.state = state
 
     def set_bit(self, bit, value):
         try:
             if value:
-                self.state |= (1 << bit)
+                state = self.state | (1 << bit)
             else:
-                self.state &= ~(1 << bit)
-            bus.write_byte(self.address, self.state)
+                state = self.state & ~(1 << bit)
+            self.write_state(state)
         except Exception as e:
-            print(f"PCF8574 set_bit error: {e}")
\ No newline at end of file
+            logger.error("PCF8574 set_bit error: %s", e)
\ No newline at end of file
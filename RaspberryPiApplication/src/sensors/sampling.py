@@ -0,0 +1,194 @@
+import logging
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RING_CAPACITY = 256
+
+
+class SampleRing:
+    """Bufor cykliczny próbek o stałym rozmiarze; każda próbka ma znacznik czasu (time.monotonic)."""
+
+    def __init__(self, fields, capacity=DEFAULT_RING_CAPACITY):
+        self.fields = list(fields)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((capacity, len(self.fields)), dtype=np.float64)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def append(self, timestamp, values):
+        with self.lock:
+            index = self.count % len(self.timestamps)
+            self.timestamps[index] = timestamp
+            self.values[index] = [values[field] for field in self.fields]
+            self.count += 1
+
+    def append_block(self, timestamps, values):
+        """Wiele próbek naraz (tablica NxK w kolejności pól)."""
+        with self.lock:
+            capacity = len(self.timestamps)
+            # Z bloku dłuższego niż bufor zostaje tylko końcówka
+            skipped = max(0, len(timestamps) - capacity)
+            indices = np.arange(self.count + skipped, self.count + len(timestamps)) % capacity
+            self.timestamps[indices] = timestamps[skipped:]
+            self.values[indices] = values[skipped:]
+            self.count += len(timestamps)
+
+    def latest(self):
+        """(znacznik czasu, {pole: wartość}) albo None, jeśli nie było jeszcze próbki."""
+        with self.lock:
+            if self.count == 0:
+                return None
+            index = (self.count - 1) % len(self.timestamps)
+            return float(self.timestamps[index]), dict(zip(self.fields, self.values[index].tolist()))
+
+    def window(self, count=None):
+        """Ostatnie próbki w kolejności chronologicznej: (znaczniki czasu, wartości)."""
+        with self.lock:
+            available = min(self.count, len(self.timestamps))
+            count = available if count is None else min(count, available)
+            indices = (np.arange(self.count - count, self.count)) % len(self.timestamps)
+            return self.timestamps[indices].copy(), self.values[indices].copy()
+
+
+class SamplingSource:
+    """Jedno źródło danych z własnym okresem próbkowania i własnym wątkiem."""
+
+    def __init__(self, name, read, period, fields, on_sample, capacity=DEFAULT_RING_CAPACITY):
+        self.name = name
+        self.fields = list(fields)
+        # Opcjonalny łańcuch filtrów (filters.FilterChain) przed zapisem do bufora i publikacją
+        self.chain = None
+        self.read = read
+        self.period = period
+        self.on_sample = on_sample
+        self.ring = SampleRing(fields, capacity)
+        self.samples = 0
+        self.input_samples = 0
+        self.errors = 0
+        self.overruns = 0
+        self.last_duration = 0.0
+        self.thread = None
+
+    def record(self, timestamp, values):
+        if self.chain is not None:
+            self.record_block(np.array([timestamp]), np.array([[values[field] for field in self.fields]]))
+            return
+        self.input_samples += 1
+        self.ring.append(timestamp, values)
+        self.samples += 1
+        self.on_sample(self.name, timestamp, values)
+
+    def record_block(self, timestamps, values):
+        """Porcja próbek (znaczniki czasu, tablica NxK); publikowana jest tylko ostatnia próbka po filtrach."""
+        self.input_samples += len(timestamps)
+        chain = self.chain
+        if chain is not None:
+            timestamps, values = chain.process(timestamps, values)
+        if not len(timestamps):
+            return
+        self.ring.append_block(timestamps, values)
+        self.samples += len(timestamps)
+        self.on_sample(self.name, float(timestamps[-1]), dict(zip(self.fields, values[-1].tolist())))
+
+    def run(self, scheduler):
+        next_time = time.monotonic()
+        while scheduler.running:
+            if not scheduler.active.is_set():
+                scheduler.active.wait()
+                next_time = time.monotonic()
+                continue
+            started = time.monotonic()
+            try:
+                values = self.read()
+            except Exception as e:
+                self.errors += 1
+                logger.error("Sampling %s failed: %s", self.name, e)
+            else:
+                # Znacznik czasu to środek odczytu, a nie moment publikacji
+                self.last_duration = time.monotonic() - started
+                # None oznacza brak nowego pomiaru (np. przetwornik nie skończył konwersji)
+                if values is not None:
+                    self.record(started + self.last_duration / 2, values)
+
+            next_time += self.period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Odczyt trwał dłużej niż okres - nie nadrabiamy zaległych próbek
+                self.overruns += 1
+                next_time = time.monotonic()
+
+
+class SamplingScheduler:
+    """Próbkuje każde źródło z jego własną częstotliwością; wolne źródło nie opóźnia pozostałych."""
+
+    def __init__(self, on_sample):
+        self.on_sample = on_sample
+        self.sources = {}
+        self.running = False
+        self.active = threading.Event()
+        self.active.set()
+
+    def add_source(self, name, read, period, fields, capacity=DEFAULT_RING_CAPACITY):
+        self.sources[name] = SamplingSource(name, read, period, fields, self.on_sample, capacity)
+        return self.sources[name]
+
+    def add_external_source(self, name, fields, capacity=DEFAULT_RING_CAPACITY):
+        """Źródło zasilane z zewnątrz przez publish(), np. przez ImuSampler z własnym wątkiem."""
+        return self.add_source(name, None, None, fields, capacity)
+
+    def publish(self, name, timestamp, values):
+        self.sources[name].record(timestamp, values)
+
+    def publish_block(self, name, timestamps, values):
+        self.sources[name].record_block(timestamps, values)
+
+    def set_filter(self, name, chain):
+        self.sources[name].chain = chain
+
+    def reset_filter(self, name):
+        chain = self.sources[name].chain
+        if chain is not None:
+            chain.reset()
+
+    def ring(self, name):
+        return self.sources[name].ring
+
+    def start(self):
+        self.running = True
+        for source in self.sources.values():
+            if source.read is None:
+                continue
+            source.thread = threading.Thread(target=source.run, args=(self,), daemon=True,
+                                             name=f"sampling-{source.name}")
+            source.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.active.set()
+
+    def pause(self):
+        self.active.clear()
+
+    def resume(self):
+        # Stan filtrów sprzed uśpienia nie pasuje do nowych danych
+        for name in self.sources:
+            self.reset_filter(name)
+        self.active.set()
+
+    def stats(self):
+        return {
+            name: {
+                "period_ms": None if source.period is None else source.period * 1000.0,
+                "samples": source.samples,
+                "input_samples": source.input_samples,
+                "errors": source.errors,
+                "overruns": source.overruns,
+                "last_read_ms": source.last_duration * 1000.0,
+            }
+            for name, source in self.sources.items()
+        }
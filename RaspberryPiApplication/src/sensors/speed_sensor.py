@@ -1,12 +1,48 @@
-import RPi.GPIO as GPIO
+import logging
 import time
 import math
+import numpy as np
+from src.hal import get_backend
+
+logger = logging.getLogger(__name__)
 
 SENSOR_PIN = 22  # Pin connected to the sensor's signal output
 WHEEL_DIAMETER_MM = 45
 PULSES_PER_REVOLUTION = 18  # Number of signal changes per full wheel revolution
 UPDATE_INTERVAL = 1.0  # Time interval in seconds for speed calculation
 
+# Edge capture: timestamps of the last pulses (us, 32-bit wrapping like pigpio ticks)
+EDGE_RING_SIZE = 256
+TICK_MODULUS = 1 << 32
+GLITCH_FILTER_US = 100
+# Speed is averaged over pulses from this window, at most one wheel revolution
+SPEED_WINDOW = 0.1
+# No pulse for this long means the wheel stopped
+STANDSTILL_TIMEOUT = 0.5
+
+
+class EdgeRing:
+    """Ring of edge timestamps with a single writer (GPIO callback) and a single reader.
+
+    The writer stores the tick first and publishes it by bumping the counter, so the reader
+    never needs a lock: it only looks at slots below the counter value it has read.
+    """
+
+    def __init__(self, size=EDGE_RING_SIZE):
+        self.ticks = np.zeros(size, dtype=np.uint32)
+        self.count = 0
+
+    def push(self, tick):
+        self.ticks[self.count % len(self.ticks)] = tick
+        self.count += 1
+
+    def last(self, n):
+        count = self.count
+        n = min(n, count, len(self.ticks) - 1)
+        indices = np.arange(count - n, count) % len(self.ticks)
+        return self.ticks[indices].astype(np.int64)
+
+
 class SpeedSensor:
     def __init__(self):
         self.pin_sensor = SENSOR_PIN
@@ -14,37 +50,81 @@ class SpeedSensor:
         self.pulses_per_revolution = PULSES_PER_REVOLUTION
 
         self.wheel_circumference_m = (self.wheel_diameter * math.pi) / 1000
-        
-        self.pulse_count = 0
-        self.last_time = None
+        self.distance_per_pulse_m = self.wheel_circumference_m / self.pulses_per_revolution
+
+        self.edges = EdgeRing()
+        self.gpio = get_backend().gpio
+        self.pi = None
+        self.edge_callback = None
 
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(self.pin_sensor, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        # pigpio timestamps edges in the daemon (DMA sampling, 1 us); RPi.GPIO only when the callback runs
+        pigpio = get_backend().pigpio
+        pi = pigpio.pi()
+        if pi.connected:
+            self.pi = pi
+            self.pi.set_mode(self.pin_sensor, pigpio.INPUT)
+            self.pi.set_pull_up_down(self.pin_sensor, pigpio.PUD_UP)
+            self.pi.set_glitch_filter(self.pin_sensor, GLITCH_FILTER_US)
+            self.edge_callback = self.pi.callback(self.pin_sensor, pigpio.RISING_EDGE, self._tick_callback)
+        else:
+            logger.warning("pigpio daemon not available, speed sensor falls back to RPi.GPIO timestamps")
+            self.gpio.setmode(self.gpio.BCM)
+            self.gpio.setup(self.pin_sensor, self.gpio.IN, pull_up_down=self.gpio.PUD_UP)
+            self.gpio.add_event_detect(self.pin_sensor, self.gpio.RISING, callback=self._pulse_callback)
 
-        GPIO.add_event_detect(self.pin_sensor, GPIO.RISING, callback=self._pulse_callback)
+    def _tick_callback(self, gpio, level, tick):
+        self.edges.push(tick)
 
-    
     def _pulse_callback(self, channel):
-        self.pulse_count += 1
+        self.edges.push(self._current_tick())
 
-    def calculate_speed(self):
-        if self.last_time is None:
-            self.last_time = time.time()
-            return 0
+    def _current_tick(self):
+        if self.pi:
+            return self.pi.get_current_tick()
+        return int(time.monotonic() * 1e6) % TICK_MODULUS
+
+    @property
+    def pulse_count(self):
+        return self.edges.count
 
-        current_time = time.time()
-        elapsed_time_s = current_time - self.last_time
-        self.last_time = current_time
-        elapsed_time_h = elapsed_time_s / 3600
+    def read(self):
+        """Speed [km/h] and acceleration [m/s^2] estimated from pulse periods."""
+        now = self._current_tick()
+        ticks = self.edges.last(self.pulses_per_revolution + 1)
+        if len(ticks) < 2:
+            return {"speed": 0.0, "wheel_acceleration": 0.0}
 
-        # Calculating the number of revolutions
-        revolutions = self.pulse_count / self.pulses_per_revolution
-        self.pulse_count = 0
+        # Ages of the pulses relative to now, oldest first; modulo handles tick wrap-around
+        ages = ((now - ticks) % TICK_MODULUS) * 1e-6
+        since_last = ages[-1]
+        if since_last > STANDSTILL_TIMEOUT:
+            return {"speed": 0.0, "wheel_acceleration": 0.0}
 
-        # calculation of the speed in km/h
-        wheel_circumference_km = self.wheel_circumference_m / 1000
-        speed = (revolutions * wheel_circumference_km) / elapsed_time_h
-        return speed
+        periods = ages[:-1] - ages[1:]
+        # Average over the pulses from the last window, but always over at least one period
+        recent = max(1, int(np.count_nonzero(ages[:-1] <= SPEED_WINDOW + since_last)))
+        speed = self.distance_per_pulse_m * recent / periods[-recent:].sum()
+        speeds = self.distance_per_pulse_m / periods
+        midpoints = -(ages[:-1] + ages[1:]) / 2
+        # Slowing down: no pulse for longer than the last period caps the speed,
+        # and the open period counts as one more (slower) point for the acceleration
+        if since_last > periods[-1]:
+            speed = min(speed, self.distance_per_pulse_m / since_last)
+            speeds = np.append(speeds, self.distance_per_pulse_m / since_last)
+            midpoints = np.append(midpoints, -since_last / 2)
+
+        acceleration = 0.0
+        if len(speeds) >= 3:
+            # Slope of the per-period speeds over the period midpoints
+            acceleration = float(np.polyfit(midpoints, speeds, 1)[0])
+        return {"speed": float(speed) * 3.6, "wheel_acceleration": acceleration}
+
+    def calculate_speed(self):
+        return self.read()["speed"]
 
     def cleanup(self):
-        GPIO.cleanup()
+        if self.edge_callback:
+            self.edge_callback.cancel()
+            self.pi.stop()
+        else:
+            self.gpio.cleanup()
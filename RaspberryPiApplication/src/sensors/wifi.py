@@ -0,0 +1,96 @@
+import logging
+import os
+import socket
+import time
+
+try:
+    from pyroute2 import IW
+except ImportError:  # pyroute2 jest opcjonalne - bez niego zostaje /proc/net/wireless
+    IW = None
+
+logger = logging.getLogger(__name__)
+
+WIFI_INTERFACE = "wlan0"
+PROC_NET_WIRELESS = "/proc/net/wireless"
+WIFI_FIELDS = ["wifi_signal_strength", "wifi_bitrate", "wifi_tx_retries", "wifi_tx_failed"]
+
+
+class WifiMonitor:
+    """Stan łącza Wi-Fi bez uruchamiania iwconfig: nl80211 (pyroute2) albo /proc/net/wireless.
+
+    Liczniki retransmisji i nieudanych wysyłek są podawane jako przyrost na sekundę od poprzedniego odczytu.
+    """
+
+    def __init__(self, interface=WIFI_INTERFACE):
+        self.interface = interface
+        self.iw = None
+        self.ifindex = None
+        self.last_counters = {}
+        if IW is not None:
+            try:
+                self.ifindex = socket.if_nametoindex(interface)
+                self.iw = IW()
+            except Exception as e:
+                logger.warning("nl80211 not available for %s, using %s: %s", interface, PROC_NET_WIRELESS, e)
+                self.iw = None
+        if self.iw is None and not os.path.exists(PROC_NET_WIRELESS):
+            logger.warning("No wireless statistics available, Wi-Fi channels will report zeros")
+
+    def read(self):
+        if self.iw is not None:
+            signal, bitrate, retries, failed = self._read_nl80211()
+        else:
+            signal, bitrate, retries, failed = self._read_proc()
+        return {
+            "wifi_signal_strength": signal,
+            "wifi_bitrate": bitrate,
+            "wifi_tx_retries": self._rate("retries", retries),
+            "wifi_tx_failed": self._rate("failed", failed),
+        }
+
+    def _rate(self, name, value):
+        now = time.monotonic()
+        previous = self.last_counters.get(name)
+        self.last_counters[name] = (now, value)
+        if previous is None or previous[1] is None or value is None or value < previous[1] or now <= previous[0]:
+            # Pierwszy odczyt, brak licznika albo licznik wyzerowany (ponowne połączenie)
+            return 0.0
+        return (value - previous[1]) / (now - previous[0])
+
+    def _read_nl80211(self):
+        stations = self.iw.get_stations(self.ifindex)
+        if not stations:
+            return 0, 0.0, None, None
+        # W trybie klienta jest jedna stacja (punkt dostępowy); w trybie AP bierzemy ostatnio aktywnego klienta
+        info = min((station.get_attr("NL80211_ATTR_STA_INFO") for station in stations),
+                   key=lambda info: info.get_attr("NL80211_STA_INFO_INACTIVE_TIME") or 0)
+        signal = info.get_attr("NL80211_STA_INFO_SIGNAL") or 0
+        if signal > 127:
+            signal -= 256
+        bitrate = 0.0
+        tx_bitrate = info.get_attr("NL80211_STA_INFO_TX_BITRATE")
+        if tx_bitrate is not None:
+            # Jednostka nl80211: 100 kbit/s
+            bitrate = (tx_bitrate.get_attr("NL80211_RATE_INFO_BITRATE32") or
+                       tx_bitrate.get_attr("NL80211_RATE_INFO_BITRATE") or 0) / 10.0
+        return (signal, bitrate, info.get_attr("NL80211_STA_INFO_TX_RETRIES"),
+                info.get_attr("NL80211_STA_INFO_TX_FAILED"))
+
+    def _read_proc(self):
+        """Wiersz interfejsu: status, jakość (link, level, noise), odrzucone (nwid, crypt, frag, retry, misc), ..."""
+        if not os.path.exists(PROC_NET_WIRELESS):
+            return 0, 0.0, None, None
+        with open(PROC_NET_WIRELESS) as f:
+            for line in f.readlines()[2:]:
+                name, _, fields = line.partition(":")
+                if name.strip() != self.interface:
+                    continue
+                parts = fields.split()
+                signal = int(float(parts[2].rstrip(".")))
+                # "retry" to ramki porzucone po wyczerpaniu retransmisji; liczby retransmisji i przepływności tu nie ma
+                return signal, 0.0, None, int(parts[7])
+        return 0, 0.0, None, None
+
+    def close(self):
+        if self.iw is not None:
+            self.iw.close()
@@ -0,0 +1,150 @@
+import logging
+import threading
+import time
+from collections import deque
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ACTUATION_RATE_HZ = 100
+# Ograniczenia szybkości zmian: skręt w stopniach na sekundę, gaz w procentach na sekundę.
+# Gaz jest ograniczany tylko przy wzroście, hamulec i puszczenie gazu działają od razu
+STEERING_SLEW_RATE = 600.0
+THROTTLE_SLEW_RATE = 500.0
+# Liczba ostatnich kroków, z których liczone są statystyki opóźnień
+TIMING_HISTORY = 1000
+# Wciśnięcie hamulca (%), powyżej którego regulator prędkości oddaje sterowanie
+BRAKE_OVERRIDE = 5
+
+
+def slew(current, target, max_step):
+    return min(max(target, current - max_step), current + max_step)
+
+
+class ActuationLoop:
+    """Pętla wykonawcza o stałej częstotliwości: bierze ostatni stan sterowania i przekazuje go do wyjść.
+
+    Wątki sieciowe tylko aktualizują wspólny stan, więc opóźnienia i serie pakietów nie przenoszą się na sprzęt.
+    """
+
+    def __init__(self, outputs, read_controls, rate_hz=ACTUATION_RATE_HZ, steering_slew_rate=STEERING_SLEW_RATE,
+                 throttle_slew_rate=THROTTLE_SLEW_RATE, on_step=None, speed_controller=None, steering_controller=None):
+        self.outputs = outputs
+        # Zwraca kopię stanu sterowania; "active" False oznacza zatrzymanie silnika i serwa
+        self.read_controls = read_controls
+        self.period = 1.0 / rate_hz
+        self.steering_step = steering_slew_rate * self.period
+        self.throttle_step = throttle_slew_rate * self.period
+        # Wywoływane z (spóźnienie + czas kroku w sekundach, stan sterowania z kroku), np. dla QosScheduler;
+        # "applied_at" w stanie to chwila zapisu do wyjść
+        self.on_step = on_step
+        # Regulator prędkości dla trybu "closed_loop"; bez niego gaz zawsze steruje silnikiem wprost
+        self.speed_controller = speed_controller
+        # Regulator położenia kół z enkodera; bez niego skręt jest mapowany na impuls serwa wprost
+        self.steering_controller = steering_controller
+        self.steering = 0.0
+        self.throttle = 0.0
+        self.lateness = deque(maxlen=TIMING_HISTORY)
+        self.durations = deque(maxlen=TIMING_HISTORY)
+        self.steps = 0
+        self.overruns = 0
+        self.running = False
+        self.active = threading.Event()
+        self.active.set()
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True, name="actuation")
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.active.set()
+
+    def pause(self):
+        self.active.clear()
+
+    def resume(self):
+        self.active.set()
+
+    def _run(self):
+        next_time = time.monotonic()
+        while self.running:
+            if not self.active.is_set():
+                self.active.wait()
+                next_time = time.monotonic()
+                continue
+            started = time.monotonic()
+            lateness = started - next_time
+            controls = {}
+            try:
+                controls = self.read_controls()
+                self.step(controls)
+            except Exception as e:
+                logger.error("Actuation step failed: %s", e)
+            duration = time.monotonic() - started
+            self.steps += 1
+            self.lateness.append(lateness)
+            self.durations.append(duration)
+            if self.on_step:
+                self.on_step(lateness + duration, controls)
+
+            next_time += self.period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Krok trwał dłużej niż okres - nie nadrabiamy zaległych kroków
+                self.overruns += 1
+                next_time = time.monotonic()
+
+    def step(self, controls):
+        if not controls.get("active", True):
+            # Ponowny start zaczyna się od zera, a nie od ostatniej wartości przed zatrzymaniem
+            self.steering = 0.0
+            self.throttle = 0.0
+            if self.speed_controller:
+                self.speed_controller.reset()
+            if self.steering_controller:
+                self.steering_controller.reset()
+            self.outputs.stop()
+            return
+        self.steering = slew(self.steering, controls["steering_angle"], self.steering_step)
+        target_throttle = controls["gas_pedal"]
+        if target_throttle > self.throttle:
+            self.throttle = min(target_throttle, self.throttle + self.throttle_step)
+        else:
+            self.throttle = target_throttle
+        controls["steering_angle"] = self.steering
+        controls["gas_pedal"] = self.throttle
+        controls["drive_duty"] = self._drive_duty(controls)
+        if self.steering_controller:
+            controls["servo_pulse"] = self.steering_controller.update(self.steering, self.period)
+        self.outputs.apply(controls)
+        controls["applied_at"] = time.monotonic()
+
+    def _drive_duty(self, controls):
+        """Wypełnienie z regulatora prędkości albo None (gaz steruje silnikiem wprost)."""
+        if not self.speed_controller:
+            return None
+        # Hamulec zawsze działa jak bez regulatora
+        if not controls.get("closed_loop") or controls["brake_pedal"] > BRAKE_OVERRIDE:
+            self.speed_controller.reset()
+            return None
+        return self.speed_controller.update(controls["gas_pedal"], controls["gear"], self.period)
+
+    def stats(self):
+        lateness = np.array(list(self.lateness)) * 1000.0
+        durations = np.array(list(self.durations)) * 1000.0
+        return {
+            "rate_hz": 1.0 / self.period,
+            "steps": self.steps,
+            "overruns": self.overruns,
+            "jitter_p50_ms": float(np.percentile(lateness, 50)) if len(lateness) else None,
+            "jitter_p95_ms": float(np.percentile(lateness, 95)) if len(lateness) else None,
+            "jitter_max_ms": float(lateness.max()) if len(lateness) else None,
+            "step_p95_ms": float(np.percentile(durations, 95)) if len(durations) else None,
+            "speed_controller": self.speed_controller.stats() if self.speed_controller else None,
+            "steering_controller": self.steering_controller.stats() if self.steering_controller else None,
+        }
@@ -0,0 +1,104 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bity ekspandera PCF8574
+LIGHT_BITS = (0, 1, 2, 3)
+BRAKE_LIGHT_BITS = (4, 5)
+HORN_BIT = 6
+# Światła stopu zapalają się powyżej tego wciśnięcia hamulca (%)
+BRAKE_LIGHT_THRESHOLD = 5
+
+SERVO_CENTER_US = 1500
+SERVO_US_PER_DEGREE = 600 / 180.0
+SERVO_OFF = 0
+
+OUTPUTS = ("expander", "motor", "servo")
+
+
+def expander_byte(lights_on, brake_lights_on, horn_on):
+    state = 0
+    if lights_on:
+        for bit in LIGHT_BITS:
+            state |= 1 << bit
+    if brake_lights_on:
+        for bit in BRAKE_LIGHT_BITS:
+            state |= 1 << bit
+    if horn_on:
+        state |= 1 << HORN_BIT
+    return state
+
+
+class OutputStage:
+    """Wylicza docelowy stan wyjść z ramki sterowania i zapisuje do sprzętu tylko to, co się zmieniło.
+
+    Ekspander dostaje jeden bajt na ramkę, silnik i serwo - nowe wartości tylko przy zmianie.
+    Stan None oznacza "nieznany" (start albo błąd zapisu) i wymusza zapis przy następnej ramce.
+    """
+
+    def __init__(self, io_expander, motor, servo):
+        self.io_expander = io_expander
+        self.motor = motor
+        self.servo = servo
+        self.applied = dict.fromkeys(OUTPUTS)
+        self.writes = dict.fromkeys(OUTPUTS, 0)
+        self.skipped = dict.fromkeys(OUTPUTS, 0)
+        self.errors = dict.fromkeys(OUTPUTS, 0)
+
+    def desired_state(self, control_data):
+        brake = control_data["brake_pedal"]
+        if control_data.get("drive_duty") is not None:
+            # Wypełnienie z regulatora prędkości zamiast mapowania gazu
+            motor = self.motor.drive_duty_cycles(control_data["drive_duty"], control_data["gear"])
+        else:
+            motor = self.motor.duty_cycles(control_data["gas_pedal"], brake, control_data["gear"])
+        if control_data.get("servo_pulse") is not None:
+            # Impuls z regulatora położenia kół (sprzężenie z enkodera)
+            servo = control_data["servo_pulse"]
+        else:
+            servo = SERVO_CENTER_US + control_data["steering_angle"] * SERVO_US_PER_DEGREE
+        return {
+            "expander": expander_byte(control_data["lights_on"], brake > BRAKE_LIGHT_THRESHOLD, control_data["horn_on"]),
+            "motor": motor,
+            "servo": int(round(servo)),
+        }
+
+    def apply(self, control_data):
+        self.commit(self.desired_state(control_data))
+
+    def stop(self):
+        """Silnik i serwo wyłączone; światła zostają, jak były."""
+        self.commit({"motor": (0, 0), "servo": SERVO_OFF})
+
+    def invalidate(self):
+        self.applied = dict.fromkeys(OUTPUTS)
+
+    def commit(self, desired):
+        for output, value in desired.items():
+            if self.applied[output] == value:
+                self.skipped[output] += 1
+                continue
+            try:
+                self._write(output, value)
+            except Exception as e:
+                self.applied[output] = None
+                self.errors[output] += 1
+                logger.error("Error applying %s output: %s", output, e)
+            else:
+                self.applied[output] = value
+                self.writes[output] += 1
+
+    def _write(self, output, value):
+        if output == "expander":
+            self.io_expander.write_state(value)
+        elif output == "motor":
+            self.motor.set_duty_cycles(*value)
+        else:
+            self.servo.set_pulse_width(value)
+
+    def stats(self):
+        return {
+            output: {"writes": self.writes[output], "skipped": self.skipped[output], "errors": self.errors[output],
+                     "applied": self.applied[output]}
+            for output in OUTPUTS
+        }
@@ -0,0 +1,179 @@
+import json
+import struct
+import time
+import numpy as np
+
+# Ramka sterowania bez numeru sekwencyjnego (starsi klienci TCP):
+# bieg, skręt, gaz, hamulec, funkcje
+CONTROL_FRAME = struct.Struct("bbBBB")
+
+# Ramka sterowania z numerem sekwencyjnym (UDP oraz nowi klienci TCP).
+# Pierwszy bajt magic ('R' = 82) nie może być poprawnym biegiem, dzięki czemu
+# serwer TCP rozpoznaje format po pierwszym bajcie.
+CONTROL_MAGIC = b"RC"
+SEQUENCED_CONTROL_FRAME = struct.Struct("<2sIbbBBB")
+
+SEQUENCE_MODULUS = 1 << 32
+
+
+def is_newer_sequence(sequence, last_sequence):
+    """Sprawdza, czy numer jest nowszy od poprzedniego (z uwzględnieniem przepełnienia licznika)."""
+    if last_sequence is None:
+        return True
+    diff = (sequence - last_sequence) % SEQUENCE_MODULUS
+    return 0 < diff < SEQUENCE_MODULUS // 2
+
+
+def unpack_control_datagram(data):
+    """Zwraca (numer, pola sterowania) lub None dla niepoprawnej ramki."""
+    if len(data) != SEQUENCED_CONTROL_FRAME.size:
+        return None
+    magic, sequence, *fields = SEQUENCED_CONTROL_FRAME.unpack(data)
+    if magic != CONTROL_MAGIC:
+        return None
+    return sequence, fields
+
+
+# Telemetria w wersji 1: każda wiadomość zaczyna się nagłówkiem
+# magic, wersja, typ wiadomości, numer sekwencyjny, znacznik czasu (time.monotonic, s), długość danych
+TELEMETRY_MAGIC = b"RT"
+TELEMETRY_VERSION = 1
+TELEMETRY_HEADER = struct.Struct("<2sBBIdH")
+
+MSG_HELLO = 1
+MSG_SCHEMA = 2
+MSG_DATA = 3
+MSG_SUBSCRIBE = 4
+MSG_IMU_BATCH = 5
+MSG_TIME_REQUEST = 6
+MSG_TIME_RESPONSE = 7
+
+# Synchronizacja zegarów (jak w NTP): klient wysyła t0, serwer odsyła t0, t1 (odbiór) i t2 (wysłanie)
+TIME_REQUEST = struct.Struct("<d")
+TIME_RESPONSE = struct.Struct("<ddd")
+
+# Ramka telemetrii starszych klientów (bez nagłówka)
+LEGACY_TELEMETRY_FRAME = struct.Struct("ffffffi")
+LEGACY_TELEMETRY_CHANNELS = ["speed", "accX", "accY", "accZ", "voltage", "current", "wifi_signal_strength"]
+
+# Katalog kanałów: nazwa -> (kod struct, jednostka)
+TELEMETRY_CHANNELS = {
+    "speed": ("f", "km/h"),
+    "wheel_acceleration": ("f", "m/s^2"),
+    "accX": ("f", "m/s^2"),
+    "accY": ("f", "m/s^2"),
+    "accZ": ("f", "m/s^2"),
+    "voltage": ("f", "V"),
+    "current": ("f", "mA"),
+    # Wszystkie kanały INA3221 oraz bilans energii liczony na Pi przy każdej próbce
+    "bus_voltage_1": ("f", "V"),
+    "bus_voltage_2": ("f", "V"),
+    "bus_voltage_3": ("f", "V"),
+    "current_1": ("f", "mA"),
+    "current_2": ("f", "mA"),
+    "current_3": ("f", "mA"),
+    "power": ("f", "W"),
+    "charge_used": ("f", "mAh"),
+    "energy_used": ("f", "Wh"),
+    "energy_remaining": ("f", "Wh"),
+    "wifi_signal_strength": ("i", "dBm"),
+    # Przepływność nadawania i przyrosty liczników retransmisji / nieudanych wysyłek
+    "wifi_bitrate": ("f", "Mbit/s"),
+    "wifi_tx_retries": ("f", "1/s"),
+    "wifi_tx_failed": ("f", "1/s"),
+    # Kąt kół z enkodera AS5600, kąt zadany i ostatni czas ustalenia się serwa po zmianie skrętu
+    "steering_angle": ("f", "deg"),
+    "steering_target": ("f", "deg"),
+    "servo_lag": ("f", "ms"),
+    # Orientacja z filtru komplementarnego (akcelerometr + żyroskop)
+    "roll": ("f", "deg"),
+    "pitch": ("f", "deg"),
+    "yaw_rate": ("f", "deg/s"),
+    # Echo ostatniej zastosowanej ramki sterowania i czas jej zastosowania (zegar serwera)
+    "control_seq": ("I", ""),
+    "control_applied_at": ("d", "s"),
+}
+
+# Paczka próbek IMU: znacznik czasu pierwszej próbki, skala (m/s^2 na LSB), liczba próbek,
+# a po nim próbki: przesunięcie względem pierwszej próbki (us) i surowe osie x, y, z
+IMU_BATCH_HEADER = struct.Struct("<dfH")
+IMU_SAMPLE_DTYPE = np.dtype([("offset_us", "<u4"), ("x", "<i2"), ("y", "<i2"), ("z", "<i2")])
+
+# Sonda łącza: echo (RTT, jitter, straty) i seria pakietów od serwera (przepustowość w stronę klienta).
+# Nagłówek: magic, typ, id pomiaru, numer pakietu, czas nadania u klienta
+LINK_PROBE_MAGIC = b"RP"
+LINK_PROBE_HEADER = struct.Struct("<2sBIId")
+PROBE_ECHO = 1
+PROBE_BURST_REQUEST = 2
+PROBE_BURST_DATA = 3
+# Treść żądania serii: liczba pakietów, rozmiar pakietu w bajtach
+PROBE_BURST_REQUEST_BODY = struct.Struct("<HH")
+PROBE_MAX_PACKET_SIZE = 1400
+# Górna granica serii - klient PC prosi o ~240 kB
+PROBE_MAX_BURST_BYTES = 256 * 1024
+
+DEFAULT_FRAME_ID = 1
+DEFAULT_TELEMETRY_RATE_HZ = 10
+# Najwyższa obsługiwana częstotliwość; "decimation": n w subskrypcji oznacza TELEMETRY_BASE_RATE_HZ / n
+TELEMETRY_BASE_RATE_HZ = 200
+
+
+class FrameCodec:
+    """Prekompilowany koder/dekoder jednej ramki danych opisanej w schemacie."""
+
+    def __init__(self, frame_id, channels, types):
+        self.frame_id = frame_id
+        self.channels = list(channels)
+        self.types = list(types)
+        # Ramki o tym samym kluczu mają identyczną zawartość, więc można je spakować raz dla wielu klientów
+        self.key = (frame_id, tuple(self.channels))
+        self.struct = struct.Struct("<B" + "".join(self.types))
+        self._converters = [int if code in "bBhHiIqQ" else float for code in self.types]
+
+    def pack(self, values):
+        return self.struct.pack(self.frame_id, *[
+            convert(values[channel]) for channel, convert in zip(self.channels, self._converters)
+        ])
+
+    def unpack(self, payload):
+        return dict(zip(self.channels, self.struct.unpack(payload)[1:]))
+
+
+class TelemetrySchema:
+    def __init__(self, frames, channels=TELEMETRY_CHANNELS, version=TELEMETRY_VERSION):
+        self.version = version
+        self.channels = channels
+        self.codecs = {
+            frame_id: FrameCodec(frame_id, names, [channels[name][0] for name in names])
+            for frame_id, names in frames.items()
+        }
+
+    @classmethod
+    def default(cls):
+        return cls({DEFAULT_FRAME_ID: list(TELEMETRY_CHANNELS)})
+
+    def to_payload(self):
+        return json.dumps({
+            "version": self.version,
+            "channels": {name: {"type": code, "unit": unit} for name, (code, unit) in self.channels.items()},
+            "frames": [{"id": codec.frame_id, "channels": codec.channels} for codec in self.codecs.values()],
+        }).encode("utf-8")
+
+    def decode(self, payload):
+        return self.codecs[payload[0]].unpack(payload)
+
+
+def pack_message(msg_type, sequence, payload=b"", timestamp=None):
+    if timestamp is None:
+        timestamp = time.monotonic()
+    header = TELEMETRY_HEADER.pack(TELEMETRY_MAGIC, TELEMETRY_VERSION, msg_type,
+                                   sequence % SEQUENCE_MODULUS, timestamp, len(payload))
+    return header + payload
+
+
+def unpack_header(data):
+    """Zwraca (wersja, typ, numer, znacznik czasu, długość) albo zgłasza ValueError."""
+    magic, version, msg_type, sequence, timestamp, length = TELEMETRY_HEADER.unpack(data)
+    if magic != TELEMETRY_MAGIC:
+        raise ValueError("bad telemetry magic")
+    return version, msg_type, sequence, timestamp, length
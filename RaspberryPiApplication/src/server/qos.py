@@ -0,0 +1,144 @@
+import logging
+import asyncio
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Sterowanie przychodzi z częstotliwością 50 Hz, więc krok pętli wykonawczej (spóźnienie + czas)
+# i opóźnienie pętli zdarzeń nie mogą przekroczyć jednego okresu
+CONTROL_DEADLINE = 0.02
+LAG_CHECK_INTERVAL = 0.01
+QOS_INTERVAL = 1.0
+# Odsetek pomiarów po terminie, powyżej którego obniżamy poziom usług
+OVERRUN_RATIO_LIMIT = 0.05
+# Tyle kolejnych spokojnych okresów potrzeba, żeby wrócić o poziom wyżej
+RECOVER_PERIODS = 5
+
+SOC_TEMPERATURE_PATH = "/sys/class/thermal/thermal_zone0/temp"
+# Raspberry Pi zaczyna dławić taktowanie przy 80 C - ustępujemy wcześniej
+TEMPERATURE_BACKOFF = 75.0
+TEMPERATURE_RECOVER = 70.0
+
+
+class QosLevel:
+    def __init__(self, max_fps, scale, max_quality, telemetry_scale):
+        self.max_fps = max_fps
+        self.scale = scale
+        self.max_quality = max_quality
+        self.telemetry_scale = telemetry_scale
+
+    def to_dict(self):
+        return {
+            "max_fps": self.max_fps,
+            "scale": self.scale,
+            "max_quality": self.max_quality,
+            "telemetry_scale": self.telemetry_scale,
+        }
+
+
+# Kolejne stopnie degradacji: najpierw liczba klatek, potem rozdzielczość, potem jakość i telemetria
+QOS_LEVELS = [
+    QosLevel(24, 1.0, 100, 1.0),
+    QosLevel(12, 1.0, 100, 1.0),
+    QosLevel(12, 0.5, 100, 1.0),
+    QosLevel(12, 0.5, 60, 0.5),
+    QosLevel(6, 0.5, 40, 0.25),
+]
+
+
+def read_soc_temperature(path=SOC_TEMPERATURE_PATH):
+    """Temperatura SoC w stopniach C albo None, jeśli sysfs jej nie udostępnia."""
+    try:
+        with open(path) as f:
+            return int(f.read().strip()) / 1000.0
+    except (OSError, ValueError):
+        return None
+
+
+class QosScheduler:
+    """Pilnuje terminu obsługi sterowania i w razie potrzeby ogranicza wideo oraz telemetrię."""
+
+    def __init__(self, on_level_changed, deadline=CONTROL_DEADLINE):
+        self.on_level_changed = on_level_changed
+        self.deadline = deadline
+        self.level_index = 0
+        self.samples = 0
+        self.overruns = 0
+        self.total_overruns = 0
+        self.max_lag = 0.0
+        self.control_times = deque(maxlen=256)
+        self.temperature = None
+        self.healthy_periods = 0
+
+    @property
+    def level(self):
+        return QOS_LEVELS[self.level_index]
+
+    def record_control_time(self, duration):
+        """Spóźnienie i czas jednego kroku pętli wykonawczej (stan sterowania -> sprzęt)."""
+        self.control_times.append(duration)
+        self._record(duration)
+
+    def _record(self, duration, weight=1):
+        # Ta sama waga w liczniku okresu i w sumie ze statystyk - oba liczą przekroczone pomiary
+        self.samples += weight
+        if duration > self.deadline:
+            self.overruns += weight
+            self.total_overruns += weight
+
+    async def run(self):
+        await asyncio.gather(self._lag_monitor(), self._evaluate_loop())
+
+    async def _lag_monitor(self):
+        """Opóźnienie wybudzenia pętli zdarzeń - na niej działa obsługa sterowania."""
+        expected = time.monotonic() + LAG_CHECK_INTERVAL
+        while True:
+            await asyncio.sleep(max(0.0, expected - time.monotonic()))
+            lag = time.monotonic() - expected
+            self.max_lag = max(self.max_lag, lag)
+            # Długie zablokowanie pętli liczy się za wszystkie pominięte pomiary
+            self._record(lag, 1 + int(lag // LAG_CHECK_INTERVAL))
+            expected = max(expected + LAG_CHECK_INTERVAL, time.monotonic())
+
+    async def _evaluate_loop(self):
+        while True:
+            await asyncio.sleep(QOS_INTERVAL)
+            self.evaluate(read_soc_temperature())
+
+    def evaluate(self, temperature):
+        self.temperature = temperature
+        overrun_ratio = self.overruns / self.samples if self.samples else 0.0
+        hot = temperature is not None and temperature >= TEMPERATURE_BACKOFF
+        cool = temperature is None or temperature < TEMPERATURE_RECOVER
+        self.samples = 0
+        self.overruns = 0
+
+        if overrun_ratio > OVERRUN_RATIO_LIMIT or hot:
+            self.healthy_periods = 0
+            if self.level_index < len(QOS_LEVELS) - 1:
+                self._set_level(self.level_index + 1, overrun_ratio)
+        elif cool:
+            self.healthy_periods += 1
+            if self.healthy_periods >= RECOVER_PERIODS and self.level_index > 0:
+                self.healthy_periods = 0
+                self._set_level(self.level_index - 1, overrun_ratio)
+
+    def _set_level(self, level_index, overrun_ratio):
+        self.level_index = level_index
+        temperature = "-" if self.temperature is None else f"{self.temperature:.1f} C"
+        logger.info("QoS level %s: %s (overruns %.1f%%, SoC %s)",
+                    level_index, self.level.to_dict(), overrun_ratio * 100, temperature)
+        self.on_level_changed(self.level)
+
+    def stats(self):
+        control_times = sorted(self.control_times)
+        return {
+            "level": self.level_index,
+            "limits": self.level.to_dict(),
+            "deadline_ms": self.deadline * 1000.0,
+            "total_overruns": self.total_overruns,
+            "max_lag_ms": self.max_lag * 1000.0,
+            "control_time_p95_ms": control_times[int(len(control_times) * 0.95)] * 1000.0 if control_times else None,
+            "soc_temperature": self.temperature,
+        }
@@ -1,35 +1,168 @@
+import logging
+import asyncio
 import threading
 import time
-import struct
 import socket
 import json
 import subprocess
-import RPi.GPIO as GPIO
 import os
 from flask import Flask, Response, request, jsonify, render_template_string, send_from_directory
-from src.sensors.ina3221 import INA3221Sensor
+from src.sensors.ina3221 import INA3221Sensor, INA3221_FIELDS
+from src.sensors.energy import EnergyMeter
 from src.sensors.as5600 import AS5600Sensor
 from src.sensors.speed_sensor import SpeedSensor
-from src.sensors.mpu6500 import MPU6500Sensor
+from src.sensors.mpu6500 import MPU6500Sensor, ACCEL_SCALE
+from src.sensors.imu_sampler import ImuSampler
+from src.sensors.sampling import SamplingScheduler
+from src.sensors.filters import build_chain
+from src.sensors.wifi import WifiMonitor, WIFI_FIELDS
 from src.sensors.pcf8574 import PCF8574IOExpander
+from src.sensors.i2c_bus import get_i2c_bus
+from src.hal import get_backend
 from src.motor.l9110s import L9110SMotorDriver
+from src.motor.speed_controller import SpeedController
 from src.servo.servo_controller import ServoController
+from src.servo.steering_controller import (
+    SteeringController, EncoderCalibration, load_encoder_calibration, wheel_angle
+)
 from src.camera.camera import Camera
+from src.server.protocol import (
+    CONTROL_FRAME, CONTROL_MAGIC, SEQUENCED_CONTROL_FRAME, TELEMETRY_VERSION, MSG_IMU_BATCH,
+    LINK_PROBE_MAGIC, LINK_PROBE_HEADER, PROBE_ECHO, PROBE_BURST_REQUEST, PROBE_BURST_DATA,
+    PROBE_BURST_REQUEST_BODY, PROBE_MAX_PACKET_SIZE, PROBE_MAX_BURST_BYTES,
+    is_newer_sequence, unpack_control_datagram
+)
+from src.server.telemetry_session import TelemetrySession, ROLE_SPECTATOR
+from src.server.qos import QosScheduler
+from src.server.output_stage import OutputStage
+from src.server.actuation import ActuationLoop
+from src.server.app_logging import recent_logs
+
+logger = logging.getLogger(__name__)
 
 
 BROADCAST_PORT = 50000
+# Port zapytań discovery: klient rozgłasza zapytanie, serwer od razu odpowiada beaconem
+DISCOVERY_PORT = 50001
 CONTROL_PORT = 12345
 TELEMETRY_PORT = 12346
+LINK_PROBE_PORT = 12347
+HTTP_PORT = 8000
+VIDEO_PATH = "/video"
+BROADCAST_INTERVAL = 5
+DEADMAN_TIMEOUT = 0.5
+# Seria pomiarowa zajmuje łącze, więc nie częściej niż raz na tyle sekund
+PROBE_MIN_BURST_INTERVAL = 1.0
+# Liczba pakietów serii wysyłanych bez oddawania pętli zdarzeń
+PROBE_BURST_CHUNK = 16
+JPEG_QUALITY_RANGE = (10, 100)
+# Okresy próbkowania poszczególnych źródeł; stan Wi-Fi zmienia się wolno, więc rzadko.
+# INA3221 jest próbkowany w rytmie własnych konwersji, ten okres to tylko wartość awaryjna
+INA3221_PERIOD = 0.1
+SPEED_PERIOD = 0.02
+AS5600_PERIOD = 0.02
+# Skręt ze sprzężeniem od enkodera AS5600 (czytanego w każdym kroku pętli wykonawczej). Włączany dopiero przy
+# zapisanej kalibracji montażu enkodera (POST /steering/calibrate) - bez niej regulator goniłby zły punkt zerowy
+STEERING_FEEDBACK = True
+WIFI_SIGNAL_PERIOD = 1.0
+IMU_RING_CAPACITY = 1024
+# Filtry na Pi przed buforem i telemetrią (filters.build_chain); paczki surowych próbek IMU zostają bez zmian.
+# IMU: 500 Hz -> dolnoprzepustowy 25 Hz i co piąta próbka; INA3221: szpilki prądu silnika i szum napięcia
+# (bilans energii liczony jest z surowych pomiarów); prędkość: szpilki przyspieszenia koła
+SENSOR_FILTERS = {
+    "mpu6500": {"lowpass_hz": 25.0, "decimation": 5},
+    "ina3221": {"median": 3, "moving_average": 8,
+                "fields": INA3221_FIELDS + ["power"]},
+    "speed": {"median": 3, "fields": ["wheel_acceleration"]},
+}
+# Po tym czasie bez żadnego klienta serwer przechodzi w tryb oszczędzania energii
+IDLE_TIMEOUT = 10.0
+IDLE_CHECK_INTERVAL = 1.0
+# W uśpieniu napięcie baterii (do beaconu) jest mierzone jednorazowo co tyle sekund
+IDLE_BATTERY_INTERVAL = 30.0
+
+SERVER_NAME = "RaspberryPiControlServer"
+DISCOVERY_REQUEST_TYPE = "discover"
+
+
+class ControlDatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        self.server.handle_control_datagram(data, addr)
+
+
+class DiscoveryProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            probe = json.loads(data.decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return
+        if isinstance(probe, dict) and probe.get("type") == DISCOVERY_REQUEST_TYPE:
+            self.transport.sendto(self.server.beacon_message(), addr)
+
+
+class LinkProbeProtocol(asyncio.DatagramProtocol):
+    """Odbija pakiety echo i na żądanie wysyła serię pakietów do pomiaru przepustowości.
 
-BROADCAST_MSG = json.dumps({
-    "name": "RaspberryPiControlServer",
-    "control_port": CONTROL_PORT,
-    "telemetry_port": TELEMETRY_PORT
-}).encode('utf-8')
+    Serie idą tylko do klientów z otwartą sesją sterowania lub telemetrii - pojedynczy pakiet UDP
+    z podrobionym nadawcą nie może skierować serii pod dowolny adres.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.last_burst_time = 0.0
+        self.burst_task = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if len(data) < LINK_PROBE_HEADER.size or data[:len(LINK_PROBE_MAGIC)] != LINK_PROBE_MAGIC:
+            return
+        _, probe_type, probe_id, _, sent_at = LINK_PROBE_HEADER.unpack_from(data)
+        if probe_type == PROBE_ECHO:
+            self.transport.sendto(data, addr)
+        elif probe_type == PROBE_BURST_REQUEST:
+            if len(data) < LINK_PROBE_HEADER.size + PROBE_BURST_REQUEST_BODY.size:
+                return
+            if not self.server.is_session_peer(addr[0]):
+                return
+            now = time.monotonic()
+            if self.burst_task and not self.burst_task.done():
+                return
+            if now - self.last_burst_time < PROBE_MIN_BURST_INTERVAL:
+                return
+            self.last_burst_time = now
+            count, size = PROBE_BURST_REQUEST_BODY.unpack_from(data, LINK_PROBE_HEADER.size)
+            self.burst_task = asyncio.get_running_loop().create_task(
+                self._send_burst(addr, probe_id, sent_at, count, size))
+
+    async def _send_burst(self, addr, probe_id, sent_at, count, size):
+        size = min(max(size, LINK_PROBE_HEADER.size), PROBE_MAX_PACKET_SIZE)
+        count = min(count, PROBE_MAX_BURST_BYTES // size)
+        padding = bytes(size - LINK_PROBE_HEADER.size)
+        for sequence in range(count):
+            if self.transport.is_closing():
+                return
+            self.transport.sendto(
+                LINK_PROBE_HEADER.pack(LINK_PROBE_MAGIC, PROBE_BURST_DATA, probe_id, sequence, sent_at) + padding, addr)
+            if sequence % PROBE_BURST_CHUNK == PROBE_BURST_CHUNK - 1:
+                # Oddanie pętli między porcjami - ramki sterowania nie czekają na całą serię
+                await asyncio.sleep(0)
 
 
 class RCServer:
-    def __init__(self):
+    def __init__(self, deadman_timeout=DEADMAN_TIMEOUT):
         self.app = Flask(__name__)
         try:
             self.ina = INA3221Sensor()
@@ -39,246 +172,578 @@ class RCServer:
             self.servo = ServoController()
             self.camera = Camera()
             self.speed_sensor = SpeedSensor()
-            
+            self.as5600 = AS5600Sensor()
+
         except Exception as e:
-            print(f"Error initializing sensors or controllers: {e}")
+            logger.error("Error initializing sensors or controllers: %s", e)
 
-        self.control_socket = None
-        self.telemetry_socket = None
-        self.broadcast_socket = None
+        self.loop = None
+        self.network_stopped = None
+        self.control_sessions = set()
+        self.telemetry_sessions = set()
+        self.control_peers = {}
+        # Sterować może tylko jeden klient (kierowca); pozostali są widzami telemetrii
+        self.driver = None
+        self.driver_host = None
+        self.rejected_control_frames = 0
+        self.publisher_wake = None
+        self.session_tasks = set()
         self.client_connected = False
 
+        self.deadman_timeout = deadman_timeout
+        self.deadman_armed = False
+        self.last_control_time = 0.0
+
         self.telemetry_data = {
             "speed": 0,
+            "wheel_acceleration": 0.0,
             "accX": 0.0,
             "accY": 0.0,
             "accZ": 0.0,
             "voltage": 0.0,
             "current": 0.0,
-            "wifi_signal_strength": 0
+            "wifi_signal_strength": 0,
+            "wifi_bitrate": 0.0,
+            "wifi_tx_retries": 0.0,
+            "wifi_tx_failed": 0.0,
+            "steering_angle": 0.0,
+            "steering_target": 0.0,
+            "servo_lag": 0.0,
+            "roll": 0.0,
+            "pitch": 0.0,
+            "yaw_rate": 0.0,
+            "control_seq": 0,
+            "control_applied_at": 0.0
         }
+        for channel in INA3221_FIELDS + ["power", "charge_used", "energy_used", "energy_remaining"]:
+            self.telemetry_data.setdefault(channel, 0.0)
+        # Licznik aktualizacji i czas próbki dla każdego kanału - ramka jest wysyłana tylko z nowymi danymi
+        self.channel_versions = {channel: 0 for channel in self.telemetry_data}
+        self.channel_timestamps = {channel: 0.0 for channel in self.telemetry_data}
 
+        # Stan współdzielony z pętlą wykonawczą; "active" False zatrzymuje silnik i serwo
         self.control_data = {
+            "active": False,
+            "steering_angle": 0,
             "gas_pedal": 0,
             "brake_pedal": 0,
             "lights_on": False,
             "horn_on": False,
-            "gear": 0
+            "closed_loop": False,
+            "gear": 0,
+            # Numer ostatniej ramki z numeracją - echo wysyła pętla wykonawcza po zapisie do wyjść
+            "control_seq": None
         }
+        self.echoed_control_seq = None
 
         self.lights_on = False
+        # Zapis do ekspandera, silnika i serwa tylko przy zmianie stanu
+        self.outputs = OutputStage(self.io_expander, self.motor, self.servo)
 
         self.lock = threading.Lock()
         self.running = True
 
-        self.telemetry_thread = threading.Thread(target=self._telemetry_loop, daemon=True)
-        self.telemetry_thread.start()
+        # Tryb uśpienia: sensory i kamera wstrzymane, dopóki nie pojawi się klient
+        self.idle = False
+        self.wake_requested = threading.Event()
+        self.last_activity = time.monotonic()
+
+        self.qos = QosScheduler(self._apply_qos_level)
+
+        # Każde źródło ma własny okres i bufor; nowa próbka budzi wydawcę telemetrii
+        self.sampler = SamplingScheduler(self._on_sample)
+        self.energy = EnergyMeter()
+        try:
+            ina_period = self.ina.configure_continuous()
+        except Exception as e:
+            logger.error("INA3221 configuration error: %s", e)
+            ina_period = INA3221_PERIOD
+        self.sampler.add_source("ina3221", self._read_power, ina_period / 2,
+                                INA3221_FIELDS + ["power", "charge_used", "energy_used", "energy_remaining"])
+        self.sampler.add_source("speed", self.speed_sensor.read, SPEED_PERIOD, ["speed", "wheel_acceleration"])
+        # Przy sprzężeniu telemetria bierze odczyty enkodera z pętli wykonawczej zamiast czytać go drugi raz
+        self.encoder_calibration = load_encoder_calibration()
+        self.steering = None
+        if STEERING_FEEDBACK and self.encoder_calibration:
+            self.steering = SteeringController(self.as5600.read_measurement, self.encoder_calibration)
+        elif STEERING_FEEDBACK:
+            logger.warning("Steering encoder not calibrated, closed-loop steering disabled "
+                           "(POST /steering/calibrate, then restart)")
+        self.encoder_calibrator = EncoderCalibration(self.as5600.read_measurement)
+        steering_fields = ["steering_angle", "steering_target", "servo_lag"] if self.steering else ["steering_angle"]
+        self.sampler.add_source("as5600", self._read_steering_angle, AS5600_PERIOD, steering_fields)
+        self.wifi = WifiMonitor()
+        self.sampler.add_source("wifi", self.wifi.read, WIFI_SIGNAL_PERIOD, WIFI_FIELDS)
+        self.sampler.add_external_source("mpu6500", ["accX", "accY", "accZ"], IMU_RING_CAPACITY)
+        self.sampler.add_external_source("attitude", ["roll", "pitch", "yaw_rate"])
+        self.imu_sampler = ImuSampler(self.mpu6500, self._on_imu_batch, self._on_imu_sample,
+                                      on_attitude=self._on_imu_attitude)
+
+        self.imu_sampler.start()
+        self._configure_filters({"mpu6500": self.imu_sampler.sample_rate_hz, "ina3221": 1.0 / ina_period,
+                                 "speed": 1.0 / SPEED_PERIOD})
+        self.sampler.start()
+        self.actuation = ActuationLoop(self.outputs, self._read_controls, on_step=self._on_actuation_step,
+                                       speed_controller=SpeedController(self.speed_sensor.read),
+                                       steering_controller=self.steering)
+        self.actuation.start()
+        self.power_thread = threading.Thread(target=self._power_loop, daemon=True)
+        self.power_thread.start()
         self.html_dir = os.path.join(os.path.dirname(__file__), 'src/html/')
-        print(self.html_dir)
+        logger.debug("HTML directory: %s", self.html_dir)
         
         self.app.add_url_rule('/', 'index_page', self.index, methods=['GET'])
-        self.app.add_url_rule('/video', 'video', self.video)
+        self.app.add_url_rule(VIDEO_PATH, 'video', self.video)
         self.app.add_url_rule('/wifi', 'wifi_page', self.wifi_page, methods=['GET'])
         self.app.add_url_rule('/wifi/scan', 'wifi_scan', self.wifi_scan, methods=['GET'])
         self.app.add_url_rule('/wifi/connect', 'wifi_connect', self.wifi_connect, methods=['POST'])
+        self.app.add_url_rule('/stats/qos', 'qos_stats', self.qos_stats, methods=['GET'])
+        self.app.add_url_rule('/stats/sampling', 'sampling_stats', self.sampling_stats, methods=['GET'])
+        self.app.add_url_rule('/stats/i2c', 'i2c_stats', self.i2c_stats, methods=['GET'])
+        self.app.add_url_rule('/stats/outputs', 'output_stats', self.output_stats, methods=['GET'])
+        self.app.add_url_rule('/stats/actuation', 'actuation_stats', self.actuation_stats, methods=['GET'])
+        self.app.add_url_rule('/logs', 'logs', self.logs, methods=['GET'])
+        self.app.add_url_rule('/steering/calibrate', 'steering_calibrate', self.steering_calibrate, methods=['POST'])
 
-    def _telemetry_loop(self):
-        while self.running:
+    def _on_sample(self, source, timestamp, values):
+        # Wywoływane z wątków próbkowania
+        self._store_samples(values, timestamp)
+        if self.loop and self.publisher_wake and not self.publisher_wake.is_set():
+            self.loop.call_soon_threadsafe(self.publisher_wake.set)
+
+    def _configure_filters(self, sample_rates):
+        for name, spec in SENSOR_FILTERS.items():
+            source = self.sampler.sources[name]
             try:
-                ina_data = self.ina.read()
-                accel = self.mpu6500.read_acceleration()
-
-                with self.lock:
-                    self.telemetry_data["speed"] = self.speed_sensor.calculate_speed()
-                    self.telemetry_data["accX"] = accel["accX"]
-                    self.telemetry_data["accY"] = accel["accY"]
-                    self.telemetry_data["accZ"] = accel["accZ"]
-                    self.telemetry_data["voltage"] = ina_data["voltage"]
-                    self.telemetry_data["current"] = ina_data["current"]
-                    self.telemetry_data["wifi_signal_strength"] = self.get_wifi_signal_strength()
-
-            except Exception as e:
-                print(f"Błąd w pętli telemetrycznej: {e}")
-            time.sleep(0.1)
-
-    def get_wifi_signal_strength(self):
-        try:
-            # Uruchomienie iwconfig
-            result = subprocess.run(['iwconfig'], capture_output=True, text=True)
-
-            for line in result.stdout.split('\n'):
-                if 'Signal level' in line:  # Znajdź linię z "Signal level"
-                    # Podziel linię na fragmenty i szukaj kluczowych wartości
-                    parts = line.split()
-                    for i, part in enumerate(parts):
-                        if 'level=' in part:  # Znajdź segment z "level="
-                            try:
-                                # Wyciągnij wartość po "level="
-                                signal_level = int(part.split('=')[1].replace('dBm', '').strip())
-                                return signal_level
-                            except ValueError as ve:
-                                print(f"Error parsing signal level value: {ve}")
-
-                    # Dodatkowe sprawdzenie, jeśli "level=" jest oddzielne
-                    if 'Signal' in parts and 'level=' in parts[i + 1]:
-                        try:
-                            signal_level = int(parts[i + 1].split('=')[1].replace('dBm', '').strip())
-                            return signal_level
-                        except ValueError as ve:
-                            print(f"Error parsing signal level value: {ve}")
+                self.sampler.set_filter(name, build_chain(spec, source.fields, sample_rates.get(name)))
+            except ValueError as e:
+                logger.error("Invalid filter settings for %s, sending raw samples: %s", name, e)
 
-        except Exception as e:
-            print(f"Error getting WiFi signal strength: {e}")
-        return 0  # Wartość domyślna w przypadku błędu
+    def _on_imu_sample(self, timestamps, samples):
+        self.sampler.publish_block("mpu6500", timestamps, samples * ACCEL_SCALE)
+
+    def _on_imu_attitude(self, timestamp, attitude):
+        self.sampler.publish("attitude", timestamp, attitude)
 
+    def _store_samples(self, values, timestamp):
+        with self.lock:
+            for channel, value in values.items():
+                self.telemetry_data[channel] = value
+                self.channel_versions[channel] += 1
+                self.channel_timestamps[channel] = timestamp
 
+    def _read_power(self):
+        values = self.ina.read_continuous()
+        return None if values is None else self._with_energy(values)
 
-    def start_broadcasting(self):
-        self.broadcast_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-        self.broadcast_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        while not self.client_connected and self.running:
-            self.broadcast_socket.sendto(BROADCAST_MSG, ("<broadcast>", BROADCAST_PORT))
-            print("Broadcasting server presence...")
-            time.sleep(5)
-        self.broadcast_socket.close()
+    def _with_energy(self, values):
+        values.update(self.energy.update(time.monotonic(), values["voltage"], values["current"]))
+        return values
 
-    def handle_control_connection(self):
-        while self.running:
-            try:
-                self.control_socket = self._create_server_socket(CONTROL_PORT)
-                print(f"Control server listening on port {CONTROL_PORT}...")
-                client_socket, addr = self.control_socket.accept()
-                print(f"Connected to client for control at {addr}")
-                self.client_connected = True
-                self.process_control_data(client_socket)
-            except Exception as e:
-                print(f"Control connection failed: {e}")
-            finally:
-                if self.control_socket:
-                    self.control_socket.close()
-                    self.reset_to_broadcast()
-
-    def handle_telemetry_connection(self):
+    def _read_steering_angle(self):
+        if self.steering:
+            values = self.steering.telemetry()
+            if values is None:
+                # Pętla wykonawcza nie czyta enkodera (np. zatrzymanie) - osobny odczyt, bez zmiany stanu regulatora
+                values = self.steering.telemetry(wheel_angle(self.as5600.read_measurement(), self.encoder_calibration))
+            return values
+        # Bez sprzężenia ten sam odczyt i przeliczenie na kąt kół; błąd odczytu liczy próbkowanie
+        return {"steering_angle": wheel_angle(self.as5600.read_measurement(), self.encoder_calibration)}
+
+    def _has_clients(self):
+        return bool(self.control_sessions or self.telemetry_sessions or self.control_peers or self.camera.clients)
+
+    def request_wake(self):
+        """Wywoływane przy pojawieniu się klienta; wybudzenie odbywa się w wątku zarządzania energią."""
+        self.last_activity = time.monotonic()
+        if self.idle:
+            self.wake_requested.set()
+
+    def _power_loop(self):
+        last_battery_read = 0.0
         while self.running:
-            try:
-                self.telemetry_socket = self._create_server_socket(TELEMETRY_PORT)
-                print(f"Telemetry server listening on port {TELEMETRY_PORT}...")
-                client_socket, addr = self.telemetry_socket.accept()
-                print(f"Connected to client for telemetry at {addr}")
-                self.client_connected = True
-                self.send_telemetry_data(client_socket)
-            except Exception as e:
-                print(f"Telemetry connection failed: {e}")
-            finally:
-                if self.telemetry_socket:
-                    self.telemetry_socket.close()
-                    self.reset_to_broadcast()
-
-    def process_control_data(self, client_socket):
+            self.wake_requested.wait(IDLE_CHECK_INTERVAL)
+            self.wake_requested.clear()
+            if not self.running:
+                break
+            now = time.monotonic()
+            if self._has_clients():
+                self.last_activity = now
+            if self.idle:
+                if now - self.last_activity < IDLE_TIMEOUT:
+                    self._exit_idle()
+                elif now - last_battery_read >= IDLE_BATTERY_INTERVAL:
+                    values = self.ina.read_single_shot()
+                    if values is not None:
+                        # Pomiary co kilkadziesiąt sekund nie są uśredniane ze sobą
+                        self.sampler.reset_filter("ina3221")
+                        self.sampler.publish("ina3221", time.monotonic(), self._with_energy(values))
+                    last_battery_read = now
+            elif now - self.last_activity >= IDLE_TIMEOUT:
+                self._enter_idle()
+                last_battery_read = now
+
+    def _enter_idle(self):
+        logger.info("No clients, entering power-save mode")
+        self.idle = True
+        self.sampler.pause()
+        self.imu_sampler.pause()
+        self.actuation.pause()
+        self.mpu6500.sleep()
+        self.ina.power_down()
+        self.camera.suspend()
+
+    def _exit_idle(self):
+        started = time.monotonic()
+        self.camera.resume()
+        self.mpu6500.wake()
+        self.ina.power_up()
+        self.imu_sampler.resume()
+        self.actuation.resume()
+        self.sampler.resume()
+        self.idle = False
+        logger.info("Client connected, woke from power-save in %.0f ms", (time.monotonic() - started) * 1000)
+
+    def serve_network(self):
+        """Uruchamia pętlę asyncio obsługującą sterowanie, telemetrię i rozgłaszanie."""
+        asyncio.run(self._serve_network())
+
+    async def _serve_network(self):
+        self.loop = asyncio.get_running_loop()
+        self.network_stopped = asyncio.Event()
+        self.publisher_wake = asyncio.Event()
+
+        control_server = await asyncio.start_server(
+            self._handle_control_client, "0.0.0.0", CONTROL_PORT, reuse_address=True)
+        telemetry_server = await asyncio.start_server(
+            self._handle_telemetry_client, "0.0.0.0", TELEMETRY_PORT, reuse_address=True)
+        control_transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: ControlDatagramProtocol(self), local_addr=("0.0.0.0", CONTROL_PORT))
+        discovery_transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: DiscoveryProtocol(self), local_addr=("0.0.0.0", DISCOVERY_PORT), allow_broadcast=True)
+        link_probe_transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: LinkProbeProtocol(self), local_addr=("0.0.0.0", LINK_PROBE_PORT))
+        logger.info("Control server listening on port %s (TCP/UDP)...", CONTROL_PORT)
+        logger.info("Telemetry server listening on port %s...", TELEMETRY_PORT)
+
+        tasks = [
+            asyncio.create_task(self._broadcast_loop()),
+            asyncio.create_task(self._deadman_loop()),
+            asyncio.create_task(self._telemetry_publisher()),
+            asyncio.create_task(self.qos.run()),
+        ]
         try:
-            while self.running:
-                data = client_socket.recv(5)
-                if not data or len(data) != 5:
-                    print("Invalid control data or connection lost.")
-                    self.client_connected = False
-                    break
+            await self.network_stopped.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            control_transport.close()
+            discovery_transport.close()
+            link_probe_transport.close()
+            control_server.close()
+            telemetry_server.close()
+            for writer in list(self.control_sessions):
+                writer.close()
+            for session in list(self.telemetry_sessions):
+                session.writer.close()
+            await asyncio.gather(*self.session_tasks, return_exceptions=True)
+            await control_server.wait_closed()
+            await telemetry_server.wait_closed()
 
-                gear, steering, gas, brake, functions = struct.unpack("bbBBB", data)
-                self.update_control_data(gear, steering, gas, brake, functions)
-                # print(f"Control data updated: {self.control_data}, functions: {functions}")
+    def beacon_message(self):
+        """Beacon z aktualnym stanem pojazdu; wysyłany okresowo i w odpowiedzi na zapytanie discovery."""
+        with self.lock:
+            voltage = self.telemetry_data["voltage"]
+        return json.dumps({
+            "name": SERVER_NAME,
+            "control_port": CONTROL_PORT,
+            "telemetry_port": TELEMETRY_PORT,
+            "control_transports": ["udp", "tcp"],
+            "protocol_version": TELEMETRY_VERSION,
+            "discovery_port": DISCOVERY_PORT,
+            "link_probe_port": LINK_PROBE_PORT,
+            # Adres IP klient zna z nadawcy datagramu, więc wystarczy port i ścieżka
+            "video_port": HTTP_PORT,
+            "video_path": VIDEO_PATH,
+            "battery_voltage": round(voltage, 2),
+            "occupied": self.driver is not None,
+            "telemetry_clients": len(self.telemetry_sessions),
+        }).encode('utf-8')
 
-                self.apply_controls_to_hardware()
+    async def _broadcast_loop(self):
+        broadcast_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        broadcast_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        broadcast_socket.setblocking(False)
+        try:
+            while self.running:
+                if not self.client_connected:
+                    try:
+                        broadcast_socket.sendto(self.beacon_message(), ("<broadcast>", BROADCAST_PORT))
+                        logger.debug("Broadcasting server presence...")
+                    except OSError as e:
+                        logger.error("Broadcast failed: %s", e)
+                await asyncio.sleep(BROADCAST_INTERVAL)
+        finally:
+            broadcast_socket.close()
 
-        except socket.error as e:
-            print(f"Control socket error: {e}")
+    async def _handle_control_client(self, reader, writer):
+        addr = writer.get_extra_info("peername")
+        if self.driver is not None:
+            logger.warning("Rejecting control client %s: car is already driven from %s", addr, self.driver_host)
+            writer.close()
+            return
+        self._claim_driver(("tcp", addr))
+        logger.info("Connected to client for control at %s", addr)
+        self._open_session(self.control_sessions, writer)
+        try:
+            while self.running:
+                sequence, fields = await self._read_control_frame(reader)
+                self._accept_control_frame(fields, sequence)
+        except asyncio.IncompleteReadError:
+            logger.warning("Invalid control data or connection lost (%s).", addr)
+        except ValueError as e:
+            logger.warning("Invalid control data from %s: %s", addr, e)
+        except OSError as e:
+            logger.error("Control socket error: %s", e)
         finally:
-            client_socket.close()
+            self._release_driver(("tcp", addr))
+            self._close_session(self.control_sessions, writer)
+
+    async def _read_control_frame(self, reader):
+        first = await reader.readexactly(1)
+        if first != CONTROL_MAGIC[:1]:
+            data = first + await reader.readexactly(CONTROL_FRAME.size - 1)
+            return None, CONTROL_FRAME.unpack(data)
+
+        data = first + await reader.readexactly(SEQUENCED_CONTROL_FRAME.size - 1)
+        frame = unpack_control_datagram(data)
+        if frame is None:
+            raise ValueError("bad control frame magic")
+        return frame
+
+    def handle_control_datagram(self, data, addr):
+        frame = unpack_control_datagram(data)
+        if frame is None:
+            return
+        sequence, fields = frame
+        if self.driver is not None and self.driver != ("udp", addr):
+            self.rejected_control_frames += 1
+            return
+        # Latest-wins: spóźnione lub zduplikowane datagramy są odrzucane
+        if not is_newer_sequence(sequence, self.control_peers.get(addr)):
+            return
+        if self.driver is None:
+            self._claim_driver(("udp", addr))
+            logger.info("Receiving UDP control from %s", addr)
+        self.control_peers[addr] = sequence
+        self.client_connected = True
+        self.request_wake()
+        self._accept_control_frame(fields, sequence)
+
+    def _accept_control_frame(self, fields, sequence=None):
+        gear, steering, gas, brake, functions = fields
+        # Sprzęt ustawia pętla wykonawcza - tu tylko aktualizacja wspólnego stanu
+        self.update_control_data(gear, steering, gas, brake, functions, sequence)
+        self.last_control_time = time.monotonic()
+        self.deadman_armed = True
+
+    def _on_actuation_step(self, duration, controls):
+        # Wywoływane z wątku pętli wykonawczej
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.qos.record_control_time, duration)
+        sequence = controls.get("control_seq")
+        applied_at = controls.get("applied_at")
+        if sequence is None or applied_at is None or sequence == self.echoed_control_seq:
+            return
+        # Echo dla klienta mierzącego opóźnienie wejście -> sterowanie: pierwszy krok, który zapisał tę ramkę
+        self.echoed_control_seq = sequence
+        self._store_samples({"control_seq": sequence, "control_applied_at": applied_at}, applied_at)
+        if self.loop and self.publisher_wake and not self.publisher_wake.is_set():
+            self.loop.call_soon_threadsafe(self.publisher_wake.set)
+
+    def _apply_qos_level(self, level):
+        self.camera.set_limits(level.max_fps, level.scale, level.max_quality)
+
+    async def _deadman_loop(self):
+        while self.running:
+            await asyncio.sleep(self.deadman_timeout / 4)
+            if self.deadman_armed and time.monotonic() - self.last_control_time > self.deadman_timeout:
+                self._trip_deadman()
 
-    def send_telemetry_data(self, client_socket):
+    def _trip_deadman(self):
+        logger.warning("No control frame for %.2f s, stopping motor and servo.", self.deadman_timeout)
+        self.deadman_armed = False
+        self.stop_outputs()
+        # Nadawcy UDP po przerwie zaczynają nową sesję z własną numeracją
+        self.control_peers.clear()
+        if self.driver is not None and self.driver[0] == "udp":
+            self._release_driver(self.driver)
+        self._refresh_connection_state()
+
+    def _claim_driver(self, driver):
+        self.driver = driver
+        self.driver_host = driver[1][0]
+
+    def _release_driver(self, driver):
+        if self.driver == driver:
+            logger.info("Driver %s released control", driver[1])
+            self.driver = None
+            self.driver_host = None
+
+    def is_session_peer(self, host):
+        """Czy z tego adresu jest otwarta sesja sterowania (TCP lub UDP) albo telemetrii."""
+        if host == self.driver_host or any(addr[0] == host for addr in self.control_peers):
+            return True
+        if any(session.addr and session.addr[0] == host for session in self.telemetry_sessions):
+            return True
+        return any((writer.get_extra_info("peername") or ("",))[0] == host for writer in self.control_sessions)
+
+    def _is_driver_session(self, session):
+        return session.requested_role != ROLE_SPECTATOR and session.addr[0] == self.driver_host
+
+    async def _handle_telemetry_client(self, reader, writer):
+        addr = writer.get_extra_info("peername")
+        logger.info("Connected to client for telemetry at %s", addr)
+        session = TelemetrySession(reader, writer, self.publisher_wake.set)
+        self._open_session(self.telemetry_sessions, writer, session)
+        tasks = []
         try:
-            while self.client_connected and self.running:
-                with self.lock:
-                    speed = float(self.telemetry_data["speed"])
-                    accX = float(self.telemetry_data["accX"])
-                    accY = float(self.telemetry_data["accY"])
-                    accZ = float(self.telemetry_data["accZ"])
-                    voltage = float(self.telemetry_data["voltage"])
-                    current = float(self.telemetry_data["current"])
-                    wifi_signal_strength = int(self.telemetry_data["wifi_signal_strength"])
-
-                # print(f"Data sent: speed:{speed}, accX:{accX}, accY:{accY}, accZ:{accZ}, voltage:{voltage}, current:{current}, wifi_signal_strength:{wifi_signal_strength}")
-                packed_data = struct.pack("ffffffi", speed, accX, accY, accZ, voltage, current, wifi_signal_strength)
-                client_socket.sendall(packed_data)
-                time.sleep(0.1)
-        except socket.error as e:
-            print(f"Telemetry socket error: {e}")
+            await session.handshake()
+            if session.legacy:
+                logger.info("Telemetry client %s did not send HELLO, using legacy frames", addr)
+            tasks.append(asyncio.create_task(session.write_loop()))
+            if not session.legacy:
+                tasks.append(asyncio.create_task(session.serve_requests()))
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                # Rozłączenie lub błędna wiadomość od klienta
+                task.result()
+        except asyncio.IncompleteReadError:
+            logger.info("Telemetry client %s disconnected.", addr)
+        except ValueError as e:
+            logger.warning("Invalid telemetry message from %s: %s", addr, e)
+        except OSError as e:
+            logger.error("Telemetry socket error: %s", e)
         finally:
-            client_socket.close()
+            for task in tasks:
+                task.cancel()
+            if session.dropped_messages:
+                logger.warning("Telemetry client %s: %s messages dropped (slow link)", addr, session.dropped_messages)
+            self._close_session(self.telemetry_sessions, writer, session)
+
+    async def _telemetry_publisher(self):
+        """Budzony nową próbką; jeden odczyt stanu rozdzielany do kolejek wszystkich sesji."""
+        while self.running:
+            self.publisher_wake.clear()
+            now = time.monotonic()
+            if self.telemetry_sessions:
+                values, versions, timestamps = self._snapshot_telemetry()
+                # Kierowca pierwszy - jego ramki trafiają do kolejki przed ramkami widzów
+                sessions = sorted(self.telemetry_sessions, key=lambda session: not self._is_driver_session(session))
+                rate_scale = self.qos.level.telemetry_scale
+                packed = {}
+                for session in sessions:
+                    for codec in session.due_codecs(now, versions, rate_scale):
+                        if codec.key not in packed:
+                            # Znacznik czasu ramki to czas najnowszej próbki, a nie chwila wysłania
+                            packed[codec.key] = (codec.pack(values),
+                                                 max(timestamps[channel] for channel in codec.channels))
+                        session.enqueue_frame(*packed[codec.key])
+
+            next_due = [session.next_due(now) for session in self.telemetry_sessions]
+            next_due = [due_time for due_time in next_due if due_time is not None]
+            timeout = max(0.0, min(next_due) - time.monotonic()) if next_due else None
+            try:
+                await asyncio.wait_for(self.publisher_wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _open_session(self, sessions, writer, session=None):
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sessions.add(session or writer)
+        self.session_tasks.add(asyncio.current_task())
+        self.client_connected = True
+        self.request_wake()
+
+    def _close_session(self, sessions, writer, session=None):
+        sessions.discard(session or writer)
+        self.session_tasks.discard(asyncio.current_task())
+        writer.close()
+        if sessions is self.control_sessions and not self.control_sessions and not self.control_peers:
+            self.deadman_armed = False
+            self.stop_outputs()
+        self._refresh_connection_state()
 
-    def update_control_data(self, gear, steering, gas, brake, functions):
+    def _refresh_connection_state(self):
+        if self.control_sessions or self.telemetry_sessions or self.control_peers:
+            self.client_connected = True
+        elif self.client_connected:
+            self.reset_to_broadcast()
+
+    def _on_imu_batch(self, payload, timestamp):
+        # Wywoływane z wątku próbkowania IMU
+        if self.loop and self.telemetry_sessions:
+            self.loop.call_soon_threadsafe(self._publish_imu_batch, payload, timestamp)
+
+    def _publish_imu_batch(self, payload, timestamp):
+        for session in self.telemetry_sessions:
+            if session.imu_batch:
+                session.enqueue(MSG_IMU_BATCH, payload, timestamp)
+
+    def _snapshot_telemetry(self):
+        with self.lock:
+            return dict(self.telemetry_data), dict(self.channel_versions), dict(self.channel_timestamps)
+
+    def update_control_data(self, gear, steering, gas, brake, functions, sequence=None):
         with self.lock:
             self.control_data["steering_angle"] = steering
             self.control_data["gas_pedal"] = gas
             self.control_data["brake_pedal"] = brake
             self.control_data["lights_on"] = ((functions & (1 << 0)) != 0)
             self.control_data["horn_on"] = ((functions & (1 << 1)) != 0)
+            # Bit 2: gaz zadaje prędkość, a regulator na Pi dobiera wypełnienie
+            self.control_data["closed_loop"] = ((functions & (1 << 2)) != 0)
             self.control_data["gear"] = gear
+            self.control_data["control_seq"] = sequence
+            self.control_data["active"] = True
 
-    def apply_controls_to_hardware(self):
-        try:
-            steering = self.control_data["steering_angle"]
-            gear = self.control_data["gear"]
-            gas = self.control_data["gas_pedal"] 
-            brake = self.control_data["brake_pedal"]
-            
-            self.motor.set_power(gas, brake, gear)
-
-            self.io_expander.set_bit(0, self.control_data["lights_on"])
-            self.io_expander.set_bit(1, self.control_data["lights_on"])
-            self.io_expander.set_bit(2, self.control_data["lights_on"])
-            self.io_expander.set_bit(3, self.control_data["lights_on"])
-            self.io_expander.set_bit(4, brake > 5)
-            self.io_expander.set_bit(5, brake > 5)
-            self.io_expander.set_bit(6, self.control_data["horn_on"])
-
-            servo_angle = 0 + steering
-            self.servo.set_angle(servo_angle)
-        except Exception as e:
-            print(f"Error applying controls to hardware: {e}")
+    def _read_controls(self):
+        with self.lock:
+            return dict(self.control_data)
+
+    def stop_outputs(self):
+        """Zatrzymuje silnik i serwo przy najbliższym kroku pętli wykonawczej."""
+        with self.lock:
+            self.control_data["active"] = False
 
     def reset_to_broadcast(self):
         with self.lock:
             self.client_connected = False
-        if self.control_socket:
-            self.control_socket.close()
-        if self.telemetry_socket:
-            self.telemetry_socket.close()
-        self.motor.stop()
-        self.servo.stop()
-        
-        
-        print("Connection lost. Returning to broadcast mode...")
-        threading.Thread(target=self.start_broadcasting, daemon=True).start()
+        self.stop_outputs()
+
+        logger.warning("Connection lost. Returning to broadcast mode...")
 
     def stop(self):
         self.running = False
         self.client_connected = False
-        if self.control_socket:
-            self.control_socket.close()
-        if self.telemetry_socket:
-            self.telemetry_socket.close()
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.network_stopped.set)
+        self.wake_requested.set()
+        self.sampler.stop()
+        self.imu_sampler.stop()
+        self.actuation.stop()
         self.motor.cleanup()
         self.servo.cleanup()
-        GPIO.cleanup()
-        print("Server stopped.")
-
-    @staticmethod
-    def _create_server_socket(port):
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        sock.bind(("0.0.0.0", port))
-        sock.listen(1)
-        return sock
+        self.speed_sensor.cleanup()
+        self.wifi.close()
+        get_i2c_bus().close()
+        backend = get_backend()
+        backend.gpio.cleanup()
+        backend.close()
+        logger.info("Server stopped.")
+
     def index(self):
         index_html = """
         <!DOCTYPE html>
@@ -323,7 +788,46 @@ class RCServer:
         return render_template_string(index_html)
     
     def video(self):
-        return Response(self.camera.generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+        # Klient o słabym łączu może poprosić o mniejsze klatki, np. /video?quality=50
+        quality = request.args.get('quality', type=int)
+        if quality is not None:
+            quality = min(max(quality, JPEG_QUALITY_RANGE[0]), JPEG_QUALITY_RANGE[1])
+        self.request_wake()
+        return Response(self.camera.generate_frames(quality), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+    def qos_stats(self):
+        return jsonify(self.qos.stats())
+
+    def sampling_stats(self):
+        return jsonify(self.sampler.stats())
+
+    def i2c_stats(self):
+        return jsonify(get_i2c_bus().stats())
+
+    def output_stats(self):
+        return jsonify(self.outputs.stats())
+
+    def actuation_stats(self):
+        return jsonify(self.actuation.stats())
+
+    def logs(self):
+        return jsonify({"logs": recent_logs()})
+
+    def steering_calibrate(self):
+        """Kalibracja enkodera: {"step": "center"} przy kołach na wprost, potem {"step": "direction"}
+        przy kołach skręconych tak jak przy dodatnim poleceniu. Sprzężenie działa od następnego startu."""
+        data = request.get_json(silent=True)
+        step = data.get("step") if isinstance(data, dict) else None
+        try:
+            if step == "center":
+                return jsonify(self.encoder_calibrator.record_center())
+            if step == "direction":
+                result = self.encoder_calibrator.record_direction()
+                result["message"] = "Calibration saved, restart the server to enable closed-loop steering."
+                return jsonify(result)
+        except (ValueError, OSError) as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"error": "step must be 'center' or 'direction'"}), 400
 
     def favicon(self):
         return Response(status=204)
@@ -505,7 +1009,7 @@ class RCServer:
             result = subprocess.run(['nmcli', '-t', '-f', 'SSID,SIGNAL,BARS', 'dev', 'wifi'], capture_output=True, text=True)
 
             # Debugowanie wyniku
-            print(f"nmcli output:\n{result.stdout}")
+            logger.info("nmcli output:\n%s", result.stdout)
 
             # Podział wyniku na linie
             networks = []
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import math
+import time
+from collections import deque
+from src.server.protocol import (
+    TELEMETRY_HEADER, TELEMETRY_MAGIC, TELEMETRY_VERSION, MSG_HELLO, MSG_SCHEMA, MSG_DATA, MSG_SUBSCRIBE,
+    MSG_TIME_REQUEST, MSG_TIME_RESPONSE, TIME_REQUEST, TIME_RESPONSE, LEGACY_TELEMETRY_FRAME,
+    LEGACY_TELEMETRY_CHANNELS, TELEMETRY_CHANNELS, DEFAULT_FRAME_ID, DEFAULT_TELEMETRY_RATE_HZ,
+    TELEMETRY_BASE_RATE_HZ, TelemetrySchema, pack_message, unpack_header
+)
+
+# Czas oczekiwania na HELLO; klient, który milczy, dostaje stary format bez nagłówka
+HELLO_TIMEOUT = 0.5
+# Długość kolejki wysyłkowej; przy wolnym kliencie najstarsze dane są odrzucane
+OUTBOX_SIZE = 32
+
+ROLE_DRIVER = "driver"
+ROLE_SPECTATOR = "spectator"
+
+
+class Subscription:
+    def __init__(self, codec, period):
+        self.codec = codec
+        self.period = period
+        self.next_due = time.monotonic()
+        # Liczniki aktualizacji kanałów z ostatnio wysłanej ramki
+        self.sent_versions = None
+
+
+class LegacyCodec:
+    """Stara ramka bez nagłówka i identyfikatora, dla klientów bez HELLO."""
+
+    key = "legacy"
+    channels = LEGACY_TELEMETRY_CHANNELS
+
+    def pack(self, values):
+        return LEGACY_TELEMETRY_FRAME.pack(*[
+            int(values[name]) if name == "wifi_signal_strength" else float(values[name])
+            for name in LEGACY_TELEMETRY_CHANNELS
+        ])
+
+
+def parse_subscriptions(request):
+    """Zamienia żądanie SUBSCRIBE na {id ramki: (kanały, okres)}; nieznane kanały są pomijane.
+
+    Żądanie o złej strukturze zgłasza ValueError.
+    """
+    if not isinstance(request, dict):
+        raise ValueError("SUBSCRIBE payload must be a JSON object")
+    entries = request.get("subscriptions", [])
+    if not isinstance(entries, list):
+        raise ValueError("subscriptions must be a list")
+    frames = {}
+    for entry in entries:
+        if not isinstance(entry, dict) or not isinstance(entry.get("channels", []), list):
+            raise ValueError("each subscription must be an object with a list of channels")
+        channels = [name for name in entry.get("channels", []) if isinstance(name, str) and name in TELEMETRY_CHANNELS]
+        if not channels:
+            continue
+        try:
+            if "decimation" in entry:
+                period = max(1, int(entry["decimation"])) / TELEMETRY_BASE_RATE_HZ
+            else:
+                rate = float(entry.get("rate_hz", DEFAULT_TELEMETRY_RATE_HZ))
+                # json.loads przepuszcza NaN i Infinity; NaN jako okres omijałby limit częstotliwości
+                if not math.isfinite(rate):
+                    raise ValueError("rate_hz must be finite")
+                period = 1.0 / min(max(rate, 0.01), TELEMETRY_BASE_RATE_HZ)
+        except (TypeError, ValueError, OverflowError) as e:
+            raise ValueError(f"invalid decimation or rate_hz: {e}")
+        frames[len(frames) + 1] = (channels, period)
+    return frames
+
+
+class TelemetrySession:
+    def __init__(self, reader, writer, on_subscriptions_changed):
+        self.reader = reader
+        self.writer = writer
+        self.addr = writer.get_extra_info("peername")
+        self.on_subscriptions_changed = on_subscriptions_changed
+        self.version = None
+        self.requested_role = None
+        self.schema = None
+        self.subscriptions = []
+        self.imu_batch = False
+        self.sequence = 0
+        # Schemat i odpowiedzi czasu nie mogą zginąć, dane pomiarowe mogą
+        self.priority_outbox = deque()
+        self.outbox = deque(maxlen=OUTBOX_SIZE)
+        self.outbox_ready = asyncio.Event()
+        self.dropped_messages = 0
+
+    @property
+    def legacy(self):
+        return self.version is None
+
+    async def handshake(self):
+        """Rozpoznaje klienta: wersjonowany (HELLO + schemat) albo starszy (surowe ramki)."""
+        try:
+            header = await asyncio.wait_for(self.reader.readexactly(TELEMETRY_HEADER.size), HELLO_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.subscriptions = [Subscription(LegacyCodec(), 1.0 / DEFAULT_TELEMETRY_RATE_HZ)]
+            self.on_subscriptions_changed()
+            return
+
+        if header[:len(TELEMETRY_MAGIC)] != TELEMETRY_MAGIC:
+            raise ValueError("unexpected data before telemetry handshake")
+        version, msg_type, _, _, length = unpack_header(header)
+        payload = await self.reader.readexactly(length)
+        if msg_type != MSG_HELLO:
+            raise ValueError(f"expected HELLO, got message type {msg_type}")
+
+        hello = json.loads(payload.decode("utf-8")) if payload else {}
+        if not isinstance(hello, dict):
+            raise ValueError("HELLO payload must be a JSON object")
+        requested_version = hello.get("version", version)
+        if not isinstance(requested_version, int) or isinstance(requested_version, bool):
+            raise ValueError("HELLO version must be an integer")
+        self.version = min(requested_version, TELEMETRY_VERSION)
+        self.requested_role = hello.get("role")
+        self.apply_subscriptions({DEFAULT_FRAME_ID: (list(TELEMETRY_CHANNELS), 1.0 / DEFAULT_TELEMETRY_RATE_HZ)})
+
+    def apply_subscriptions(self, frames):
+        self.schema = TelemetrySchema({frame_id: channels for frame_id, (channels, _) in frames.items()})
+        self.subscriptions = [
+            Subscription(self.schema.codecs[frame_id], period) for frame_id, (_, period) in frames.items()
+        ]
+        self.enqueue(MSG_SCHEMA, self.schema.to_payload(), priority=True)
+        self.on_subscriptions_changed()
+
+    async def serve_requests(self):
+        """Obsługuje wiadomości od klienta aż do rozłączenia."""
+        while True:
+            msg_type, _, _, payload = await self.read_message()
+            if msg_type == MSG_SUBSCRIBE:
+                request = json.loads(payload.decode("utf-8"))
+                frames = parse_subscriptions(request)
+                self.imu_batch = bool(request.get("imu_batch", False))
+                if frames:
+                    self.apply_subscriptions(frames)
+            elif msg_type == MSG_TIME_REQUEST:
+                received_at = time.monotonic()
+                if len(payload) != TIME_REQUEST.size:
+                    raise ValueError(f"time request payload has {len(payload)} bytes, expected {TIME_REQUEST.size}")
+                (client_time,) = TIME_REQUEST.unpack(payload)
+                self.enqueue(MSG_TIME_RESPONSE, TIME_RESPONSE.pack(client_time, received_at, time.monotonic()),
+                             priority=True)
+
+    async def read_message(self):
+        header = await self.reader.readexactly(TELEMETRY_HEADER.size)
+        _, msg_type, sequence, timestamp, length = unpack_header(header)
+        payload = await self.reader.readexactly(length)
+        return msg_type, sequence, timestamp, payload
+
+    def due_codecs(self, now, versions, rate_scale=1.0):
+        """Ramki, których termin minął i które mają nowe dane; rate_scale < 1 wydłuża okresy (QoS)."""
+        due = []
+        for subscription in self.subscriptions:
+            if subscription.next_due > now:
+                continue
+            current = tuple(versions[channel] for channel in subscription.codec.channels)
+            if current == subscription.sent_versions:
+                # Nic nowego - ramka wyjdzie przy najbliższej aktualizacji któregoś z kanałów
+                continue
+            subscription.sent_versions = current
+            due.append(subscription.codec)
+            subscription.next_due += subscription.period / rate_scale
+            if subscription.next_due <= now:
+                # Klient nie nadąża albo dane przyszły później - nie nadrabiamy zaległych ramek
+                subscription.next_due = now + subscription.period / rate_scale
+        return due
+
+    def next_due(self, now):
+        """Najbliższy przyszły termin; ramki po terminie czekają na nowe dane, a nie na zegar."""
+        return min((subscription.next_due for subscription in self.subscriptions if subscription.next_due > now),
+                   default=None)
+
+    def enqueue(self, msg_type, payload, timestamp=None, priority=False):
+        self.sequence += 1
+        message = pack_message(msg_type, self.sequence, payload, timestamp)
+        if priority:
+            self.priority_outbox.append(message)
+        else:
+            self._append_droppable(message)
+        self.outbox_ready.set()
+
+    def enqueue_frame(self, packed, timestamp):
+        if self.legacy:
+            self._append_droppable(packed)
+            self.outbox_ready.set()
+        else:
+            self.enqueue(MSG_DATA, packed, timestamp)
+
+    def _append_droppable(self, message):
+        if len(self.outbox) == self.outbox.maxlen:
+            self.dropped_messages += 1
+        self.outbox.append(message)
+
+    async def write_loop(self):
+        """Opróżnia kolejki; na drain czeka tylko ten klient, a nie wydawca telemetrii."""
+        while True:
+            await self.outbox_ready.wait()
+            self.outbox_ready.clear()
+            while self.priority_outbox or self.outbox:
+                queue = self.priority_outbox if self.priority_outbox else self.outbox
+                self.writer.write(queue.popleft())
+                await self.writer.drain()
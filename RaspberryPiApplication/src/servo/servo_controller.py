@@ -1,20 +1,24 @@
-import pigpio
+from src.hal import get_backend
 
 SERVO_PIN = 27
-pi = pigpio.pi()
-pi.set_mode(SERVO_PIN, pigpio.OUTPUT)
+SERVO_PWM_FREQUENCY = 50
 
 class ServoController:
     def __init__(self, pin=SERVO_PIN):
         self.pin = pin
+        pigpio = get_backend().pigpio
+        self.pi = pigpio.pi()
+        self.pi.set_mode(self.pin, pigpio.OUTPUT)
+        self.pi.set_PWM_frequency(self.pin, SERVO_PWM_FREQUENCY)
 
     def set_angle(self, angle):
-        pulse = 1500 + (angle / 180.0) * 600
-        pi.set_PWM_frequency(self.pin, 50)
-        pi.set_servo_pulsewidth(self.pin, pulse)
+        self.set_pulse_width(1500 + (angle / 180.0) * 600)
+
+    def set_pulse_width(self, pulse):
+        self.pi.set_servo_pulsewidth(self.pin, pulse)
 
     def stop(self):
-        pi.set_servo_pulsewidth(self.pin, 0)
+        self.pi.set_servo_pulsewidth(self.pin, 0)
     
     def cleanup(self):
-        pi.stop()
\ No newline at end of file
+        self.pi.stop()
@@ -0,0 +1,241 @@
+import json
+import logging
+import os
+import time
+from collections import deque
+import numpy as np
+from src.server.output_stage import SERVO_CENTER_US, SERVO_US_PER_DEGREE
+
+logger = logging.getLogger(__name__)
+
+# Montaż enkodera: odczyt AS5600 przy kołach na wprost i kierunek (1 albo -1, dodatni kąt = jak dodatnie polecenie).
+# Wartości domyślne to tylko zastępstwo dla telemetrii - regulator działa wyłącznie z zapisaną kalibracją
+ENCODER_CENTER_DEG = 0.0
+ENCODER_DIRECTION = 1
+STEERING_CALIBRATION_PATH = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "steering_calibration.json"))
+# Najmniejsze wychylenie kół przy wyznaczaniu kierunku enkodera
+CALIBRATION_MIN_DEFLECTION_DEG = 5.0
+# Kąt kół odpowiadający jednostce polecenia skrętu (-128..127) i mechaniczny zakres skrętu
+STEERING_DEG_PER_UNIT = 30.0 / 127
+MAX_STEERING_ANGLE = 30.0
+STEERING_KP = 4.0  # us na stopień błędu
+STEERING_KI = 20.0  # us na stopień * s
+# Sprzężenie przesuwa impuls najwyżej o tyle względem wyprzedzenia; impuls zawsze w zakresie serwa
+MAX_CORRECTION_US = 200.0
+PULSE_LIMITS_US = (1000.0, 2000.0)
+# Błąd, na który regulator nie reaguje (szum enkodera i luz w przekładni)
+DEADBAND_DEG = 0.5
+# Opóźnienie serwa: od zmiany celu o co najmniej STEP_THRESHOLD_DEG do wejścia w SETTLE_TOLERANCE_DEG
+STEP_THRESHOLD_DEG = 2.0
+SETTLE_TOLERANCE_DEG = 1.0
+LAG_HISTORY = 100
+# Kalibracja przekładni: prosta kąt(impuls) z ustalonych punktów pracy, przeliczana co CALIBRATION_REFIT punktów
+CALIBRATION_WINDOW = 500
+CALIBRATION_REFIT = 50
+CALIBRATION_MIN_SPAN_US = 100.0
+# Odczyt z pętli wykonawczej starszy niż tyle sekund nie trafia do telemetrii
+TELEMETRY_MAX_AGE = 0.05
+
+
+def clamp(value, low, high):
+    return min(max(value, low), high)
+
+
+def wrap_angle(angle):
+    return (angle + 180.0) % 360.0 - 180.0
+
+
+def wheel_angle(raw, calibration=None):
+    """Kąt kół (-180..180, 0 na wprost) z surowego odczytu enkodera w stopniach."""
+    center, direction = calibration or (ENCODER_CENTER_DEG, ENCODER_DIRECTION)
+    return wrap_angle(raw - center) * direction
+
+
+def load_encoder_calibration(path=STEERING_CALIBRATION_PATH):
+    """(środek w stopniach, kierunek) z pliku kalibracji albo None, gdy enkoder nie był kalibrowany."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        center = float(data["center_deg"])
+        direction = int(data["direction"])
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, TypeError, KeyError) as e:
+        logger.error("Invalid steering calibration %s: %s", path, e)
+        return None
+    if direction not in (1, -1):
+        logger.error("Invalid steering calibration %s: direction must be 1 or -1", path)
+        return None
+    return center, direction
+
+
+def save_encoder_calibration(center, direction, path=STEERING_CALIBRATION_PATH):
+    with open(path, "w") as f:
+        json.dump({"center_deg": center, "direction": direction}, f)
+    logger.info("Steering calibration saved to %s: center %.2f deg, direction %d", path, center, direction)
+
+
+class EncoderCalibration:
+    """Kalibracja montażu enkodera w dwóch krokach: koła na wprost, potem skręt w stronę dodatniego polecenia."""
+
+    def __init__(self, read_encoder, path=STEERING_CALIBRATION_PATH):
+        self.read_encoder = read_encoder
+        self.path = path
+        self.center = None
+
+    def record_center(self):
+        self.center = self.read_encoder()
+        return {"center_deg": self.center}
+
+    def record_direction(self):
+        """Zapisuje kalibrację; koła muszą być wychylone w stronę, w którą skręca dodatnie polecenie."""
+        if self.center is None:
+            raise ValueError("record the center position first")
+        deflection = wrap_angle(self.read_encoder() - self.center)
+        if abs(deflection) < CALIBRATION_MIN_DEFLECTION_DEG:
+            raise ValueError(f"wheels deflected by {deflection:.1f} deg, need at least "
+                             f"{CALIBRATION_MIN_DEFLECTION_DEG:.0f} deg")
+        direction = 1 if deflection > 0 else -1
+        save_encoder_calibration(self.center, direction, self.path)
+        return {"center_deg": self.center, "direction": direction}
+
+
+class SteeringController:
+    """Regulator położenia kół: wyprzedzenie z kalibracji przekładni plus korekta PI z enkodera AS5600.
+
+    Wynikiem jest szerokość impulsu serwa w mikrosekundach albo None, gdy enkoder nie działa
+    (wtedy skręt wraca do sterowania bez sprzężenia).
+    """
+
+    def __init__(self, read_encoder, calibration, kp=STEERING_KP, ki=STEERING_KI):
+        # Zwraca surowy kąt enkodera w stopniach, np. AS5600Sensor.read_measurement
+        self.read_encoder = read_encoder
+        # (środek, kierunek) z load_encoder_calibration
+        self.calibration = calibration
+        self.kp = kp
+        self.ki = ki
+        self.integral = 0.0
+        self.target = 0.0
+        # (kąt, czas odczytu) - jedna krotka, żeby wątek telemetrii nie widział połowy aktualizacji
+        self.last_measurement = (0.0, 0.0)
+        self.pulse = None
+        self.failing = False
+        self.step_target = 0.0
+        self.step_started = None
+        self.lag = 0.0
+        self.lags = deque(maxlen=LAG_HISTORY)
+        self.calibration_points = deque(maxlen=CALIBRATION_WINDOW)
+        self.new_points = 0
+        self.fit = None
+
+    def reset(self):
+        self.integral = 0.0
+        self.pulse = None
+        self.step_started = None
+
+    def measure(self):
+        angle = wheel_angle(self.read_encoder(), self.calibration)
+        self.last_measurement = (angle, time.monotonic())
+        return angle
+
+    def target_angle(self, command):
+        return clamp(command * STEERING_DEG_PER_UNIT, -MAX_STEERING_ANGLE, MAX_STEERING_ANGLE)
+
+    def feedforward(self, target, command):
+        if self.fit is not None:
+            slope, offset = self.fit
+            return (target - offset) / slope
+        # Przed kalibracją - to samo mapowanie co bez sprzężenia
+        return SERVO_CENTER_US + command * SERVO_US_PER_DEGREE
+
+    def update(self, command, dt):
+        previous_measured, _ = self.last_measurement
+        try:
+            measured = self.measure()
+        except Exception as e:
+            if not self.failing:
+                logger.warning("Steering encoder unavailable, using open-loop steering: %s", e)
+            self.failing = True
+            self.reset()
+            return None
+        if self.failing:
+            logger.info("Steering encoder recovered, closed-loop steering resumed")
+            self.failing = False
+
+        target = self.target_angle(command)
+        target_changed = target != self.target
+        self.target = target
+        _, now = self.last_measurement
+        self._track_lag(target, measured, target_changed, now)
+
+        error = target - measured
+        if abs(error) <= DEADBAND_DEG:
+            error = 0.0
+        elif self.ki:
+            self.integral = clamp(self.integral + error * dt, -MAX_CORRECTION_US / self.ki, MAX_CORRECTION_US / self.ki)
+        correction = clamp(self.kp * error + self.ki * self.integral, -MAX_CORRECTION_US, MAX_CORRECTION_US)
+
+        # Koła stoją, a serwo dostawało ten sam impuls - punkt pracy przekładni do kalibracji
+        if (self.pulse is not None and not target_changed
+                and abs(measured - previous_measured) <= DEADBAND_DEG):
+            self._add_calibration_point(self.pulse, measured)
+
+        self.pulse = clamp(self.feedforward(target, command) + correction, *PULSE_LIMITS_US)
+        return self.pulse
+
+    def _track_lag(self, target, measured, target_changed, now):
+        if abs(target - self.step_target) >= STEP_THRESHOLD_DEG:
+            if self.step_started is None:
+                self.step_started = now
+            self.step_target = target
+        elif self.step_started is not None and not target_changed and abs(target - measured) <= SETTLE_TOLERANCE_DEG:
+            self.lag = now - self.step_started
+            self.lags.append(self.lag)
+            self.step_started = None
+
+    def _add_calibration_point(self, pulse, angle):
+        self.calibration_points.append((pulse, angle))
+        self.new_points += 1
+        if self.new_points < CALIBRATION_REFIT:
+            return
+        self.new_points = 0
+        points = np.array(self.calibration_points)
+        if np.ptp(points[:, 0]) < CALIBRATION_MIN_SPAN_US:
+            # Same punkty wokół jednego impulsu nie wyznaczają nachylenia
+            return
+        slope, offset = np.polyfit(points[:, 0], points[:, 1], 1)
+        if abs(slope) > 1e-3:
+            self.fit = (float(slope), float(offset))
+
+    def telemetry(self, angle=None):
+        """Kanały skrętu do telemetrii, tylko do odczytu - stan regulatora zmienia wyłącznie pętla wykonawcza.
+
+        Bez podanego kąta bierze ostatni odczyt z pętli; gdy jest starszy niż TELEMETRY_MAX_AGE, zwraca None.
+        """
+        if angle is None:
+            angle, measured_at = self.last_measurement
+            if time.monotonic() - measured_at > TELEMETRY_MAX_AGE:
+                return None
+        return {"steering_angle": angle, "steering_target": self.target, "servo_lag": self.lag * 1000.0}
+
+    def stats(self):
+        lags = np.array(list(self.lags)) * 1000.0
+        calibration = None
+        if self.fit is not None:
+            slope, offset = self.fit
+            calibration = {
+                "deg_per_us": slope,
+                "center_us": -offset / slope,
+                "samples": len(self.calibration_points),
+            }
+        return {
+            "target_angle": self.target,
+            "measured_angle": self.last_measurement[0],
+            "pulse_us": self.pulse,
+            "encoder_failing": self.failing,
+            "lag_ms": self.lag * 1000.0,
+            "lag_p50_ms": float(np.percentile(lags, 50)) if len(lags) else None,
+            "lag_p95_ms": float(np.percentile(lags, 95)) if len(lags) else None,
+            "calibration": calibration,
+        }